@@ -0,0 +1,63 @@
+"""
+Helpers for async-native endpoints.
+
+DRF views are synchronous, so under ASGI each one holds a worker thread for its whole
+duration. The async endpoints are plain Django async views that keep DRF's contract:
+JWT authentication (users resolved through Documents/authentication.py), the same JSON rendering and the same
+{"detail": ...} error bodies.
+"""
+import functools
+
+from django.http import Http404, HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+
+from .authentication import CachedJWTAuthentication, acached_user, check_user, token_user_id
+
+
+def json_response(data, status=200, headers=None):
+    return HttpResponse(JSONRenderer().render(data), status=status, headers=headers, content_type="application/json")
+
+
+async def authenticate(request, allow_query_token=False):
+    """
+    The active user for the JWT in the Authorization header (or in ?token= when allowed,
+    for clients such as EventSource that can't set headers), or None.
+    """
+    auth = CachedJWTAuthentication()
+    header = auth.get_header(request)
+    raw_token = auth.get_raw_token(header) if header else None
+    if raw_token is None and allow_query_token:
+        raw_token = request.GET.get("token")
+    if not raw_token:
+        return None
+    try:
+        token = auth.get_validated_token(raw_token)
+        return check_user(await acached_user(token_user_id(token)), token)
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+
+
+def async_api_view(methods):
+    """
+    Async counterpart of @api_view + IsAuthenticated for `async def view(request, ...)`.
+    """
+    def decorator(view):
+        @csrf_exempt
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return json_response({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+            request.user = await authenticate(request)
+            if request.user is None:
+                return json_response({"detail": "Authentication credentials were not provided."}, status=401)
+            try:
+                return await view(request, *args, **kwargs)
+            except APIException as exc:
+                return json_response({"detail": exc.detail}, status=exc.status_code)
+            except Http404 as exc:
+                return json_response({"detail": str(exc) or "Not found."}, status=404)
+        return wrapper
+    return decorator
@@ -0,0 +1,123 @@
+"""
+JWT authentication that resolves the user from a short-lived in-process cache.
+
+simplejwt's JWTAuthentication loads the user from the database on every request.
+CachedJWTAuthentication keeps users in the "auth_users" cache alias (locmem with a short
+TIMEOUT, see CACHES in settings) keyed by the token's user id, so repeat requests from a
+user make no query. The post_save/post_delete signals in Documents/signals.py drop a
+user whose row changes, which takes effect at once in the process that made the change
+(deactivation, deletion, a new role or password); other processes notice within the TTL.
+
+Tokens from MyTokenObtainPairSerializer carry the user's role; a token whose role no
+longer matches the user is rejected, so a user whose role changed has to log in again.
+Tokens issued without the claim are still accepted.
+
+PooledModelBackend is the login backend: ModelBackend with the password check run by
+Documents/hashing.py.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from . import hashing
+
+CACHE_ALIAS = "auth_users"
+ROLE_CLAIM = "role"
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def cache_key(user_id):
+    return f"auth-user:{user_id}"
+
+
+def _lookup(user_id):
+    return {api_settings.USER_ID_FIELD: user_id}
+
+
+def cached_user(user_id):
+    """
+    The user with this id (USER_ID_FIELD), from the cache or the database, or None.
+    """
+    user = _cache().get(cache_key(user_id))
+    if user is None:
+        user = get_user_model().objects.filter(**_lookup(user_id)).first()
+        if user is not None:
+            _cache().set(cache_key(user_id), user)
+    return user
+
+
+async def acached_user(user_id):
+    user = await _cache().aget(cache_key(user_id))
+    if user is None:
+        user = await get_user_model().objects.filter(**_lookup(user_id)).afirst()
+        if user is not None:
+            await _cache().aset(cache_key(user_id), user)
+    return user
+
+
+def invalidate(user_id):
+    _cache().delete(cache_key(user_id))
+
+
+def token_user_id(validated_token):
+    try:
+        return validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError as exc:
+        raise InvalidToken(_("Token contained no recognizable user identification")) from exc
+
+
+def check_user(user, validated_token):
+    """
+    The checks JWTAuthentication.get_user() makes, plus the role claim. Raises
+    AuthenticationFailed.
+    """
+    if user is None:
+        raise AuthenticationFailed(_("User not found"), code="user_not_found")
+    if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+        raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+    if api_settings.CHECK_REVOKE_TOKEN:
+        if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+    role = validated_token.get(ROLE_CLAIM)
+    if role is not None and role != user.role:
+        raise AuthenticationFailed(_("The user's role has changed."), code="role_changed")
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        return check_user(cached_user(token_user_id(validated_token)), validated_token)
+
+
+class PooledModelBackend(ModelBackend):
+    """
+    ModelBackend that checks passwords in the hashing pool. Raises
+    hashing.HashingOverloaded when the pool is saturated.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway, so unknown usernames take as long as wrong passwords
+            hashing.make_password(password)
+            return None
+        if not hashing.check_password(password, user.password) or not self.user_can_authenticate(user):
+            return None
+        if hashing.must_update(user.password):
+            user.password = hashing.make_password(password)
+            user.save(update_fields=["password"])
+        return user
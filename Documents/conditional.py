@@ -0,0 +1,57 @@
+"""
+Conditional GET (ETag / Last-Modified) for read endpoints.
+
+Views are wrapped with Django's `condition` decorator, placed under @api_view so that
+authentication and permissions run first. The validators come from one cheap query (a
+timestamp and a row count, never the objects themselves), so an unchanged resource is
+answered with 304 before anything is loaded or serialized.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.views.decorators.http import condition
+
+
+def latest_change(queryset, *fields):
+    """
+    (newest of `fields`, row count) of a queryset in a single aggregate query. The count
+    catches deletions, which don't move the maximum. Fields may span relations, e.g.
+    "document__updated_at" for rows that embed their document.
+    """
+    fields = fields or ("updated_at",)
+    row = queryset.order_by().aggregate(count=Count("pk"), **{f"last_{i}": Max(f) for i, f in enumerate(fields)})
+    timestamps = [row[f"last_{i}"] for i in range(len(fields)) if row[f"last_{i}"] is not None]
+    return max(timestamps, default=None), row["count"]
+
+
+def conditional(validators, per_page=False):
+    """
+    condition() driven by `validators(request, *args, **kwargs)`, which returns a tuple
+    starting with the last-modified datetime, or None when the resource doesn't exist
+    (the view then answers as usual).
+
+    per_page=True is for lists: the ETag also covers the query string (filters, cursor,
+    page size) and the user, and no Last-Modified is sent, since a deleted row can leave
+    the maximum timestamp unchanged.
+    """
+    def get_validators(request, *args, **kwargs):
+        if not hasattr(request, "_conditional_validators"):
+            request._conditional_validators = validators(request, *args, **kwargs)
+        return request._conditional_validators
+
+    def etag(request, *args, **kwargs):
+        values = get_validators(request, *args, **kwargs)
+        if values is None:
+            return None
+        parts = tuple(values)
+        if per_page:
+            parts += (request.get_full_path(), request.user.pk)
+        return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        if per_page:
+            return None
+        values = get_validators(request, *args, **kwargs)
+        return values[0] if values else None
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
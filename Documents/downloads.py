@@ -0,0 +1,167 @@
+"""
+File downloads for Document.file, DocumentSignature.edited_file and Signature.file.
+
+Files are sent with ETag/Last-Modified validators and single-range support. Full-file
+responses use FileResponse, which lets the WSGI server hand the descriptor to sendfile().
+With FILE_DOWNLOAD_MODE set to "x-accel-redirect" (nginx) or "x-sendfile" (Apache,
+lighttpd) the view only checks access and the front proxy sends the bytes.
+"""
+import json
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+from rest_framework import renderers
+
+from .storage import digest_from_name
+
+STREAM_BLOCK_SIZE = 64 * 1024
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class PassthroughRenderer(renderers.BaseRenderer):
+    """
+    Lets download views answer any Accept header; error payloads are still JSON.
+    """
+    media_type = "*/*"
+    format = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, (bytes, str)) or data is None:
+            return data
+        return json.dumps(data).encode()
+
+
+def file_etag(fieldfile, stat=None):
+    digest = digest_from_name(fieldfile.name)
+    if digest:
+        return quote_etag(digest)
+    stat = stat or os.stat(fieldfile.path)
+    return quote_etag(f"{stat.st_size:x}-{int(stat.st_mtime):x}")
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return etag in candidates
+
+
+def _parse_range(header, size):
+    """
+    (start, end) inclusive for a single `bytes=` range, None to send the whole file,
+    or "unsatisfiable". Multiple ranges are answered with the whole file.
+    """
+    match = _RANGE_RE.match(header.replace(" ", ""))
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        suffix = int(last)
+        if suffix == 0:
+            return "unsatisfiable"
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return "unsatisfiable"
+    return start, end
+
+
+def _iter_range(path, start, end):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining:
+            data = f.read(min(STREAM_BLOCK_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+def _accel_response(fieldfile, mode):
+    name = fieldfile.name
+    response = HttpResponse()
+    if mode == "x-accel-redirect":
+        prefix = getattr(settings, "FILE_DOWNLOAD_ACCEL_PREFIX", "/protected-media/")
+        response["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + name
+    else:
+        response["X-Sendfile"] = fieldfile.path
+    # Let the proxy work out the type from the file
+    del response["Content-Type"]
+    return response
+
+
+def serve_file(request, fieldfile, as_attachment=False, filename=None):
+    """
+    Build the download response for a FieldFile, honouring conditional and Range headers.
+    `filename` is the name offered to the client (default: the stored file's name).
+    Raises Http404 if the file is missing from storage.
+    """
+    try:
+        stat = os.stat(fieldfile.path)
+    except FileNotFoundError:
+        raise Http404("File is missing from storage.")
+    etag = file_etag(fieldfile, stat)
+    last_modified = int(stat.st_mtime)
+    filename = filename or os.path.basename(fieldfile.name)
+
+    # Conditional GET: If-None-Match wins over If-Modified-Since (RFC 9110 13.2.2)
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if_modified_since = parse_http_date_safe(request.META.get("HTTP_IF_MODIFIED_SINCE", ""))
+    if _etag_matches(if_none_match, etag) or (
+        not if_none_match and if_modified_since is not None and last_modified <= if_modified_since
+    ):
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        return response
+
+    mode = getattr(settings, "FILE_DOWNLOAD_MODE", "stream")
+    if mode in ("x-accel-redirect", "x-sendfile"):
+        response = _accel_response(fieldfile, mode)
+    else:
+        size = stat.st_size
+        byte_range = None
+        range_header = request.META.get("HTTP_RANGE")
+        if range_header:
+            # If-Range: only honour the range if the client's copy is still current
+            if_range = request.META.get("HTTP_IF_RANGE")
+            if not if_range or if_range == etag or parse_http_date_safe(if_range) == last_modified:
+                byte_range = _parse_range(range_header, size)
+
+        if byte_range == "unsatisfiable":
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(_iter_range(fieldfile.path, start, end), status=206)
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+            response["Content-Length"] = str(end - start + 1)
+            content_type, _ = mimetypes.guess_type(filename)
+            response["Content-Type"] = content_type or "application/octet-stream"
+        else:
+            try:
+                f = open(fieldfile.path, "rb")
+            except FileNotFoundError:
+                raise Http404("File is missing from storage.")
+            response = FileResponse(f, filename=filename, as_attachment=as_attachment)
+
+        response["Accept-Ranges"] = "bytes"
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = "private, max-age=0, must-revalidate"
+    if "Content-Disposition" not in response:
+        response["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+    return response
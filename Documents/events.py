@@ -0,0 +1,96 @@
+"""
+In-process event hub for Server-Sent Events.
+
+Views publish small JSON events after their transaction commits; the SSE endpoint
+(signatures.views.document_signature_events, served under ASGI) subscribes one queue per
+connected client. Publishing never blocks: each subscriber has a bounded queue, and a
+client that falls behind by more than EVENTS_QUEUE_SIZE events has its backlog replaced
+by a single "resync" event telling it to re-fetch over the REST endpoints.
+
+Only clients connected to the same process see an event, so run the ASGI server with a
+single worker process (or pin clients to a process) until a shared broker is added.
+"""
+import asyncio
+import itertools
+import json
+import threading
+
+from django.conf import settings
+
+_event_ids = itertools.count(1)
+
+
+class Subscriber:
+    def __init__(self, loop, user_id, document_signature_id=None, overview=True):
+        self.loop = loop
+        self.user_id = user_id
+        self.document_signature_id = document_signature_id
+        self.overview = overview
+        self.queue = asyncio.Queue(maxsize=getattr(settings, "EVENTS_QUEUE_SIZE", 100))
+        self.dropped = 0
+
+    def wants(self, event, audience):
+        if event["type"] == "overview":
+            return self.overview
+        # Following one DocumentSignature narrows the stream; it never widens the audience
+        if self.document_signature_id is not None and event.get("document_signature_id") != self.document_signature_id:
+            return False
+        return audience is None or self.user_id in audience
+
+    def offer(self, event):
+        """
+        Runs on the subscriber's event loop.
+        """
+        if self.queue.full():
+            # Too slow to keep up: drop the backlog and ask the client to resync
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"id": event["id"], "type": "resync"})
+            return
+        self.queue.put_nowait(event)
+
+
+class EventHub:
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def subscribe(self, user_id, document_signature_id=None, overview=True):
+        """
+        Register a subscriber on the running event loop.
+        """
+        subscriber = Subscriber(asyncio.get_running_loop(), user_id, document_signature_id, overview)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event, audience=None):
+        """
+        Deliver `event` (a dict with a "type") to every interested subscriber; `audience` is
+        the set of user ids it concerns, None for everyone. Safe to call from any thread.
+        """
+        event = {"id": next(_event_ids), **event}
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if subscriber.wants(event, audience):
+                try:
+                    subscriber.loop.call_soon_threadsafe(subscriber.offer, event)
+                except RuntimeError:
+                    # The subscriber's loop has shut down
+                    self.unsubscribe(subscriber)
+
+
+hub = EventHub()
+
+
+def format_sse(event):
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
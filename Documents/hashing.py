@@ -0,0 +1,162 @@
+"""
+Password hashing off the request threads.
+
+Hashing a password is deliberately slow and CPU-bound (PBKDF2 runs a million
+iterations), so a burst of logins or registrations ties up every request thread.
+make_password() and check_password() run the hasher in a small process pool instead.
+At most PASSWORD_HASHING_MAX_PENDING hashes are queued or running at a time; past that
+a request is shed at once with HashingOverloaded (503 with Retry-After) rather than
+queueing behind work it would time out waiting for. make_passwords() hashes a batch in
+parallel for bulk imports and is not limited.
+
+The salt and the hasher are chosen in the calling process, so the workers only run
+hasher.encode() / hasher.verify(), which need no Django settings. This module must not
+import Django models: it is loaded by the pool's worker processes.
+"""
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, identify_hasher, is_password_usable
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import APIException
+
+
+class HashingOverloaded(APIException):
+    status_code = 503
+    default_detail = "Too many logins or registrations in progress, retry shortly."
+    default_code = "hashing_overloaded"
+
+    def __init__(self):
+        super().__init__()
+        # Sent as Retry-After by DRF's exception handler
+        self.wait = getattr(settings, "PASSWORD_HASHING_RETRY_AFTER", 2)
+
+
+def _hasher_path(hasher):
+    return f"{type(hasher).__module__}.{type(hasher).__qualname__}"
+
+
+def _encode(hasher_path, password, salt):
+    return import_string(hasher_path)().encode(password, salt)
+
+
+def _verify(hasher_path, password, encoded):
+    return import_string(hasher_path)().verify(password, encoded)
+
+
+# Process pool
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = 0
+
+
+def get_hashing_pool():
+    """
+    Lazily created process pool, or None when PASSWORD_HASHING_WORKERS is 0.
+    """
+    global _pool
+    workers = getattr(settings, "PASSWORD_HASHING_WORKERS", 2)
+    if not workers:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+        return _pool
+
+
+def _discard_pool(pool):
+    """
+    Drop a broken pool (a worker died, e.g. OOM-killed) so the next hash starts a new one.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _release():
+    global _pending
+    with _pool_lock:
+        _pending -= 1
+
+
+def _run(fn, *args):
+    """
+    fn(*args) in the hashing pool, within the pending limit. Raises HashingOverloaded.
+    """
+    global _pending
+    with _pool_lock:
+        if _pending >= getattr(settings, "PASSWORD_HASHING_MAX_PENDING", 64):
+            raise HashingOverloaded()
+        _pending += 1
+
+    future = None
+    try:
+        pool = get_hashing_pool()
+        if pool is None:
+            return fn(*args)
+        future = pool.submit(fn, *args)
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise HashingOverloaded()
+    finally:
+        if future is None:
+            # Ran inline, or never made it into the pool
+            _release()
+
+    # The slot is freed when the hash finishes, even if this request stopped waiting
+    future.add_done_callback(lambda _: _release())
+    try:
+        return future.result(timeout=getattr(settings, "PASSWORD_HASHING_TIMEOUT", 10))
+    except FutureTimeoutError:
+        raise HashingOverloaded()
+    except BrokenProcessPool:
+        # The future failed too, so its callback already freed the slot
+        _discard_pool(pool)
+        raise HashingOverloaded()
+
+
+def make_password(password):
+    hasher = get_hasher()
+    return _run(_encode, _hasher_path(hasher), password, hasher.salt())
+
+
+def check_password(password, encoded):
+    """
+    Whether `password` matches `encoded`, like django.contrib.auth.hashers.check_password()
+    but without the setter: see must_update().
+    """
+    if password is None or not is_password_usable(encoded):
+        # Same cost as a real check, so unusable passwords can't be told apart by timing
+        make_password(password or "")
+        return False
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return False
+    return _run(_verify, _hasher_path(hasher), password, encoded)
+
+
+def must_update(encoded):
+    """
+    Whether a hash should be replaced with one from the preferred hasher and parameters.
+    """
+    preferred = get_hasher()
+    hasher = identify_hasher(encoded)
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def make_passwords(passwords, workers=None):
+    """
+    Hashes of `passwords`, in order, computed by `workers` processes (default: one per CPU).
+    """
+    hasher = get_hasher()
+    path = _hasher_path(hasher)
+    salts = [hasher.salt() for _ in passwords]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+        return list(pool.map(_encode, [path] * len(passwords), passwords, salts, chunksize=16))
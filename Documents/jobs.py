@@ -0,0 +1,227 @@
+"""
+Database-backed background job queue.
+
+Jobs are rows in the Job table, so the queue needs nothing but the project's database
+(SQLite or Postgres). Apps register handlers with @job_handler("kind"); views call
+enqueue() and return immediately, and `manage.py run_jobs` executes the jobs in a pool
+of worker threads or processes. A worker claims a job with a conditional UPDATE, so two
+workers never run the same job. Failures are retried with exponential backoff until
+max_attempts is reached; a handler raises PermanentJobError for failures that would
+recur on every attempt. While a job runs, a heartbeat keeps its locked_at fresh, so only
+jobs whose worker died are requeued as stale.
+"""
+import logging
+import os
+import signal
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+class UnknownJobKind(Exception):
+    pass
+
+
+class PermanentJobError(Exception):
+    """
+    Raised by a handler when retrying cannot help (bad input, missing rows); the job fails at once.
+    """
+
+
+def job_handler(kind):
+    """
+    Register `func(payload) -> result` as the handler for jobs of `kind`.
+    The result must be JSON-serializable; raising an exception makes the job retry,
+    unless it is a PermanentJobError.
+    """
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+
+def registered_kinds():
+    return sorted(_handlers)
+
+
+def enqueue(kind, payload=None, created_by=None, max_attempts=None, delay=None):
+    """
+    Queue a job. It becomes visible to workers when the surrounding transaction commits.
+    """
+    from .models import Job
+
+    if kind not in _handlers:
+        raise UnknownJobKind(kind)
+    return Job.objects.create(
+        kind=kind,
+        payload=payload or {},
+        created_by=created_by,
+        max_attempts=max_attempts or getattr(settings, "JOB_MAX_ATTEMPTS", 5),
+        run_after=timezone.now() + (delay or timedelta()),
+    )
+
+
+def retry_delay(attempts):
+    base = getattr(settings, "JOB_RETRY_BASE_SECONDS", 10)
+    cap = getattr(settings, "JOB_RETRY_MAX_SECONDS", 3600)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), cap))
+
+
+def worker_name(index=0):
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+def heartbeat_interval():
+    return getattr(settings, "JOB_HEARTBEAT_INTERVAL", getattr(settings, "JOB_LOCK_TIMEOUT", 600) / 4)
+
+
+def touch_job(job):
+    """
+    Refresh locked_at of a running job so requeue_stale_jobs() leaves it alone.
+    """
+    from .models import Job
+
+    now = timezone.now()
+    return Job.objects.filter(id=job.id, status="running", locked_by=job.locked_by).update(
+        locked_at=now, updated_at=now
+    )
+
+
+def _heartbeat(job, stop_event, interval):
+    try:
+        while not stop_event.wait(interval):
+            try:
+                touch_job(job)
+            except Exception:
+                logger.warning("Heartbeat for job %s failed", job.id, exc_info=True)
+    finally:
+        connections.close_all()
+
+
+def requeue_stale_jobs():
+    """
+    Put back jobs whose worker died mid-run (locked longer than JOB_LOCK_TIMEOUT).
+    """
+    from .models import Job
+
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, "JOB_LOCK_TIMEOUT", 600))
+    return Job.objects.filter(status="running", locked_at__lt=cutoff).update(
+        status="queued", locked_by="", locked_at=None, updated_at=timezone.now()
+    )
+
+
+def claim_next_job(worker, kinds=None):
+    from .models import Job
+
+    now = timezone.now()
+    candidates = Job.objects.filter(status="queued", run_after__lte=now)
+    if kinds:
+        candidates = candidates.filter(kind__in=kinds)
+    for job_id in candidates.order_by("run_after", "id").values_list("id", flat=True)[:10]:
+        claimed = Job.objects.filter(id=job_id, status="queued").update(
+            status="running", locked_by=worker, locked_at=now,
+            attempts=F("attempts") + 1, updated_at=now,
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def run_job(job):
+    """
+    Execute a claimed job and record the outcome.
+    """
+    from .models import Job
+
+    handler = _handlers.get(job.kind)
+    stop_heartbeat = threading.Event()
+    heartbeat = threading.Thread(
+        target=_heartbeat, args=(job, stop_heartbeat, heartbeat_interval()),
+        name=f"job-heartbeat-{job.id}", daemon=True,
+    )
+    heartbeat.start()
+    try:
+        if handler is None:
+            raise UnknownJobKind(job.kind)
+        result = handler(job.payload)
+    except Exception as e:
+        error = traceback.format_exc()
+        logger.warning("Job %s (%s) failed on attempt %s", job.id, job.kind, job.attempts)
+        now = timezone.now()
+        retryable = handler is not None and not isinstance(e, PermanentJobError)
+        if retryable and job.attempts < job.max_attempts:
+            updates = {"status": "queued", "run_after": now + retry_delay(job.attempts)}
+        else:
+            updates = {"status": "failed"}
+        Job.objects.filter(id=job.id).update(
+            last_error=error, locked_by="", locked_at=None, updated_at=now, **updates
+        )
+        return False
+    finally:
+        stop_heartbeat.set()
+        heartbeat.join()
+
+    now = timezone.now()
+    Job.objects.filter(id=job.id).update(
+        status="succeeded", result=result, last_error="",
+        locked_by="", locked_at=None, finished_at=now, updated_at=now,
+    )
+    return True
+
+
+def work(worker, stop_event, kinds=None, poll_interval=None, once=False):
+    """
+    Worker loop: claim and run jobs until `stop_event` is set (or the queue is empty with once=True).
+    """
+    if poll_interval is None:
+        poll_interval = getattr(settings, "JOB_POLL_INTERVAL", 1.0)
+    processed = 0
+    try:
+        while not stop_event.is_set():
+            close_old_connections()
+            job = claim_next_job(worker, kinds)
+            if job is None:
+                if once:
+                    break
+                stop_event.wait(poll_interval)
+                continue
+            run_job(job)
+            processed += 1
+    finally:
+        connections.close_all()
+    return processed
+
+
+def work_in_process(worker, stop_event, kinds=None, poll_interval=None, once=False):
+    """
+    Entry point of a forked worker process. Ctrl+C reaches the whole process group; the
+    parent turns it into stop_event, so the child ignores it and finishes its current job.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    return work(worker, stop_event, kinds, poll_interval, once)
+
+
+def start_thread_workers(count, kinds=None, poll_interval=None, once=False, stop_event=None):
+    if stop_event is None:
+        stop_event = threading.Event()
+    threads = [
+        threading.Thread(
+            target=work, args=(worker_name(i), stop_event, kinds, poll_interval, once),
+            name=f"job-worker-{i}", daemon=True,
+        )
+        for i in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    return stop_event, threads
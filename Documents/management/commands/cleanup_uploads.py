@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from Documents.models import UploadSession
+from Documents.uploads import discard
+
+
+class Command(BaseCommand):
+    help = "Delete chunked upload sessions (and their part files) that have been idle too long."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-hours", type=float, default=24)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options["older_than_hours"])
+        stale = UploadSession.objects.filter(status="uploading", updated_at__lt=cutoff)
+
+        removed = 0
+        for session in stale.iterator():
+            discard(session)
+            session.delete()
+            removed += 1
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} stale upload sessions."))
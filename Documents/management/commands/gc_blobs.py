@@ -0,0 +1,136 @@
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from Documents.models import Document, StoredBlob
+from Documents.storage import BLOB_PREFIX, TMP_PREFIX, content_addressed_storage, digest_from_name
+from signatures.models import DocumentSignature, Signature
+
+
+REFERENCING_FIELDS = [
+    (Document, "file"),
+    (DocumentSignature, "edited_file"),
+    (Signature, "file"),
+]
+
+
+def _format_bytes(n):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(n) < 1024 or unit == "GiB":
+            return f"{n:.1f} {unit}" if unit != "B" else f"{n} B"
+        n /= 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount references to content-addressed blobs, delete the unreferenced ones "
+        "and report how many bytes deduplication saved."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report without deleting or fixing counts.")
+        parser.add_argument(
+            "--grace-minutes", type=int, default=60,
+            help="Keep unreferenced blobs created or reused within this time (their record may not be committed yet)."
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        storage = content_addressed_storage()
+
+        # Recount references from the model fields, which are authoritative
+        refs = {}
+        for model, field in REFERENCING_FIELDS:
+            rows = (
+                model.objects.filter(**{f"{field}__startswith": "cas/"})
+                .values_list(field).annotate(n=Count("pk")).order_by()
+            )
+            for name, n in rows:
+                refs[name] = refs.get(name, 0) + n
+
+        cutoff = timezone.now() - timedelta(minutes=options["grace_minutes"])
+        referenced = stored = logical = 0
+        garbage, corrections = [], []
+        for blob in StoredBlob.objects.only("id", "name", "size", "ref_count", "created_at").iterator():
+            actual = refs.get(blob.name, 0)
+            if blob.ref_count != actual:
+                corrections.append((blob.id, actual))
+            if actual:
+                referenced += 1
+                stored += blob.size
+                logical += blob.size * actual
+            elif blob.created_at < cutoff:
+                garbage.append(blob)
+
+        # Applied after the scan: SQLite gives no isolation between a running iterator and writes
+        fixed = len(corrections)
+        if not dry_run:
+            for blob_id, actual in corrections:
+                StoredBlob.objects.filter(id=blob_id).update(ref_count=actual)
+
+        deleted = freed = 0
+        for blob in garbage:
+            if not dry_run:
+                with transaction.atomic():
+                    # Re-check under lock in case a record started using the blob meanwhile
+                    if not StoredBlob.objects.select_for_update().filter(id=blob.id, ref_count__lte=0).exists():
+                        continue
+                    # An upload of the same content touches the file before it records its
+                    # reference, so a fresh file means the blob is about to be used again
+                    if self.file_mtime(storage, blob.name) >= cutoff.timestamp():
+                        continue
+                    StoredBlob.objects.filter(id=blob.id).delete()
+                    storage.delete_blob(blob.name)
+            deleted += 1
+            freed += blob.size
+
+        orphans, orphan_bytes = self.delete_orphan_files(storage, cutoff.timestamp(), dry_run)
+
+        prefix = "[dry run] " if dry_run else ""
+        self.stdout.write(f"{prefix}Reference counts corrected: {fixed}")
+        self.stdout.write(f"{prefix}Unreferenced blobs deleted: {deleted} ({_format_bytes(freed)})")
+        self.stdout.write(f"{prefix}Files without a blob record deleted: {orphans} ({_format_bytes(orphan_bytes)})")
+        self.stdout.write(f"Referenced blobs: {referenced}")
+        self.stdout.write(f"Bytes stored: {_format_bytes(stored)}")
+        self.stdout.write(f"Bytes referenced: {_format_bytes(logical)}")
+        self.stdout.write(self.style.SUCCESS(f"Saved by deduplication: {_format_bytes(logical - stored)}"))
+
+    def file_mtime(self, storage, name):
+        try:
+            return os.stat(storage.path(name)).st_mtime
+        except FileNotFoundError:
+            return 0
+
+    def delete_orphan_files(self, storage, cutoff, dry_run):
+        """
+        Delete files under cas/ older than the cutoff that have no StoredBlob row: blobs
+        written by a transaction that rolled back, and abandoned temporary files.
+        """
+        root = storage.path(BLOB_PREFIX)
+        known = set(StoredBlob.objects.values_list("name", flat=True))
+        deleted = freed = 0
+        for directory, _, files in os.walk(root):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = BLOB_PREFIX + os.path.relpath(path, root).replace(os.sep, "/")
+                if name in known or not (name.startswith(TMP_PREFIX) or digest_from_name(name)):
+                    continue
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if stat.st_mtime >= cutoff:
+                    continue
+                # A record may have been committed since `known` was read
+                if not dry_run and not StoredBlob.objects.filter(name=name).exists():
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        continue
+                deleted += 1
+                freed += stat.st_size
+        return deleted, freed
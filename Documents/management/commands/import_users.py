@@ -0,0 +1,70 @@
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from Documents.hashing import make_passwords
+from Documents.models import CustomUser
+from Documents.overview import invalidate_overview_counts
+
+ROLES = {value for value, _ in CustomUser._meta.get_field("role").choices}
+
+
+class Command(BaseCommand):
+    help = (
+        "Create users in bulk from a CSV file with the columns username, password and optionally "
+        "email, role and post. Passwords are hashed in parallel; existing usernames are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", help="CSV file, or - for stdin")
+        parser.add_argument("--workers", type=int, default=None, help="Hashing processes (default: one per CPU)")
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows per INSERT")
+
+    def read_rows(self, f):
+        reader = csv.DictReader(f)
+        missing = {"username", "password"} - set(reader.fieldnames or ())
+        if missing:
+            raise CommandError(f"Missing column(s): {', '.join(sorted(missing))}.")
+        rows = {}
+        for line, row in enumerate(reader, start=2):
+            username = CustomUser.normalize_username((row["username"] or "").strip())
+            role = (row.get("role") or "").strip() or "signer"
+            if not username or not row["password"]:
+                raise CommandError(f"Line {line}: username and password are required.")
+            if role not in ROLES:
+                raise CommandError(f"Line {line}: role must be one of: {', '.join(sorted(ROLES))}.")
+            if username in rows:
+                raise CommandError(f"Line {line}: duplicate username {username!r}.")
+            rows[username] = {
+                "email": CustomUser.objects.normalize_email((row.get("email") or "").strip()),
+                "password": row["password"],
+                "role": role,
+                "post": (row.get("post") or "").strip() or None,
+            }
+        return rows
+
+    def handle(self, *args, **options):
+        if options["file"] == "-":
+            rows = self.read_rows(sys.stdin)
+        else:
+            with open(options["file"], newline="") as f:
+                rows = self.read_rows(f)
+
+        existing = set(CustomUser.objects.filter(username__in=list(rows)).values_list("username", flat=True))
+        new = {username: row for username, row in rows.items() if username not in existing}
+        hashes = make_passwords([row["password"] for row in new.values()], workers=options["workers"]) if new else []
+
+        users = [
+            CustomUser(username=username, email=row["email"], password=encoded, role=row["role"], post=row["post"])
+            for (username, row), encoded in zip(new.items(), hashes)
+        ]
+        with transaction.atomic():
+            CustomUser.objects.bulk_create(users, batch_size=options["batch_size"])
+            # bulk_create() sends no post_save, so the user counter is recounted instead
+            transaction.on_commit(invalidate_overview_counts)
+
+        for username in sorted(existing):
+            self.stdout.write(f"Skipped existing user {username}")
+        self.stdout.write(self.style.SUCCESS(f"Imported {len(users)} user(s), skipped {len(existing)}."))
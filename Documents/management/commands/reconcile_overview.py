@@ -0,0 +1,37 @@
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+
+from Documents.overview import COUNTER_KEYS, refresh_overview_counts
+
+# Backends whose data lives in one process: a recount here never reaches the server's counts
+PER_PROCESS_BACKENDS = (LocMemCache, DummyCache)
+
+
+class Command(BaseCommand):
+    help = "Recount the cached overview dashboard numbers. Run periodically (e.g. from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--allow-local-cache", action="store_true",
+            help="Recount even though the default cache is per-process (only useful from a shell or in tests).",
+        )
+
+    def handle(self, *args, **options):
+        cache = caches[DEFAULT_CACHE_ALIAS]
+        if isinstance(cache, PER_PROCESS_BACKENDS) and not options["allow_local_cache"]:
+            raise CommandError(
+                f"The default cache ({type(cache).__name__}) is private to this process, so the server's "
+                "overview counts can't be reconciled from here. Point CACHES['default'] at a shared "
+                "backend (file, database, memcached, redis)."
+            )
+
+        cached = cache.get_many(list(COUNTER_KEYS.values()))
+        counts, _ = refresh_overview_counts()
+
+        for name, value in counts.items():
+            previous = cached.get(COUNTER_KEYS[name])
+            drift = "" if previous in (None, value) else f" (cached value was {previous})"
+            self.stdout.write(f"{name}: {value}{drift}")
+        self.stdout.write(self.style.SUCCESS("Overview cache reconciled."))
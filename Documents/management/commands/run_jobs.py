@@ -0,0 +1,75 @@
+import multiprocessing
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from Documents import jobs
+
+
+class Command(BaseCommand):
+    help = "Run background jobs from the database queue with a pool of worker threads or processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None, help="Pool size (default JOB_WORKERS).")
+        parser.add_argument("--mode", choices=["thread", "process"], default="thread")
+        parser.add_argument("--kind", action="append", dest="kinds", help="Only run jobs of this kind (repeatable).")
+        parser.add_argument("--poll-interval", type=float, default=None)
+        parser.add_argument("--once", action="store_true", help="Exit when the queue is empty.")
+
+    def handle(self, *args, **options):
+        workers = options["workers"] or getattr(settings, "JOB_WORKERS", 2)
+        kinds = options["kinds"]
+        once = options["once"]
+
+        requeued = jobs.requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale jobs.")
+        self.stdout.write(
+            f"Starting {workers} {options['mode']} workers for {', '.join(kinds or jobs.registered_kinds())}."
+        )
+
+        if options["mode"] == "thread":
+            stop_event = threading.Event()
+        else:
+            # Forked children must not share the parent's database connections
+            connections.close_all()
+            context = multiprocessing.get_context("fork")
+            stop_event = context.Event()
+
+        # Handlers go in before any worker starts, so an early Ctrl+C still stops them cleanly
+        def stop(signum, frame):
+            self.stdout.write("Stopping workers after their current job...")
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        if options["mode"] == "thread":
+            _, handles = jobs.start_thread_workers(
+                workers, kinds, options["poll_interval"], once, stop_event=stop_event
+            )
+        else:
+            handles = [
+                context.Process(
+                    target=jobs.work_in_process,
+                    args=(jobs.worker_name(i), stop_event, kinds, options["poll_interval"], once),
+                    name=f"job-worker-{i}",
+                )
+                for i in range(workers)
+            ]
+            for process in handles:
+                process.start()
+
+        last_requeue = time.monotonic()
+        for handle in handles:
+            while handle.is_alive():
+                handle.join(timeout=1)
+                if not once and time.monotonic() - last_requeue > 60:
+                    # Periodically reclaim jobs from workers that died mid-run
+                    jobs.requeue_stale_jobs()
+                    last_requeue = time.monotonic()
+        self.stdout.write(self.style.SUCCESS("Workers stopped."))
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = "Copy the primary database onto a local SQLite replica with SQLite's online backup."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=None, help="Replica alias (default REPLICA_DATABASE_ALIAS).")
+
+    def handle(self, *args, **options):
+        alias = options["database"] or settings.REPLICA_DATABASE_ALIAS
+        if alias not in settings.DATABASES:
+            raise CommandError("No replica database is configured; set REPLICA_DATABASE_PATH.")
+        primary, replica = connections[DEFAULT_DB_ALIAS], connections[alias]
+        if primary.vendor != "sqlite" or replica.vendor != "sqlite":
+            raise CommandError("sync_replica only copies SQLite databases; use the server's replication otherwise.")
+
+        primary.ensure_connection()
+        replica.ensure_connection()
+        primary.connection.backup(replica.connection)
+        self.stdout.write(self.style.SUCCESS(
+            f"Copied {primary.settings_dict['NAME']} to {replica.settings_dict['NAME']}."
+        ))
@@ -1,6 +1,11 @@
+import os
+import uuid
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from .storage import content_addressed_storage
+
 class CustomUser(AbstractUser):
     role = models.CharField(
         max_length=20,
@@ -8,6 +13,13 @@ class CustomUser(AbstractUser):
         default="signer"
     )
     post = models.CharField(max_length=100, blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=["date_joined", "id"], name="user_joined_keyset_idx"),
+            models.Index(fields=["role", "date_joined", "id"], name="user_role_keyset_idx"),
+        ]
 
     def __str__(self):
         return f"{self.username} ({self.department})"
@@ -15,11 +27,101 @@ class CustomUser(AbstractUser):
 
 class Document(models.Model):
     title = models.CharField(max_length=255)
-    file = models.FileField(upload_to="documents/")
+    file = models.FileField(upload_to="documents/", storage=content_addressed_storage)
+    # Name of the uploaded file; the stored file is named by its content hash
+    original_filename = models.CharField(max_length=255, blank=True, default="")
     owner = models.ForeignKey("CustomUser", on_delete=models.CASCADE)
+    content_hash = models.CharField(max_length=64, blank=True, default="", db_index=True)  # SHA-256 of the file
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["owner", "-created_at", "-id"], name="document_owner_keyset_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.title} - {self.status}"
+
+    def download_name(self):
+        """
+        Filename offered for downloads of this document.
+        """
+        if self.original_filename:
+            return self.original_filename
+        return f"{self.title}{os.path.splitext(self.file.name)[1]}"
+
+
+class UploadSession(models.Model):
+    """
+    A resumable chunked upload. Chunks are appended to a part file on disk
+    (see Documents/uploads.py) and turned into a Document on completion.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey("CustomUser", on_delete=models.CASCADE, related_name="upload_sessions")
+    title = models.CharField(max_length=255)
+    filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    received_size = models.BigIntegerField(default=0)
+    expected_sha256 = models.CharField(max_length=64, blank=True, default="")
+    status = models.CharField(
+        max_length=20,
+        choices=[("uploading", "Uploading"), ("completed", "Completed")],
+        default="uploading"
+    )
+    document = models.ForeignKey("Document", on_delete=models.SET_NULL, null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"{self.title} - {self.status}"
\ No newline at end of file
+        return f"{self.filename} ({self.received_size}/{self.total_size})"
+
+
+class StoredBlob(models.Model):
+    """
+    One file in the content-addressed storage and the number of model fields referencing it.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.BigIntegerField()
+    ref_count = models.IntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+
+class Job(models.Model):
+    """
+    A unit of background work, run by `manage.py run_jobs` (see Documents/jobs.py).
+    """
+    kind = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=20,
+        choices=[("queued", "Queued"), ("running", "Running"), ("succeeded", "Succeeded"), ("failed", "Failed")],
+        default="queued"
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField()
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+    locked_by = models.CharField(max_length=255, blank=True, default="")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_by = models.ForeignKey("CustomUser", on_delete=models.SET_NULL, null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_after", "id"], name="job_queue_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.id} ({self.status})"
@@ -0,0 +1,126 @@
+"""
+Read-through cache of model instances keyed by (model, pk).
+
+Users, signatures and documents are read far more often than they change. The
+instances live in the "objects" cache alias (a bounded LRU with a TTL, see CACHES in
+settings), get_many() fills a whole page with one cache round trip plus at most one
+in_bulk query for the misses, and the post_save/post_delete signals in
+Documents/signals.py drop changed rows.
+
+Entries are stored under a per-row generation token that invalidate() replaces. A reader
+that loaded a row just before a write committed stores it under the token it started
+with, which nobody reads any more, so it can't put the old row back after the
+invalidation. Writes that skip the signals (QuerySet.update(), raw SQL) are only picked
+up when the entry expires; call invalidate() after them. With several processes and a
+per-process backend (locmem), another process can serve a stale row for up to the TTL;
+point the alias at a shared backend to avoid that.
+"""
+import threading
+import uuid
+
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+CACHE_ALIAS = "objects"
+
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_stats_lock = threading.Lock()
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def cache_key(model, pk):
+    return f"obj:{model._meta.label_lower}:{pk}"
+
+
+def generation_key(model, pk):
+    return f"gen:{model._meta.label_lower}:{pk}"
+
+
+def _new_generation():
+    return uuid.uuid4().hex[:16]
+
+
+def _generations(model, pks):
+    """
+    {pk: generation token}; rows without one (never cached, or culled) get a fresh token.
+    """
+    keys = {generation_key(model, pk): pk for pk in pks}
+    generations = {keys[key]: token for key, token in _cache().get_many(list(keys)).items()}
+    unknown = [key for key, pk in keys.items() if pk not in generations]
+    if unknown:
+        for key in unknown:
+            # add() keeps a token another reader or an invalidation stored meanwhile
+            _cache().add(key, _new_generation(), timeout=None)
+        generations.update({keys[key]: token for key, token in _cache().get_many(unknown).items()})
+    return generations
+
+
+def _load(model, pks):
+    # From the primary even inside @read_replica views: the cache is shared by every view,
+    # and a lagging replica row would outlive the invalidation of the write it missed
+    return model._default_manager.using(DEFAULT_DB_ALIAS).in_bulk(pks)
+
+
+def _count(**deltas):
+    with _stats_lock:
+        for name, delta in deltas.items():
+            _stats[name] += delta
+
+
+def get_many(model, pks):
+    """
+    {pk: instance} for the given pks; ids that don't exist are left out.
+    """
+    pks = list(dict.fromkeys(pks))
+    if not pks:
+        return {}
+    generations = _generations(model, pks)
+    keys = {f"{cache_key(model, pk)}:{token}": pk for pk, token in generations.items()}
+    cached = _cache().get_many(list(keys))
+    found = {keys[key]: obj for key, obj in cached.items()}
+
+    missing = [pk for pk in pks if pk not in found]
+    _count(hits=len(found), misses=len(missing))
+    if missing:
+        loaded = _load(model, missing)
+        # Stored under the generations read before loading: if a write was invalidated
+        # meanwhile, these keys are already orphaned and the next read loads again
+        _cache().set_many({
+            f"{cache_key(model, pk)}:{generations[pk]}": obj for pk, obj in loaded.items() if pk in generations
+        })
+        found.update(loaded)
+    return found
+
+
+def get(model, pk):
+    """
+    The instance with this pk, or None.
+    """
+    return get_many(model, [pk]).get(pk)
+
+
+def invalidate(model, pk, count=True):
+    if count:
+        _count(invalidations=1)
+    _cache().set(generation_key(model, pk), _new_generation(), timeout=None)
+
+
+def clear():
+    _cache().clear()
+
+
+def stats():
+    with _stats_lock:
+        snapshot = dict(_stats)
+    lookups = snapshot["hits"] + snapshot["misses"]
+    snapshot["hit_rate"] = round(snapshot["hits"] / lookups, 4) if lookups else None
+    return snapshot
+
+
+def reset_stats():
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
@@ -0,0 +1,150 @@
+"""
+Counter cache for the overview dashboard.
+
+The counts live in Django's cache framework and are kept current by small
+increments from the signals in Documents/signals.py, so polling `overview`
+doesn't run aggregate queries. A full recount happens when a key is missing,
+when the cached value is older than OVERVIEW_CACHE_MAX_AGE, on `?fresh=1`,
+and from `manage.py reconcile_overview` (which needs a shared default cache).
+Recounts always read the primary: the cached numbers are shared by every reader
+and adjusted by increments from primary writes, so they can't start from a lagging
+replica even when the view itself is routed there.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from .events import hub
+
+COUNTER_KEYS = {
+    "fully_signed_documents": "overview:fully_signed_documents",
+    "pending_documents": "overview:pending_documents",
+    "total_users": "overview:total_users",
+}
+COMPUTED_AT_KEY = "overview:computed_at"
+
+
+def compute_overview_counts():
+    """
+    Count the overview numbers straight from the primary database.
+    """
+    from signatures.models import DocumentSignature
+    from .models import CustomUser
+
+    doc_sigs = DocumentSignature.objects.using(DEFAULT_DB_ALIAS)
+    return {
+        # Fully signed documents (all signatures approved, not draft)
+        "fully_signed_documents": doc_sigs.filter(draft=False, fully_approved=True).count(),
+        # Pending documents: document signatures with at least one pending status
+        "pending_documents": doc_sigs.filter(draft=False, pending_count__gt=0).count(),
+        "total_users": CustomUser.objects.using(DEFAULT_DB_ALIAS).count(),
+    }
+
+
+async def acompute_overview_counts():
+    """
+    compute_overview_counts() with the async ORM.
+    """
+    from signatures.models import DocumentSignature
+    from .models import CustomUser
+
+    doc_sigs = DocumentSignature.objects.using(DEFAULT_DB_ALIAS)
+    return {
+        "fully_signed_documents": await doc_sigs.filter(draft=False, fully_approved=True).acount(),
+        "pending_documents": await doc_sigs.filter(draft=False, pending_count__gt=0).acount(),
+        "total_users": await CustomUser.objects.using(DEFAULT_DB_ALIAS).acount(),
+    }
+
+
+def _cache_values(counts, computed_at):
+    values = {COUNTER_KEYS[name]: value for name, value in counts.items()}
+    values[COMPUTED_AT_KEY] = computed_at
+    return values
+
+
+def store_overview_counts(counts):
+    computed_at = time.time()
+    cache.set_many(_cache_values(counts, computed_at), timeout=None)
+    return computed_at
+
+
+def refresh_overview_counts():
+    counts = compute_overview_counts()
+    return counts, store_overview_counts(counts)
+
+
+def get_overview_counts(fresh=False):
+    """
+    Return (counts, computed_at, from_cache). `computed_at` is the time of the last full recount;
+    increments applied since then are included in `counts`.
+    """
+    if not fresh:
+        hit = _cached_counts(cache.get_many(list(COUNTER_KEYS.values()) + [COMPUTED_AT_KEY]))
+        if hit is not None:
+            return (*hit, True)
+
+    counts, computed_at = refresh_overview_counts()
+    return counts, computed_at, False
+
+
+async def aget_overview_counts(fresh=False):
+    """
+    get_overview_counts() for async views.
+    """
+    if not fresh:
+        hit = _cached_counts(await cache.aget_many(list(COUNTER_KEYS.values()) + [COMPUTED_AT_KEY]))
+        if hit is not None:
+            return (*hit, True)
+
+    counts = await acompute_overview_counts()
+    computed_at = time.time()
+    await cache.aset_many(_cache_values(counts, computed_at), timeout=None)
+    return counts, computed_at, False
+
+
+def _cached_counts(cached):
+    """
+    (counts, computed_at) from the cached values, or None if any is missing or they are too old.
+    """
+    computed_at = cached.get(COMPUTED_AT_KEY)
+    max_age = getattr(settings, "OVERVIEW_CACHE_MAX_AGE", 300)
+    if (
+        len(cached) == len(COUNTER_KEYS) + 1
+        and (max_age is None or time.time() - computed_at <= max_age)
+    ):
+        return {name: cached[key] for name, key in COUNTER_KEYS.items()}, computed_at
+    return None
+
+
+def adjust_overview_counts(**deltas):
+    """
+    Apply increments such as adjust_overview_counts(pending_documents=-1, fully_signed_documents=1).
+    A missing key is left alone; the next read recounts everything.
+    Connected SSE clients are sent the new counts.
+    """
+    changed = False
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        try:
+            cache.incr(COUNTER_KEYS[name], delta)
+            changed = True
+        except ValueError:
+            invalidate_overview_counts()
+            return
+    if changed:
+        publish_overview()
+
+
+def publish_overview():
+    if not hub.has_subscribers():
+        return
+    cached = cache.get_many(list(COUNTER_KEYS.values()))
+    if len(cached) == len(COUNTER_KEYS):
+        hub.publish({"type": "overview", **{name: cached[key] for name, key in COUNTER_KEYS.items()}})
+
+
+def invalidate_overview_counts():
+    cache.delete(COMPUTED_AT_KEY)
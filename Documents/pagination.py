@@ -0,0 +1,149 @@
+"""
+Keyset (cursor) pagination shared by the list endpoints.
+
+Pages are selected with a WHERE on the ordering columns instead of OFFSET, so fetching
+page N costs the same as page 1 as long as an index covers the ordering. The cursor is
+an opaque token holding the ordering values of the last row on the previous page.
+"""
+import base64
+import json
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ParseError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _is_scalar(value):
+    if isinstance(value, (bool, str, float)):
+        return True
+    # Larger integers overflow the database's integer columns
+    return isinstance(value, int) and -2 ** 63 <= value < 2 ** 63
+
+
+def _query_params(request):
+    # DRF requests have query_params; the async views get plain Django requests
+    return getattr(request, "query_params", request.GET)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginate a queryset on `ordering`, which must end in a unique column (normally id).
+
+    Function views call paginate_queryset() and merge get_page_info() into their own
+    envelope; generic views can use it as `pagination_class`, in which case the body stays
+    a plain list and the next page is advertised in the Link header.
+    """
+    ordering = ("-created_at", "-id")
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor"
+
+    def __init__(self, ordering=None):
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+        self.page_size = None
+        self.next_cursor = None
+        self.request = None
+
+    def get_page_size(self, request):
+        default = getattr(settings, "PAGINATION_PAGE_SIZE", 50)
+        maximum = getattr(settings, "PAGINATION_MAX_PAGE_SIZE", 500)
+        try:
+            page_size = int(_query_params(request).get(self.page_size_query_param, default))
+        except (TypeError, ValueError):
+            page_size = default
+        return max(1, min(page_size, maximum))
+
+    def encode_cursor(self, obj):
+        values = [_encode_value(getattr(obj, field.lstrip("-"))) for field in self.ordering]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (TypeError, ValueError):
+            raise ParseError(self.invalid_cursor_message)
+        if (
+            not isinstance(values, list)
+            or len(values) != len(self.ordering)
+            or not all(_is_scalar(value) for value in values)
+        ):
+            raise ParseError(self.invalid_cursor_message)
+        return values
+
+    def keyset_filter(self, values):
+        """
+        Rows strictly after `values` in `ordering`:
+        (a > x) OR (a = x AND b > y) OR ...  with > flipped to < for descending fields.
+        """
+        condition = Q()
+        equal_so_far = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal_so_far & Q(**{f"{name}__{lookup}": value})
+            equal_so_far &= Q(**{name: value})
+        return condition
+
+    def page_queryset(self, queryset, request):
+        """
+        The queryset for the requested page, with one extra row to tell whether there is a next page.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = _query_params(request).get(self.cursor_query_param)
+        if cursor:
+            try:
+                queryset = queryset.filter(self.keyset_filter(self.decode_cursor(cursor)))
+            except (TypeError, ValueError, ValidationError):
+                # Values of the wrong type for their column
+                raise ParseError(self.invalid_cursor_message)
+        return queryset[:self.page_size + 1]
+
+    def take_page(self, rows):
+        page = rows[:self.page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if len(rows) > self.page_size else None
+        return page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.take_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        """
+        paginate_queryset() for async views (plain Django requests, async ORM).
+        """
+        return self.take_page([row async for row in self.page_queryset(queryset, request)])
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_page_info(self):
+        return {
+            "next_cursor": self.next_cursor,
+            "next": self.get_next_link(),
+            "page_size": self.page_size,
+        }
+
+    def get_headers(self):
+        next_link = self.get_next_link()
+        return {"Link": f'<{next_link}>; rel="next"'} if next_link else {}
+
+    def get_paginated_response(self, data):
+        return Response(data, headers=self.get_headers())
@@ -0,0 +1,76 @@
+"""
+Serializers that know which relations they read.
+
+A serializer using PrefetchingSerializerMixin lists the relations its fields follow in
+Meta.select_related / Meta.prefetch_related. Nested serializers contribute their own
+needs, prefixed with the field's source, so a parent never has to repeat what a child
+reads. When the serializer is given a QuerySet the lookups are added to it; when it is
+given a list (e.g. a page from KeysetPagination) they are fetched with
+prefetch_related_objects, one query per relation instead of one per row.
+
+Views that paginate should call Serializer.optimize_queryset() before paginating so
+forward relations are joined into the page query.
+"""
+from django.db.models import QuerySet, prefetch_related_objects
+from rest_framework import serializers
+
+_needs_cache = {}
+
+
+class PrefetchingSerializerMixin:
+
+    @classmethod
+    def relation_needs(cls):
+        """
+        (select_related, prefetch_related) lookups for this serializer and its nested serializers.
+        """
+        if cls not in _needs_cache:
+            meta = getattr(cls, "Meta", None)
+            select = list(getattr(meta, "select_related", ()))
+            prefetch = list(getattr(meta, "prefetch_related", ()))
+
+            for field in cls().fields.values():
+                many = isinstance(field, serializers.ListSerializer)
+                nested = field.child if many else field
+                if not isinstance(nested, PrefetchingSerializerMixin) or field.source == "*":
+                    continue
+                prefix = field.source.replace(".", "__")
+                child_select, child_prefetch = type(nested).relation_needs()
+                if many:
+                    # Everything below a to-many relation has to be prefetched
+                    prefetch.append(prefix)
+                    prefetch.extend(f"{prefix}__{lookup}" for lookup in child_select + child_prefetch)
+                else:
+                    select.append(prefix)
+                    select.extend(f"{prefix}__{lookup}" for lookup in child_select)
+                    prefetch.extend(f"{prefix}__{lookup}" for lookup in child_prefetch)
+
+            _needs_cache[cls] = (list(dict.fromkeys(select)), list(dict.fromkeys(prefetch)))
+        return _needs_cache[cls]
+
+    @classmethod
+    def optimize_queryset(cls, queryset):
+        select, prefetch = cls.relation_needs()
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+    @classmethod
+    def optimize_instances(cls, instances):
+        if isinstance(instances, QuerySet):
+            return cls.optimize_queryset(instances)
+        if isinstance(instances, (list, tuple)) and instances:
+            select, prefetch = cls.relation_needs()
+            # Relations already joined or prefetched on the instances are skipped
+            prefetch_related_objects(list(instances), *select, *prefetch)
+        return instances
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        if args:
+            args = (cls.optimize_instances(args[0]),) + args[1:]
+        elif "instance" in kwargs:
+            kwargs["instance"] = cls.optimize_instances(kwargs["instance"])
+        return super().many_init(*args, **kwargs)
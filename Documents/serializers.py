@@ -1,12 +1,17 @@
 from rest_framework import serializers
+from django.conf import settings
+from django.urls import reverse
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from .models import *
+from . import hashing
+from .prefetching import PrefetchingSerializerMixin
+from .thumbnails import thumbnail_url
 
 
 User = get_user_model()
 
-class RegisterSerializer(serializers.ModelSerializer):
+class RegisterSerializer(PrefetchingSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
 
     class Meta:
@@ -14,13 +19,15 @@ class RegisterSerializer(serializers.ModelSerializer):
         fields = ('username', 'email', 'password', 'role', 'post')
 
     def create(self, validated_data):
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data['email'],
-            password=validated_data['password'],
+        # What create_user() does, with the password hashed in the hashing pool
+        user = User(
+            username=User.normalize_username(validated_data['username']),
+            email=User.objects.normalize_email(validated_data['email']),
+            password=hashing.make_password(validated_data['password']),
             role=validated_data['role'],
             post=validated_data['post'],
         )
+        user.save()
         return user
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
@@ -28,18 +35,23 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
     def get_token(cls, user):
         token = super().get_token(user)
         token['username'] = user.username
+        # Checked by CachedJWTAuthentication (Documents/authentication.py)
+        token['role'] = user.role
         return token
 
 
 
-class DocumentSerializer(serializers.ModelSerializer):
+class DocumentSerializer(PrefetchingSerializerMixin, serializers.ModelSerializer):
     owner_username = serializers.CharField(source='owner.username', read_only=True)
     file_url = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
 
     class Meta:
         model = Document
-        fields = ['id', 'title', 'file', 'file_url', 'owner', 'owner_username', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'owner', 'owner_username', 'file_url', 'created_at', 'updated_at']
+        fields = ['id', 'title', 'file', 'original_filename', 'file_url', 'download_url', 'thumbnail_url', 'owner', 'owner_username', 'content_hash', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'original_filename', 'owner', 'owner_username', 'file_url', 'download_url', 'thumbnail_url', 'content_hash', 'created_at', 'updated_at']
+        select_related = ['owner']
 
     def get_file_url(self, obj):
         request = self.context.get('request')
@@ -47,3 +59,46 @@ class DocumentSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.file.url)
         return None
 
+    def get_download_url(self, obj):
+        request = self.context.get('request')
+        if obj.file and request:
+            return request.build_absolute_uri(reverse('document-download', args=[obj.id]))
+        return None
+
+    def get_thumbnail_url(self, obj):
+        return thumbnail_url(self.context.get('request'), 'document-thumbnail', obj.id, obj.file)
+
+    def validate_file(self, value):
+        max_size = settings.DOCUMENT_MAX_UPLOAD_SIZE
+        if value.size > max_size:
+            raise serializers.ValidationError(f"File is larger than {max_size} bytes; use the chunked upload API.")
+        return value
+
+
+class UploadSessionSerializer(PrefetchingSerializerMixin, serializers.ModelSerializer):
+    upload_id = serializers.UUIDField(source='id', read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ['upload_id', 'title', 'filename', 'total_size', 'received_size', 'expected_sha256', 'status', 'document', 'created_at', 'updated_at']
+        read_only_fields = ['upload_id', 'received_size', 'status', 'document', 'created_at', 'updated_at']
+
+    def validate_total_size(self, value):
+        max_size = settings.CHUNKED_UPLOAD_MAX_SIZE
+        if value <= 0 or value > max_size:
+            raise serializers.ValidationError(f"File size must be between 1 and {max_size} bytes.")
+        return value
+
+    def validate_expected_sha256(self, value):
+        value = value.lower()
+        if value and (len(value) != 64 or any(c not in "0123456789abcdef" for c in value)):
+            raise serializers.ValidationError("Must be a hex SHA-256 digest.")
+        return value
+
+
+
+class JobSerializer(PrefetchingSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'status', 'attempts', 'max_attempts', 'run_after', 'result', 'last_error', 'created_at', 'updated_at', 'finished_at']
+        read_only_fields = fields
@@ -0,0 +1,161 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from signatures.models import DocumentSignature, DocumentSignatureStatus, Signature
+from .models import CustomUser, Document, StoredBlob
+from . import authentication, object_cache
+from .overview import adjust_overview_counts, invalidate_overview_counts
+from .storage import digest_from_name
+
+
+def _overview_state(doc_sig):
+    """
+    What a DocumentSignature contributes to the overview: (fully signed, pending).
+    """
+    if doc_sig.draft:
+        return (0, 0)
+    return (int(doc_sig.fully_approved), int(doc_sig.pending_count > 0))
+
+
+def _apply_on_commit(old_state, new_state):
+    if old_state is None:
+        # Loaded with the counter fields deferred, so the change is unknown: recount
+        transaction.on_commit(invalidate_overview_counts)
+        return
+    fully_delta = new_state[0] - old_state[0]
+    pending_delta = new_state[1] - old_state[1]
+    if fully_delta or pending_delta:
+        transaction.on_commit(lambda: adjust_overview_counts(
+            fully_signed_documents=fully_delta,
+            pending_documents=pending_delta,
+        ))
+
+
+OVERVIEW_FIELDS = {"draft", "fully_approved", "pending_count"}
+
+
+@receiver(post_init, sender=DocumentSignature)
+def remember_overview_state(sender, instance, **kwargs):
+    if not instance.pk:
+        instance._overview_state = (0, 0)
+    elif OVERVIEW_FIELDS & instance.get_deferred_fields():
+        # Reading them would cost a query per instance under .only()/.defer()
+        instance._overview_state = None
+    else:
+        instance._overview_state = _overview_state(instance)
+
+
+@receiver(post_save, sender=DocumentSignature)
+def document_signature_saved(sender, instance, created, **kwargs):
+    old_state = (0, 0) if created else instance._overview_state
+    new_state = _overview_state(instance)
+    instance._overview_state = new_state
+    _apply_on_commit(old_state, new_state)
+
+
+@receiver(post_delete, sender=DocumentSignature)
+def document_signature_deleted(sender, instance, **kwargs):
+    _apply_on_commit(instance._overview_state, (0, 0))
+
+
+@receiver(post_delete, sender=DocumentSignatureStatus)
+def document_signature_status_deleted(sender, instance, **kwargs):
+    # Status changes reach the overview through the parent's counters, but a deleted
+    # status row leaves those counters stale until they are repaired, so recount.
+    transaction.on_commit(invalidate_overview_counts)
+
+
+@receiver(post_save, sender=CustomUser)
+def user_saved(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: adjust_overview_counts(total_users=1))
+
+
+@receiver(post_delete, sender=CustomUser)
+def user_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: adjust_overview_counts(total_users=-1))
+
+
+def drop_cached_object(sender, instance, **kwargs):
+    pk = instance.pk
+    object_cache.invalidate(sender, pk)
+    # Again after commit, in case a concurrent read cached the old row in between
+    transaction.on_commit(lambda: object_cache.invalidate(sender, pk, count=False))
+
+
+for model in (CustomUser, Signature, Document):
+    post_save.connect(drop_cached_object, sender=model)
+    post_delete.connect(drop_cached_object, sender=model)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def drop_authenticated_user(sender, instance, **kwargs):
+    pk = instance.pk
+    authentication.invalidate(pk)
+    transaction.on_commit(lambda: authentication.invalidate(pk))
+
+
+# File fields stored in the content-addressed storage, whose blob references are counted
+BLOB_FIELDS = {
+    Document: "file",
+    DocumentSignature: "edited_file",
+    Signature: "file",
+}
+
+
+def _blob_name(instance):
+    name = getattr(instance, BLOB_FIELDS[type(instance)]).name
+    return name if digest_from_name(name) else None
+
+
+def _adjust_blob_ref(name, delta):
+    if name:
+        StoredBlob.objects.filter(name=name).update(ref_count=F("ref_count") + delta)
+
+
+# _blob_name of an instance loaded with its file field deferred: looked up only if it is saved
+_UNKNOWN = object()
+
+
+def remember_blob_name(sender, instance, **kwargs):
+    if not instance.pk:
+        instance._blob_name = None
+    elif BLOB_FIELDS[sender] in instance.get_deferred_fields():
+        # Reading it would cost a query per instance under .only()/.defer()
+        instance._blob_name = _UNKNOWN
+    else:
+        instance._blob_name = _blob_name(instance)
+
+
+def load_blob_name(sender, instance, **kwargs):
+    if getattr(instance, "_blob_name", None) is _UNKNOWN:
+        name = sender._default_manager.filter(pk=instance.pk).values_list(BLOB_FIELDS[sender], flat=True).first()
+        instance._blob_name = name if digest_from_name(name) else None
+
+
+def count_blob_refs(sender, instance, **kwargs):
+    old_name = instance._blob_name
+    new_name = _blob_name(instance)
+    if new_name != old_name:
+        _adjust_blob_ref(new_name, 1)
+        _adjust_blob_ref(old_name, -1)
+        instance._blob_name = new_name
+
+    if sender is Document and new_name and not instance.content_hash:
+        instance.content_hash = digest_from_name(new_name)
+        Document.objects.filter(pk=instance.pk).update(content_hash=instance.content_hash)
+
+
+def release_blob_ref(sender, instance, **kwargs):
+    _adjust_blob_ref(instance._blob_name, -1)
+
+
+for model in BLOB_FIELDS:
+    post_init.connect(remember_blob_name, sender=model)
+    pre_save.connect(load_blob_name, sender=model)
+    pre_delete.connect(load_blob_name, sender=model)
+    post_save.connect(count_blob_refs, sender=model)
+    post_delete.connect(release_blob_ref, sender=model)
@@ -0,0 +1,174 @@
+"""
+Content-addressed file storage.
+
+Files are stored once per distinct content under cas/<aa>/<bb>/<sha256><ext>, so the same
+PDF or signature image uploaded many times takes the space of one copy. StoredBlob rows
+track size and how many model fields point at each blob (see Documents/signals.py);
+`manage.py gc_blobs` recounts them, deletes unreferenced blobs (and blob files with no
+StoredBlob row, left by transactions that rolled back) and reports the savings.
+"""
+import hashlib
+import os
+import re
+import shutil
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.core.files.storage import FileSystemStorage, storages
+
+BLOB_PREFIX = "cas/"
+# Blobs are written here first, then linked into place
+TMP_PREFIX = "cas/tmp/"
+_BLOB_NAME_RE = re.compile(r"^cas/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})")
+
+
+def blob_name_for(digest, original_name):
+    ext = os.path.splitext(original_name)[1].lower()
+    return f"{BLOB_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+def digest_from_name(name):
+    """
+    SHA-256 encoded in a blob name, or None for files stored outside the CAS.
+    """
+    match = _BLOB_NAME_RE.match(name or "")
+    return match.group(1) if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage that names files by the SHA-256 of their content and skips
+    the write when a blob with that content already exists.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Names are derived from content in _save, so there is nothing to de-clash
+        return name
+
+    def _makedirs(self, directory):
+        if self.directory_permissions_mode is not None:
+            # As FileSystemStorage does: os.makedirs() doesn't apply the mode to intermediate directories
+            old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+            try:
+                os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+            finally:
+                os.umask(old_umask)
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+    def write_blob(self, name, content):
+        """
+        Hash `content` while writing it to a temporary file, then link that file in under
+        its blob name. A blob that already exists (including one written by a concurrent
+        upload of the same content) is kept as is. Touches only the filesystem, so it can
+        run off the request thread. Returns (blob name, sha256, size).
+        """
+        tmp_path = self.path(f"{TMP_PREFIX}{uuid.uuid4().hex}")
+        self._makedirs(os.path.dirname(tmp_path))
+        hasher = hashlib.sha256()
+        size = 0
+        if hasattr(content, "seek"):
+            content.seek(0)
+        try:
+            with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666), "wb") as f:
+                for chunk in content.chunks():
+                    hasher.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            if hasattr(content, "seek"):
+                content.seek(0)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp_path, self.file_permissions_mode)
+
+            digest = hasher.hexdigest()
+            blob_name = blob_name_for(digest, name)
+            self._link_blob(tmp_path, self.path(blob_name))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return blob_name, digest, size
+
+    def _link_blob(self, source_path, blob_path, fallback=os.replace):
+        """
+        Hard-link a file with the blob's content in under its blob name. `fallback` moves
+        or copies it when hard links aren't possible (another filesystem, or no support).
+        """
+        self._makedirs(os.path.dirname(blob_path))
+        try:
+            # Fails rather than overwrites if the blob exists
+            os.link(source_path, blob_path)
+        except FileExistsError:
+            # Fresh again, so gc_blobs leaves it alone until its record is committed
+            os.utime(blob_path)
+        except OSError:
+            # The content is the same either way
+            fallback(source_path, blob_path)
+
+    def adopt_file(self, path, name, digest):
+        """
+        Store the local file at `path`, whose SHA-256 is already known, as a blob without
+        reading it again: it is hard-linked in when it is on the same filesystem, and only
+        copied otherwise. The file itself is left in place. Returns the blob name.
+        """
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+        blob_name = blob_name_for(digest, name)
+        tmp_path = self.path(f"{TMP_PREFIX}{uuid.uuid4().hex}")
+
+        def copy_in(source_path, blob_path):
+            # Through a temporary file, so a partial copy never carries the blob name
+            self._makedirs(os.path.dirname(tmp_path))
+            shutil.copyfile(source_path, tmp_path)
+            self._link_blob(tmp_path, blob_path)
+
+        try:
+            self._link_blob(path, self.path(blob_name), fallback=copy_in)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return blob_name
+
+    def record_blob(self, blob_name, digest, size):
+        from .models import StoredBlob
+
+        return StoredBlob.objects.get_or_create(name=blob_name, defaults={"sha256": digest, "size": size})[0]
+
+    def _save(self, name, content):
+        blob_name, digest, size = self.write_blob(name, content)
+        self.record_blob(blob_name, digest, size)
+        if not self.exists(blob_name):
+            # gc_blobs removed an unreferenced blob between the write and the record
+            self.write_blob(name, content)
+        return blob_name
+
+    async def asave_blob(self, name, content):
+        """
+        save() for async views: hashing and writing run in a worker thread, the StoredBlob
+        row is recorded with the async ORM.
+        """
+        from .models import StoredBlob
+
+        write_blob = sync_to_async(self.write_blob, thread_sensitive=False)
+        blob_name, digest, size = await write_blob(name, content)
+        await StoredBlob.objects.aget_or_create(name=blob_name, defaults={"sha256": digest, "size": size})
+        if not await sync_to_async(self.exists, thread_sensitive=False)(blob_name):
+            # gc_blobs removed an unreferenced blob between the write and the record
+            await write_blob(name, content)
+        return blob_name
+
+    def delete(self, name):
+        # Blobs are shared between records; only gc_blobs removes them
+        if digest_from_name(name):
+            return
+        super().delete(name)
+
+    def delete_blob(self, name):
+        super().delete(name)
+
+
+def content_addressed_storage():
+    """
+    Storage for Document.file, DocumentSignature.edited_file and Signature.file
+    (the "content_addressed" alias in settings.STORAGES).
+    """
+    return storages["content_addressed"]
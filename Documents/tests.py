@@ -1,3 +1,929 @@
-from django.test import TestCase
+import base64
+import hashlib
+import io
+import json
+import os
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.cache import cache, caches
+from django.core.files import locks
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth.hashers import check_password
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+
+from . import hashing, jobs, object_cache
+from .overview import COUNTER_KEYS, aget_overview_counts, get_overview_counts
+from .authentication import CachedJWTAuthentication
+from .models import CustomUser, Document, Job, StoredBlob, UploadSession
+from .storage import TMP_PREFIX, content_addressed_storage
+from .serializers import DocumentSerializer, MyTokenObtainPairSerializer
+from .uploads import part_path
+from . import thumbnails
+from .thumbnails import ThumbnailCache, ThumbnailError, downscale, encode_png, get_thumbnail_cache, render_thumbnail
+from signatures.models import DocumentSignature, DocumentSignatureStatus, Signature
+from signatures.stamping import decode_png
+from Signmagics.instrumentation import QueryBudgetExceeded, fingerprint, metrics_snapshot, reset_metrics
+from Signmagics.replicas import PrimaryReplicaRouter, _reading_from_replica
+from Signmagics.sqlite.base import DatabaseWrapper as SqliteWrapper
+
+
+class DocumentQueryCountTests(TestCase):
+    """
+    Listing documents costs the same number of queries whatever the page size.
+    """
+
+    def setUp(self):
+        self.owner = CustomUser.objects.create_user(username="owner", password="x", role="admin")
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def add_documents(self, count):
+        Document.objects.bulk_create([
+            Document(title=f"Document {i}", file=f"documents/{i}.pdf", owner=self.owner) for i in range(count)
+        ])
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_documents_by_person_is_constant(self):
+        url = f"/api/auth/documents/list/{self.owner.id}/"
+        self.add_documents(2)
+        small = self.count_queries(url)
+        self.add_documents(20)
+        self.assertEqual(self.count_queries(url), small)
+
+    def test_serializer_declares_owner(self):
+        self.assertEqual(DocumentSerializer.relation_needs(), (["owner"], []))
+
+    def test_list_of_instances_is_prefetched(self):
+        self.add_documents(5)
+        documents = list(Document.objects.all())
+        with self.assertNumQueries(1):
+            data = DocumentSerializer(documents, many=True).data
+        self.assertEqual({d["owner_username"] for d in data}, {"owner"})
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.owner = CustomUser.objects.create_user(username="owner", password="x", role="admin")
+        self.document = Document.objects.create(title="Contract", file="documents/c.pdf", owner=self.owner)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_unchanged_document_is_not_modified(self):
+        url = f"/api/auth/documents/{self.document.id}/"
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.document.title = "Renamed"
+        self.document.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_etag_changes_with_membership(self):
+        url = f"/api/auth/documents/list/{self.owner.id}/"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url + "?page_size=1", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        self.document.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        settings = self.settings(MEDIA_ROOT=self.tmp)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.storage = content_addressed_storage()
+        self.owner = CustomUser.objects.create_user(username="owner", password="x")
+
+    def upload(self, data=b"%PDF-1.4\n%%EOF\n", name="contract.pdf"):
+        return Document.objects.create(title=name, file=ContentFile(data, name=name), owner=self.owner)
+
+    def gc(self):
+        out = io.StringIO()
+        call_command("gc_blobs", "--grace-minutes", "0", stdout=out)
+        return out.getvalue()
+
+    def test_same_content_is_stored_once_and_counted(self):
+        first, second = self.upload(), self.upload(name="copy.PDF")
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertTrue(first.file.name.startswith("cas/") and first.file.name.endswith(".pdf"))
+        blob = StoredBlob.objects.get()
+        self.assertEqual((blob.ref_count, blob.sha256), (2, first.content_hash))
+
+        # Saving an instance loaded without its file field leaves the count alone
+        document = Document.objects.only("id", "title").get(pk=first.pk)
+        document.title = "Renamed"
+        document.save()
+        first.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+
+        second.delete()
+        StoredBlob.objects.update(created_at=timezone.now() - timedelta(hours=2))
+        self.assertIn("Unreferenced blobs deleted: 1", self.gc())
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertFalse(self.storage.exists(blob.name))
+
+    def test_gc_keeps_an_unreferenced_blob_that_is_being_reused(self):
+        self.upload().delete()
+        blob = StoredBlob.objects.get()
+        StoredBlob.objects.update(created_at=timezone.now() - timedelta(hours=2))
+        old = time.time() - 7200
+        os.utime(self.storage.path(blob.name), (old, old))
+
+        # An upload of the same content has written its blob but not yet recorded its reference
+        self.storage.write_blob("again.pdf", ContentFile(b"%PDF-1.4\n%%EOF\n"))
+        out = io.StringIO()
+        call_command("gc_blobs", "--grace-minutes", "60", stdout=out)
+        self.assertIn("Unreferenced blobs deleted: 0", out.getvalue())
+        self.assertTrue(self.storage.exists(blob.name))
+
+    def test_blob_removed_before_its_record_is_written_again(self):
+        record_blob = self.storage.record_blob
+
+        def record_after_gc(blob_name, digest, size):
+            # gc_blobs deletes the file of a zero-reference row in this window
+            os.remove(self.storage.path(blob_name))
+            return record_blob(blob_name, digest, size)
+
+        with mock.patch.object(self.storage, "record_blob", record_after_gc):
+            document = self.upload()
+        with document.file.open() as f:
+            self.assertEqual(f.read(), b"%PDF-1.4\n%%EOF\n")
+
+    def test_gc_deletes_files_without_a_record(self):
+        kept = self.upload()
+        # As left by an upload whose transaction rolled back, and by an interrupted write
+        orphan, _, _ = self.storage.write_blob("lost.pdf", ContentFile(b"rolled back"))
+        stale_tmp = self.storage.path(f"{TMP_PREFIX}abandoned")
+        with open(stale_tmp, "wb") as f:
+            f.write(b"partial")
+        old = time.time() - 3600
+        for path in (self.storage.path(orphan), stale_tmp):
+            os.utime(path, (old, old))
+
+        self.assertIn("Files without a blob record deleted: 2", self.gc())
+        self.assertFalse(self.storage.exists(orphan))
+        self.assertFalse(os.path.exists(stale_tmp))
+        self.assertTrue(self.storage.exists(kept.file.name))
+
+    def test_concurrent_writes_of_the_same_content(self):
+        data = os.urandom(256 * 1024)
+        barrier = threading.Barrier(8)
+
+        def write(_):
+            barrier.wait()
+            return self.storage.write_blob("same.bin", ContentFile(data))
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(write, range(8), timeout=30))
+        self.assertEqual(len({name for name, _, _ in results}), 1)
+        with self.storage.open(results[0][0]) as f:
+            self.assertEqual(f.read(), data)
+        self.assertEqual(os.listdir(self.storage.path(TMP_PREFIX)), [])
+
+
+class DownloadTests(TestCase):
+    data = b"%PDF-1.4\n0123456789\n%%EOF\n"
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        settings = self.settings(MEDIA_ROOT=self.tmp)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create_user(username="owner", password="x"))
+        response = self.client.post("/api/auth/documents/", {
+            "title": "Contract", "file": SimpleUploadedFile("Contract Final.pdf", self.data),
+        })
+        self.document = Document.objects.get(id=response.json()["id"])
+        self.url = f"/api/auth/documents/{self.document.id}/download/"
+
+    def test_full_range_and_conditional_responses(self):
+        response = self.client.get(self.url, {"download": "1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.data)
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="Contract Final.pdf"')
+        etag = response["ETag"]
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=9-18")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 9-18/{len(self.data)}")
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=1000-")
+        self.assertEqual((response.status_code, response["Content-Range"]), (416, f"bytes */{len(self.data)}"))
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # A stale If-Range gets the whole file
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-3", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_file_missing_from_storage_is_404(self):
+        os.remove(self.document.file.path)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class ChunkedUploadTests(TestCase):
+    data = b"%PDF-1.4\n" + b"x" * 90 + b"\n%%EOF\n"
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        settings = self.settings(MEDIA_ROOT=self.tmp, CHUNKED_UPLOAD_DIR=os.path.join(self.tmp, "chunks"))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create_user(username="owner", password="x"))
+
+    def start(self, sha256=None):
+        response = self.client.post("/api/auth/documents/uploads/", {
+            "title": "Big", "filename": "big.pdf", "total_size": len(self.data),
+            "expected_sha256": sha256 or hashlib.sha256(self.data).hexdigest(),
+        })
+        self.assertEqual(response.status_code, 201)
+        return f"/api/auth/documents/uploads/{response.json()['upload']['upload_id']}/"
+
+    def put(self, url, start, end):
+        return self.client.generic(
+            "PUT", url, self.data[start:end], content_type="application/octet-stream",
+            HTTP_CONTENT_RANGE=f"bytes {start}-{end - 1}/{len(self.data)}",
+        )
+
+    def test_resume_offsets_and_completion(self):
+        url = self.start()
+        self.assertEqual(self.put(url, 0, 40).status_code, 200)
+        response = self.put(url, 0, 40)
+        self.assertEqual((response.status_code, response.json()["received_size"]), (409, 40))
+        self.assertEqual(self.put(url, 60, 80).status_code, 409)
+        self.assertEqual(self.client.get(url).json()["upload"]["received_size"], 40)
+        self.assertEqual(self.client.post(f"{url}complete/").status_code, 400)
+
+        self.assertEqual(self.put(url, 40, len(self.data)).status_code, 200)
+        response = self.client.post(f"{url}complete/")
+        self.assertEqual(response.status_code, 201)
+        document = Document.objects.get(id=response.json()["document"]["id"])
+        self.assertEqual(document.content_hash, hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(document.original_filename, "big.pdf")
+        with document.file.open() as f:
+            self.assertEqual(f.read(), self.data)
+        # Linked in from the part file (still there: on_commit doesn't run in a TestCase), not copied
+        self.assertTrue(os.path.samefile(part_path(UploadSession.objects.get()), document.file.path))
+        blob = StoredBlob.objects.get(name=document.file.name)
+        self.assertEqual((blob.ref_count, blob.size), (1, len(self.data)))
+        self.assertEqual(self.client.post(f"{url}complete/").json()["document"]["id"], document.id)
+        self.assertEqual(self.put(url, len(self.data) - 1, len(self.data)).status_code, 409)
+
+    def test_chunk_for_an_offset_being_written_is_rejected(self):
+        url = self.start()
+        session = UploadSession.objects.get()
+        with open(part_path(session), "wb") as part:
+            locks.lock(part, locks.LOCK_EX)
+            response = self.put(url, 0, 40)
+        self.assertEqual(response.status_code, 409)
+        self.assertIn("being written", response.json()["detail"])
+        session.refresh_from_db()
+        self.assertEqual(session.received_size, 0)
+
+    def test_checksum_mismatch_discards(self):
+        url = self.start(sha256="0" * 64)
+        self.put(url, 0, len(self.data))
+        response = self.client.post(f"{url}complete/")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UploadSession.objects.exists())
+
+    @override_settings(DOCUMENT_MAX_UPLOAD_SIZE=1024)
+    def test_single_request_upload_is_refused_on_declared_size(self):
+        response = self.client.post("/api/auth/documents/", {
+            "title": "Too big", "file": SimpleUploadedFile("big.pdf", b"x" * 200 * 1024),
+        })
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Document.objects.exists())
+
+
+class OverviewCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.creator = CustomUser.objects.create_user(username="creator", password="x", role="admin")
+        self.signature = Signature.objects.create(user=self.creator, file="signatures/s.png")
+        self.document = Document.objects.create(title="Contract", file="documents/c.pdf", owner=self.creator)
+
+    def send(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            doc_sig = DocumentSignature(document=self.document, creator=self.creator, draft=False)
+            doc_sig.set_initial_counters(1)
+            doc_sig.save()
+        DocumentSignatureStatus.objects.create(document_signature=doc_sig, signature=self.signature)
+        return doc_sig
+
+    def cached_counts(self):
+        with self.assertNumQueries(0):
+            counts, _, from_cache = get_overview_counts()
+        self.assertTrue(from_cache)
+        return counts
+
+    def test_writes_increment_the_cached_counts(self):
+        counts, _, from_cache = get_overview_counts()
+        self.assertFalse(from_cache)
+        self.assertEqual(counts, {"fully_signed_documents": 0, "pending_documents": 0, "total_users": 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.create_user(username="signer", password="x")
+        doc_sig = self.send()
+        self.assertEqual(self.cached_counts(), {"fully_signed_documents": 0, "pending_documents": 1, "total_users": 2})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            DocumentSignature.apply_status_change(doc_sig.id, "pending", "approved")
+        self.assertEqual(self.cached_counts(), {"fully_signed_documents": 1, "pending_documents": 0, "total_users": 2})
+
+    def test_deferred_counters_are_not_loaded(self):
+        self.send()
+        self.send()
+        with self.assertNumQueries(1):
+            doc_sigs = list(DocumentSignature.objects.only("id"))
+        get_overview_counts()
+        with self.captureOnCommitCallbacks(execute=True):
+            doc_sigs[0].delete()
+        counts, _, from_cache = get_overview_counts()
+        self.assertEqual((counts["pending_documents"], from_cache), (1, False))
+
+    def test_missing_key_and_reconcile_recount(self):
+        self.send()
+        get_overview_counts()
+        cache.delete(COUNTER_KEYS["total_users"])
+        counts, _, from_cache = get_overview_counts()
+        self.assertEqual((counts["total_users"], from_cache), (1, False))
+
+        cache.set(COUNTER_KEYS["pending_documents"], 99)
+        out = io.StringIO()
+        with self.assertRaisesMessage(CommandError, "private to this process"):
+            call_command("reconcile_overview", stdout=out)
+        call_command("reconcile_overview", "--allow-local-cache", stdout=out)
+        self.assertIn("pending_documents: 1 (cached value was 99)", out.getvalue())
+        self.assertEqual(self.cached_counts()["pending_documents"], 1)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user(username="admin", password="x", role="admin")
+        for i in range(6):
+            CustomUser.objects.create_user(username=f"user{i}", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def get(self, **params):
+        return self.client.get("/api/auth/users/", params)
+
+    def test_cursors_walk_every_row_once(self):
+        seen, cursor = [], None
+        while True:
+            data = self.get(page_size=3, **({"cursor": cursor} if cursor else {})).json()
+            seen += [user["username"] for user in data["users"]]
+            cursor = data["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(set(seen), set(CustomUser.objects.values_list("username", flat=True)))
+
+    def test_malformed_cursors_are_rejected(self):
+        def encode(values):
+            return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+        for cursor in ("!!!", encode({"id": 1}), encode([1]), encode([[1], {"a": 1}]), encode(["soon", "x"]), encode(["2024-01-01", 2 ** 70])):
+            response = self.get(cursor=cursor)
+            self.assertEqual(response.status_code, 400, cursor)
+            self.assertEqual(response.json(), {"detail": "Invalid cursor"})
+
+
+@jobs.job_handler("test_echo")
+def _echo_job(payload):
+    return payload
+
+
+@jobs.job_handler("test_flaky")
+def _flaky_job(payload):
+    raise RuntimeError("try again")
+
+
+@jobs.job_handler("test_bad_input")
+def _bad_input_job(payload):
+    raise jobs.PermanentJobError("never going to work")
+
+
+@override_settings(JOB_RETRY_BASE_SECONDS=10, JOB_RETRY_MAX_SECONDS=30, JOB_LOCK_TIMEOUT=600)
+class JobQueueTests(TestCase):
+    def test_a_job_is_claimed_once(self):
+        job = jobs.enqueue("test_echo", {"n": 1})
+        jobs.enqueue("test_echo", delay=timedelta(minutes=5))
+
+        claimed = jobs.claim_next_job("w1")
+        self.assertEqual((claimed.id, claimed.status, claimed.attempts, claimed.locked_by), (job.id, "running", 1, "w1"))
+        self.assertIsNone(jobs.claim_next_job("w2"))
+
+        self.assertTrue(jobs.run_job(claimed))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.locked_by), ("succeeded", {"n": 1}, ""))
+
+    def test_failures_back_off_then_fail(self):
+        job = jobs.enqueue("test_flaky", max_attempts=3)
+        delays = []
+        for _ in range(3):
+            Job.objects.filter(id=job.id).update(run_after=timezone.now())
+            before = timezone.now()
+            self.assertFalse(jobs.run_job(jobs.claim_next_job("w1")))
+            job.refresh_from_db()
+            delays.append(round((job.run_after - before).total_seconds()))
+
+        self.assertEqual(delays[:2], [10, 20])
+        self.assertEqual((job.status, job.attempts), ("failed", 3))
+        self.assertIn("try again", job.last_error)
+
+    def test_backoff_is_capped(self):
+        self.assertEqual(jobs.retry_delay(10), timedelta(seconds=30))
+
+    def test_permanent_errors_fail_at_once(self):
+        job = jobs.enqueue("test_bad_input")
+        self.assertFalse(jobs.run_job(jobs.claim_next_job("w1")))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("failed", 1))
+
+    def test_only_jobs_without_a_heartbeat_are_requeued(self):
+        lost, alive = jobs.enqueue("test_echo"), jobs.enqueue("test_echo")
+        jobs.claim_next_job("w1")
+        jobs.claim_next_job("w2")
+        Job.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        alive.refresh_from_db()
+        self.assertEqual(jobs.touch_job(alive), 1)
+
+        self.assertEqual(jobs.requeue_stale_jobs(), 1)
+        lost.refresh_from_db()
+        alive.refresh_from_db()
+        self.assertEqual((lost.status, lost.locked_by), ("queued", ""))
+        self.assertEqual(alive.status, "running")
+        self.assertEqual(jobs.claim_next_job("w3").id, lost.id)
+
+
+class QueryInstrumentationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create_user(username="admin", password="x", role="admin"))
+        reset_metrics()
+        self.addCleanup(reset_metrics)
+
+    def test_fingerprint_collapses_literals(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM "t" WHERE "id" IN (%s, %s, %s) LIMIT 21'),
+            fingerprint('SELECT * FROM "t" WHERE "id" IN (%s, %s) LIMIT 5'),
+        )
+
+    def test_requests_are_timed_and_aggregated(self):
+        response = self.client.get("/api/auth/users/")
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries"')
+        [entry] = [v for v in metrics_snapshot() if v["view"] == "list_users"]
+        self.assertEqual((entry["requests"], entry["query_budget"], entry["over_budget"]), (1, 4, 0))
+
+    @override_settings(QUERY_BUDGETS={"list_users": 0}, QUERY_BUDGET_ENFORCE=True)
+    def test_enforced_budget_fails_the_request(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, "list_users ran"):
+            self.client.get("/api/auth/users/")
+
+    @override_settings(QUERY_BUDGETS={"list_users": 0}, QUERY_BUDGET_ENFORCE=False)
+    def test_budget_is_logged_when_not_enforced(self):
+        with self.assertLogs("Signmagics.instrumentation", "WARNING") as logs:
+            response = self.client.get("/api/auth/users/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("(budget 0)", logs.output[0])
+        self.assertEqual(metrics_snapshot()[0]["over_budget"], 1)
+
+
+class ObjectCacheTests(TestCase):
+    def setUp(self):
+        object_cache.clear()
+        self.users = [CustomUser.objects.create_user(username=f"user{i}", password="x") for i in range(3)]
+        object_cache.clear()
+        object_cache.reset_stats()
+
+    def test_get_many_reads_through_once(self):
+        ids = [user.id for user in self.users]
+        with self.assertNumQueries(1):
+            self.assertEqual(set(object_cache.get_many(CustomUser, ids + [999999])), set(ids))
+        with self.assertNumQueries(0):
+            self.assertEqual(object_cache.get(CustomUser, ids[0]).username, "user0")
+        self.assertEqual(object_cache.stats()["hits"], 1)
+
+    def test_save_and_delete_invalidate(self):
+        user = self.users[0]
+        object_cache.get(CustomUser, user.id)
+        user.post = "Manager"
+        user.save()
+        self.assertEqual(object_cache.get(CustomUser, user.id).post, "Manager")
+        user.delete()
+        self.assertIsNone(object_cache.get(CustomUser, user.id))
+
+    def test_a_read_racing_a_write_does_not_cache_the_old_row(self):
+        user = self.users[0]
+        load = object_cache._load
+
+        def load_then_write(model, pks):
+            loaded = load(model, pks)
+            # Another request saves the row after this one read it
+            CustomUser.objects.filter(id=user.id).update(post="Manager")
+            object_cache.invalidate(CustomUser, user.id)
+            return loaded
+
+        with mock.patch.object(object_cache, "_load", load_then_write):
+            self.assertEqual(object_cache.get(CustomUser, user.id).post, None)
+        self.assertEqual(object_cache.get(CustomUser, user.id).post, "Manager")
+
+    def test_queryset_update_needs_an_explicit_invalidate(self):
+        user = self.users[0]
+        object_cache.get(CustomUser, user.id)
+        # update() sends no signals, so the cached row stays until it expires...
+        CustomUser.objects.filter(id=user.id).update(post="Manager")
+        self.assertEqual(object_cache.get(CustomUser, user.id).post, None)
+        # ...or is invalidated by the caller
+        object_cache.invalidate(CustomUser, user.id)
+        self.assertEqual(object_cache.get(CustomUser, user.id).post, "Manager")
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        caches["auth_users"].clear()
+        self.user = CustomUser.objects.create_user(username="signer", password="x", role="signer")
+        self.token = MyTokenObtainPairSerializer.get_token(self.user).access_token
+        self.auth = CachedJWTAuthentication()
+
+    def authenticate(self):
+        return self.auth.get_user(self.auth.get_validated_token(str(self.token)))
+
+    def test_token_carries_role_and_user_is_cached(self):
+        self.assertEqual(self.token["role"], "signer")
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate(), self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate().username, "signer")
+        response = self.client.get(f"/api/auth/profile/{self.user.id}/", HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        self.assertEqual(response.status_code, 200)
+
+    def test_deactivation_and_role_change_revoke(self):
+        self.authenticate()
+        self.user.role = "viewer"
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+        self.user.role = "signer"
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class PasswordHashingTests(TestCase):
+    def login(self, username, password):
+        return self.client.post("/api/auth/login/", {"username": username, "password": password})
+
+    def test_register_and_login_hash_in_the_pool(self):
+        response = self.client.post("/api/auth/register/", {
+            "username": "new", "email": "New@Example.COM", "password": "s3cret-pass", "role": "viewer", "post": "Clerk",
+        })
+        self.assertEqual(response.status_code, 201)
+        user = CustomUser.objects.get(username="new")
+        self.assertEqual(user.email, "New@example.com")
+        self.assertTrue(user.password.startswith("md5$"))
+
+        self.assertEqual(self.login("new", "wrong").status_code, 401)
+        response = self.login("new", "s3cret-pass")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("access", response.json())
+
+    @override_settings(PASSWORD_HASHING_MAX_PENDING=0, PASSWORD_HASHING_RETRY_AFTER=3)
+    def test_saturated_pool_sheds_with_retry_after(self):
+        CustomUser.objects.create_user(username="busy", password="x")
+        response = self.login("busy", "x")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "3")
+        self.assertEqual(hashing._pending, 0)
+
+    def test_broken_pool_sheds_and_is_replaced(self):
+        CustomUser.objects.create_user(username="busy", password="x")
+        self.assertEqual(self.login("busy", "x").status_code, 200)
+        pool = hashing.get_hashing_pool()
+        # Later tests share the module's pool, so drop it rather than only shutting it down
+        self.addCleanup(lambda: hashing._pool and hashing._discard_pool(hashing._pool))
+        for process in list(pool._processes.values()):
+            process.kill()
+            process.join()
+
+        self.assertEqual(self.login("busy", "x").status_code, 503)
+        self.assertEqual(hashing._pending, 0)
+        self.assertIsNot(hashing.get_hashing_pool(), pool)
+        self.assertEqual(self.login("busy", "x").status_code, 200)
+        self.assertEqual(hashing._pending, 0)
+
+    def test_import_users(self):
+        CustomUser.objects.create_user(username="taken", password="x")
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.write("username,email,password,role,post\n")
+            f.write("taken,t@example.com,pw0,signer,\n")
+            f.write("alice,a@example.com,pw1,admin,Director\n")
+            f.write("bob,,pw2,,\n")
+        self.addCleanup(os.remove, f.name)
+        out = io.StringIO()
+        call_command("import_users", f.name, "--workers", "1", stdout=out)
+
+        self.assertIn("Imported 2 user(s), skipped 1.", out.getvalue())
+        alice, bob = CustomUser.objects.get(username="alice"), CustomUser.objects.get(username="bob")
+        self.assertEqual((alice.role, alice.post, bob.role), ("admin", "Director", "signer"))
+        self.assertTrue(check_password("pw2", bob.password))
+
+
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        settings = self.settings(
+            MEDIA_ROOT=self.tmp, THUMBNAIL_CACHE_DIR=os.path.join(self.tmp, "thumbs"), THUMBNAIL_WORKERS=0,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.owner = CustomUser.objects.create_user(username="owner", password="x", role="admin")
+        pdf = ContentFile(b"%PDF-1.4\n%%EOF\n", name="contract.pdf")
+        self.document = Document.objects.create(title="Contract", file=pdf, owner=self.owner)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_document_thumbnail_is_cached_and_linked(self):
+        detail = self.client.get(f"/api/auth/documents/{self.document.id}/").json()
+        url = detail["thumbnail_url"]
+        self.assertIn(f"?v={self.document.content_hash[:16]}", url)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/png")
+        image = decode_png(response.content)
+        self.assertEqual(max(image.width, image.height), 128)
+
+        cache = get_thumbnail_cache()
+        hits = cache.stats["hits"]
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(cache.stats["hits"], hits + 1)
+
+        self.assertEqual(self.client.get(url, {"size": "huge"}).status_code, 400)
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = ThumbnailCache(os.path.join(self.tmp, "lru"), max_bytes=250)
+        for key in ("aa1", "bb2"):
+            cache.put(key, b"x" * 100)
+            time.sleep(0.01)
+        cache.get("aa1")  # now more recent than bb2
+        time.sleep(0.01)
+        cache.put("cc3", b"x" * 100)
+        self.assertIsNotNone(cache.get("aa1"))
+        self.assertIsNone(cache.get("bb2"))
+        self.assertEqual(cache.stats["evictions"], 1)
+
+    def test_downscale_averages_pixels(self):
+        pixels = bytes([0, 255] * 8)
+        self.assertEqual(downscale(4, 4, 1, pixels, 2), (2, 2, bytes([127] * 4)))
+
+    def test_missing_file_is_404(self):
+        os.remove(self.document.file.path)
+        Document.objects.filter(id=self.document.id).update(file="documents/gone.pdf")
+        response = self.client.get(f"/api/auth/documents/{self.document.id}/thumbnail/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_large_images_and_late_renders_are_refused(self):
+        path = os.path.join(self.tmp, "big.png")
+        with open(path, "wb") as f:
+            f.write(encode_png(40, 30, 1, bytes(1200)))
+        with self.assertRaisesMessage(ThumbnailError, "too large to preview (40x30)"):
+            render_thumbnail(path, "image", 16, max_pixels=1000)
+
+        with open(path, "wb") as f:
+            f.write(encode_png(40, 30, 1, bytes(1200))[:40])
+        with self.assertRaises(ThumbnailError) as ctx:
+            render_thumbnail(path, "image", 16)
+        self.assertEqual(ctx.exception.status, 415)
+
+        with self.assertRaises(ThumbnailError) as ctx:
+            render_thumbnail(path, "image", 16, deadline=time.time() - 1)
+        self.assertEqual(ctx.exception.status, 503)
+        self.assertEqual(pickle.loads(pickle.dumps(ctx.exception)).status, 503)
+
+    def test_pool_timeout_and_broken_pool_are_503(self):
+        path = os.path.join(self.tmp, "sig.png")
+        with open(path, "wb") as f:
+            f.write(encode_png(40, 30, 1, bytes(1200)))
+        with self.settings(THUMBNAIL_WORKERS=1, THUMBNAIL_RENDER_TIMEOUT=0.0001):
+            with self.assertRaises(ThumbnailError) as ctx:
+                thumbnails._render(path, "image", 16)
+            self.assertEqual(ctx.exception.status, 503)
+
+        with self.settings(THUMBNAIL_WORKERS=1):
+            pool = thumbnails.get_thumbnail_pool()
+            self.addCleanup(lambda: thumbnails._pool and thumbnails._pool.shutdown())
+            for process in list(pool._processes.values()):
+                process.kill()
+                process.join()
+            with self.assertRaises(ThumbnailError) as ctx:
+                thumbnails._render(path, "image", 16)
+            self.assertEqual(ctx.exception.status, 503)
+            self.assertIsNot(thumbnails.get_thumbnail_pool(), pool)
+            self.assertEqual(decode_png(thumbnails._render(path, "image", 16)).width, 16)
+
+
+class SqliteWriteLockTests(SimpleTestCase):
+    """
+    The in-process write lock of the Signmagics.sqlite backend, on a scratch database file.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.path = os.path.join(self.tmp, "lock.sqlite3")
+        with sqlite3.connect(self.path) as raw:
+            raw.execute("CREATE TABLE item (id INTEGER PRIMARY KEY, name TEXT)")
+
+    def connect(self, timeout=5):
+        conn = SqliteWrapper({
+            **connection.settings_dict,
+            "NAME": self.path,
+            "OPTIONS": {"timeout": timeout, "transaction_mode": "IMMEDIATE"},
+        }, alias="lock-test")
+        self.addCleanup(conn.close)
+        return conn
+
+    def begin(self, conn):
+        # What transaction.atomic() does on an autocommit connection
+        conn.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+
+    def insert(self, conn, name):
+        with conn.cursor() as cursor:
+            cursor.execute("INSERT INTO item (name) VALUES (%s)", [name])
+
+    def assertReleased(self, conn):
+        self.assertFalse(conn.holds_write_lock)
+        self.assertFalse(conn.write_lock.locked())
+
+    def test_released_on_commit_and_rollback(self):
+        conn = self.connect()
+        for end in (conn.commit, conn.rollback):
+            self.begin(conn)
+            self.insert(conn, "x")
+            self.assertTrue(conn.holds_write_lock)
+            end()
+            conn.set_autocommit(True)
+            self.assertReleased(conn)
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM item")
+            self.assertEqual(cursor.fetchone(), (1,))
+
+    def test_released_after_a_failed_begin(self):
+        # Another process holds SQLite's own write lock
+        other = sqlite3.connect(self.path, isolation_level=None)
+        self.addCleanup(other.close)
+        other.execute("BEGIN IMMEDIATE")
+        conn = self.connect(timeout=0.1)
+        with self.assertRaises(OperationalError):
+            self.begin(conn)
+        self.assertReleased(conn)
+
+    def test_released_on_close_inside_a_transaction(self):
+        conn = self.connect()
+        self.begin(conn)
+        self.insert(conn, "x")
+        conn.close()
+        self.assertReleased(conn)
+
+    def test_autocommit_write_waits_for_a_transaction_in_another_thread(self):
+        conn = self.connect()
+        self.begin(conn)
+        self.insert(conn, "in transaction")
+        done = threading.Event()
+
+        def write():
+            other = SqliteWrapper(conn.settings_dict, alias="lock-test")
+            try:
+                self.insert(other, "autocommit")
+                self.assertReleased(other)
+            finally:
+                other.close()
+                done.set()
+
+        with ThreadPoolExecutor(1) as executor:
+            future = executor.submit(write)
+            self.assertFalse(done.wait(0.2))
+            conn.commit()
+            conn.set_autocommit(True)
+            future.result(timeout=5)
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT name FROM item ORDER BY id")
+            self.assertEqual(cursor.fetchall(), [("in transaction",), ("autocommit",)])
+
+    def test_waiting_past_the_timeout_raises(self):
+        holder = self.connect()
+        self.begin(holder)
+
+        def write():
+            conn = SqliteWrapper({**holder.settings_dict, "OPTIONS": {"timeout": 0.1}}, alias="lock-test")
+            try:
+                self.insert(conn, "late")
+            finally:
+                conn.close()
+
+        with ThreadPoolExecutor(1) as executor:
+            with self.assertRaisesMessage(OperationalError, "in-process write lock"):
+                executor.submit(write).result(timeout=5)
+        holder.rollback()
+        holder.set_autocommit(True)
+
+
+@override_settings(REPLICA_DATABASE_ALIAS="replica")
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        object_cache.clear()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        media = self.settings(MEDIA_ROOT=self.tmp)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.admin = CustomUser.objects.create_user(username="admin", password="x", role="admin")
+        call_command("sync_replica", stdout=io.StringIO())
+        # Only on the primary until the next sync
+        CustomUser.objects.create_user(username="late", password="x", role="signer")
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def usernames(self):
+        response = self.client.get("/api/auth/users/")
+        self.assertEqual(response.status_code, 200)
+        return {user["username"] for user in response.json()["users"]}
+
+    def test_reporting_reads_use_the_replica_until_the_user_writes(self):
+        self.assertEqual(self.usernames(), {"admin"})
+
+        response = self.client.post("/api/auth/documents/", {
+            "title": "Contract", "file": SimpleUploadedFile("c.pdf", b"%PDF-1.4\n%%EOF\n"),
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.usernames(), {"admin", "late"})
+
+    def test_object_cache_fills_from_the_primary(self):
+        late = CustomUser.objects.get(username="late")
+        token = _reading_from_replica.set(True)
+        try:
+            self.assertEqual(PrimaryReplicaRouter().db_for_read(CustomUser), "replica")
+            self.assertEqual(object_cache.get(CustomUser, late.id).username, "late")
+        finally:
+            _reading_from_replica.reset(token)
+
+    def test_overview_recounts_from_the_primary(self):
+        response = self.client.get("/api/auth/overview/")
+        self.assertEqual((response.json()["total_users"], response.json()["cache"]["hit"]), (2, False))
+
+        token = _reading_from_replica.set(True)
+        try:
+            counts, _, from_cache = async_to_sync(aget_overview_counts)(fresh=True)
+        finally:
+            _reading_from_replica.reset(token)
+        self.assertEqual((counts["total_users"], from_cache), (2, False))
+
+    def test_writes_and_other_reads_use_the_primary(self):
+        router = PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(CustomUser), "default")
+        self.assertEqual(router.db_for_write(CustomUser), "default")
+        self.assertEqual(self.client.get(f"/api/auth/profile/{CustomUser.objects.get(username='late').id}/").status_code, 200)
@@ -0,0 +1,473 @@
+"""
+Thumbnails of documents (first page), edited files and signature images.
+
+Thumbnails are PNGs scaled to fit a square of one of THUMBNAIL_SIZES. They are rendered
+in a process pool (THUMBNAIL_WORKERS, 0 renders inline) and kept in an on-disk cache
+(THUMBNAIL_CACHE_DIR) keyed by the file's content hash and the size; the cache is
+bounded to THUMBNAIL_CACHE_MAX_BYTES and evicts the least recently used files first.
+Content-addressed files already carry their hash in the name, so a cached thumbnail is
+found without reading the source file.
+
+Renders are bounded: images larger than THUMBNAIL_MAX_PIXELS are refused before
+decoding, and a render that runs past THUMBNAIL_RENDER_TIMEOUT stops at its next
+checkpoint, in the request thread as well as in a pool worker, so an abandoned render
+doesn't keep a worker busy.
+
+PDF pages are rendered with pypdfium2 when it is installed. Without it a PDF gets a
+blank page with the first page's proportions, cached under its own key so that
+installing pypdfium2 later replaces it. PNG signatures are decoded in pure Python
+(signatures.stamping.decode_png); other image types need Pillow.
+
+The rendering functions must not import Django models: they run in the pool's workers.
+"""
+import hashlib
+import io
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.urls import reverse
+from django.utils.http import quote_etag
+
+from signatures.stamping import PNG_SIGNATURE, StampingError, decode_png
+from .downloads import _etag_matches
+from .storage import digest_from_name
+
+try:
+    from pypdf import PdfReader
+    from pypdf.errors import PdfReadError
+except ImportError:  # pragma: no cover - pypdf is in requirements.txt
+    PdfReader = None
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    PILImage = None
+
+DEFAULT_SIZES = {"small": 128, "medium": 256, "large": 512}
+DEFAULT_MAX_PIXELS = 2048 * 2048
+# Eviction frees space down to this fraction of THUMBNAIL_CACHE_MAX_BYTES
+EVICT_TO = 0.9
+
+
+class ThumbnailError(Exception):
+    """
+    The file can't be previewed (or the requested size doesn't exist, with status 400;
+    the file is missing, 404; rendering timed out or the pool broke, 503).
+    """
+
+    def __init__(self, message, status=415):
+        super().__init__(message)
+        self.status = status
+
+    def __reduce__(self):
+        # Keep the status when the error comes back from a pool worker
+        return type(self), (str(self), self.status)
+
+
+def _check_deadline(deadline):
+    if deadline is not None and time.time() > deadline:
+        raise ThumbnailError("Rendering the thumbnail timed out; try again later.", status=503)
+
+
+# Rendering
+
+def encode_png(width, height, channels, pixels):
+    """
+    PNG bytes for 8-bit pixels with 1 (gray), 2 (gray+alpha), 3 (RGB) or 4 (RGBA) channels.
+    """
+    def chunk(kind, body):
+        return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body) & 0xFFFFFFFF)
+
+    color_type = {1: 0, 2: 4, 3: 2, 4: 6}[channels]
+    stride = width * channels
+    raw = b"".join(b"\x00" + pixels[y * stride:(y + 1) * stride] for y in range(height))
+    return (
+        PNG_SIGNATURE
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw, 9))
+        + chunk(b"IEND", b"")
+    )
+
+
+def downscale(width, height, channels, pixels, size, deadline=None):
+    """
+    Shrink to fit a size x size square by averaging the source pixels under each
+    target pixel. Images already small enough are returned unchanged. `deadline`
+    (a time.time() value) is checked after every output row.
+    """
+    scale = size / max(width, height)
+    if scale >= 1:
+        return width, height, bytes(pixels)
+    new_width = max(1, round(width * scale))
+    new_height = max(1, round(height * scale))
+    stride = width * channels
+
+    columns = []
+    for x in range(new_width):
+        x0 = x * width // new_width
+        columns.append((x0, max((x + 1) * width // new_width, x0 + 1)))
+
+    out = bytearray(new_width * new_height * channels)
+    o = 0
+    for y in range(new_height):
+        _check_deadline(deadline)
+        y0 = y * height // new_height
+        y1 = max((y + 1) * height // new_height, y0 + 1)
+        for x0, x1 in columns:
+            n = (y1 - y0) * (x1 - x0)
+            for c in range(channels):
+                total = 0
+                for row in range(y0, y1):
+                    start = row * stride + x0 * channels + c
+                    total += sum(pixels[start:row * stride + x1 * channels:channels])
+                out[o] = total // n
+                o += 1
+    return new_width, new_height, bytes(out)
+
+
+def _check_pixels(width, height, max_pixels):
+    if max_pixels is not None and width * height > max_pixels:
+        raise ThumbnailError(f"The image is too large to preview ({width}x{height}).")
+
+
+def _decode_image(path, max_pixels=None):
+    """
+    (width, height, channels, pixels) of a signature image no larger than `max_pixels`.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if data.startswith(PNG_SIGNATURE):
+        # IHDR is always the first chunk: check the size before inflating anything
+        if len(data) >= 24 and data[12:16] == b"IHDR":
+            _check_pixels(*struct.unpack(">II", data[16:24]), max_pixels)
+        try:
+            image = decode_png(data)
+        except StampingError as e:
+            raise ThumbnailError(str(e))
+        color = zlib.decompress(image.data)
+        channels = 1 if image.colorspace == "/DeviceGray" else 3
+        if image.alpha is None:
+            return image.width, image.height, channels, color
+        pixels = bytearray(image.width * image.height * (channels + 1))
+        for c in range(channels):
+            pixels[c::channels + 1] = color[c::channels]
+        pixels[channels::channels + 1] = zlib.decompress(image.alpha)
+        return image.width, image.height, channels + 1, pixels
+
+    if PILImage is not None:
+        try:
+            image = PILImage.open(io.BytesIO(data))
+            # open() only reads the header
+            _check_pixels(image.width, image.height, max_pixels)
+            image = image.convert("RGBA")
+        except (OSError, ValueError) as e:
+            raise ThumbnailError(f"Unreadable image: {e}")
+        return image.width, image.height, 4, image.tobytes()
+    raise ThumbnailError("Only PNG images can be previewed without Pillow.")
+
+
+def _first_page_size(path):
+    """
+    Size of the first page in points; US Letter when pypdf can't tell.
+    """
+    if PdfReader is not None:
+        try:
+            box = PdfReader(path).pages[0].mediabox
+            return float(box.width), float(box.height)
+        except (PdfReadError, IndexError, ValueError, KeyError):
+            pass
+    return 612.0, 792.0
+
+
+def _render_pdf(path, size):
+    """
+    (width, height, channels, pixels) of the first page, at most size x size.
+    """
+    if pdfium is None:
+        # Blank page with a light border, in the first page's proportions
+        page_width, page_height = _first_page_size(path)
+        scale = size / max(page_width, page_height)
+        width, height = max(1, round(page_width * scale)), max(1, round(page_height * scale))
+        border = b"\xc8" * width
+        inner = b"\xc8" + b"\xff" * (width - 2) + b"\xc8" if width > 1 else border
+        return width, height, 1, border + inner * max(height - 2, 0) + (border if height > 1 else b"")
+
+    try:
+        pdf = pdfium.PdfDocument(path)
+    except pdfium.PdfiumError as e:
+        raise ThumbnailError(f"Unreadable PDF: {e}")
+    try:
+        if len(pdf) == 0:
+            raise ThumbnailError("The PDF has no pages.")
+        page = pdf[0]
+        page_width, page_height = page.get_size()
+        bitmap = page.render(scale=size / max(page_width, page_height), rev_byteorder=True)
+        width, height, channels = bitmap.width, bitmap.height, bitmap.n_channels
+        # Rows may be padded to `stride`
+        buffer = bytes(bitmap.buffer)
+        row = width * channels
+        pixels = b"".join(buffer[y * bitmap.stride:y * bitmap.stride + row] for y in range(height))
+        return width, height, channels, pixels
+    finally:
+        pdf.close()
+
+
+def render_thumbnail(path, kind, size, max_pixels=None, deadline=None):
+    """
+    PNG thumbnail of the file at `path` ("pdf" or "image") fitting a size x size square.
+    Raises ThumbnailError with status 503 once `deadline` (a time.time() value) has passed.
+    """
+    # The request may have given up while this waited in the pool's queue
+    _check_deadline(deadline)
+    if kind == "pdf":
+        width, height, channels, pixels = _render_pdf(path, size)
+    else:
+        width, height, channels, pixels = _decode_image(path, max_pixels)
+    _check_deadline(deadline)
+    width, height, pixels = downscale(width, height, channels, pixels, size, deadline)
+    return encode_png(width, height, channels, pixels)
+
+
+# Process pool
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_thumbnail_pool():
+    """
+    Lazily created process pool, or None when THUMBNAIL_WORKERS is 0.
+    """
+    global _pool
+    workers = getattr(settings, "THUMBNAIL_WORKERS", 2)
+    if not workers:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+        return _pool
+
+
+def _discard_pool(pool):
+    """
+    Drop a broken pool (a worker died, e.g. OOM-killed) so the next render starts a new one.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _render(path, kind, size):
+    """
+    render_thumbnail() in the pool (or inline), bounded by THUMBNAIL_RENDER_TIMEOUT.
+    """
+    max_pixels = getattr(settings, "THUMBNAIL_MAX_PIXELS", DEFAULT_MAX_PIXELS)
+    timeout = getattr(settings, "THUMBNAIL_RENDER_TIMEOUT", 30)
+    deadline = time.time() + timeout
+    pool = get_thumbnail_pool()
+    if pool is None:
+        return render_thumbnail(path, kind, size, max_pixels, deadline)
+    try:
+        future = pool.submit(render_thumbnail, path, kind, size, max_pixels, deadline)
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        raise ThumbnailError("Rendering the thumbnail timed out; try again later.", status=503)
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise ThumbnailError("Thumbnails are unavailable; try again later.", status=503)
+
+
+# On-disk cache
+
+class ThumbnailCache:
+    """
+    Directory of rendered thumbnails bounded to `max_bytes`. Reads bump a file's mtime,
+    so the eviction order is shared by every process using the directory and survives
+    restarts.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._used = None
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.png")
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.stats[name] += n
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return data
+
+    def put(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        with self._lock:
+            if self._used is not None:
+                self._used += len(data)
+            over = self._used is None or self._used > self.max_bytes
+        if over:
+            self.evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".png"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def evict(self):
+        """
+        Delete the least recently used thumbnails until the cache fits in EVICT_TO of max_bytes
+        (nothing is deleted while it is under max_bytes).
+        """
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            if total > self.max_bytes:
+                target = self.max_bytes * EVICT_TO
+                for _, size, path in entries:
+                    if total <= target:
+                        break
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+                    self.stats["evictions"] += 1
+            self._used = total
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = dict(self.stats, directory=self.directory, max_bytes=self.max_bytes, used_bytes=self._used)
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = round(snapshot["hits"] / lookups, 4) if lookups else None
+        return snapshot
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_thumbnail_cache():
+    directory = getattr(settings, "THUMBNAIL_CACHE_DIR", os.path.join(settings.MEDIA_ROOT, "thumbnails"))
+    max_bytes = getattr(settings, "THUMBNAIL_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+    with _caches_lock:
+        key = (str(directory), max_bytes)
+        if key not in _caches:
+            _caches[key] = ThumbnailCache(directory, max_bytes)
+        return _caches[key]
+
+
+def thumbnail_stats():
+    return {**get_thumbnail_cache().snapshot(), "pdf_renderer": "pdfium" if pdfium else "placeholder"}
+
+
+# Views
+
+def source_digest(fieldfile):
+    """
+    SHA-256 identifying the file's content: from the blob name for content-addressed
+    files, otherwise from its name, size and modification time.
+    """
+    digest = digest_from_name(fieldfile.name)
+    if digest:
+        return digest
+    stat = os.stat(fieldfile.path)
+    return hashlib.sha256(f"{fieldfile.name}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+
+
+def get_thumbnail(fieldfile, kind, size_name):
+    """
+    (cache key, PNG bytes) of the `size_name` thumbnail, rendered in the pool on a cache miss.
+    Raises ThumbnailError.
+    """
+    sizes = getattr(settings, "THUMBNAIL_SIZES", DEFAULT_SIZES)
+    if size_name not in sizes:
+        raise ThumbnailError(f"size must be one of: {', '.join(sizes)}.", status=400)
+    size = sizes[size_name]
+
+    try:
+        key = f"{source_digest(fieldfile)}-{size}"
+        if kind == "pdf" and pdfium is None:
+            key += "-placeholder"
+
+        cache = get_thumbnail_cache()
+        data = cache.get(key)
+        if data is None:
+            data = _render(fieldfile.path, kind, size)
+            cache.put(key, data)
+    except FileNotFoundError:
+        raise ThumbnailError("File is missing from storage.", status=404)
+    return key, data
+
+
+def thumbnail_response(request, fieldfile, kind, size_name):
+    """
+    The thumbnail as an image/png response with an ETag; raises ThumbnailError.
+    """
+    key, data = get_thumbnail(fieldfile, kind, size_name)
+    etag = quote_etag(key)
+    if _etag_matches(request.META.get("HTTP_IF_NONE_MATCH"), etag):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(data, content_type="image/png")
+    response["ETag"] = etag
+    # thumbnail_url() carries the content hash, so a changed file gets a new URL
+    response["Cache-Control"] = "private, max-age=86400"
+    return response
+
+
+def thumbnail_url(request, url_name, pk, fieldfile):
+    """
+    Absolute URL of the thumbnail endpoint `url_name` for object `pk`, or None without a file.
+    """
+    if not fieldfile or request is None:
+        return None
+    url = reverse(url_name, args=[pk])
+    digest = digest_from_name(fieldfile.name)
+    if digest:
+        url += f"?v={digest[:16]}"
+    return request.build_absolute_uri(url)
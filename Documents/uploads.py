@@ -0,0 +1,152 @@
+"""
+Disk-backed storage for resumable chunked uploads.
+
+Each UploadSession has a part file under CHUNKED_UPLOAD_DIR. Chunk bodies are copied
+from the request stream in fixed-size reads, so memory per upload stays at one read
+buffer whatever the file size. The SHA-256 is updated as chunks arrive; if a chunk
+lands on another worker process the digest is rebuilt by streaming the part file.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import locks
+from django.utils import timezone
+
+from .storage import content_addressed_storage
+
+READ_SIZE = 64 * 1024
+
+# session id -> (hasher, number of bytes hashed); bounded so abandoned uploads don't pile up
+_hashers = OrderedDict()
+_hashers_lock = threading.Lock()
+MAX_TRACKED_HASHERS = 256
+
+
+class ChunkError(Exception):
+    """
+    A chunk that can't be applied to the session (bad offset, too large, short body).
+    """
+
+
+def upload_dir():
+    path = Path(getattr(settings, "CHUNKED_UPLOAD_DIR", Path(settings.MEDIA_ROOT) / "chunked_uploads"))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def part_path(session):
+    return upload_dir() / f"{session.id}.part"
+
+
+def _take_hasher(session_id, offset):
+    with _hashers_lock:
+        entry = _hashers.pop(session_id, None)
+    if entry and entry[1] == offset:
+        return entry[0]
+    return None
+
+
+def _put_hasher(session_id, hasher, offset):
+    with _hashers_lock:
+        _hashers[session_id] = (hasher, offset)
+        while len(_hashers) > MAX_TRACKED_HASHERS:
+            _hashers.popitem(last=False)
+
+
+def write_chunk(session, stream, offset, length):
+    """
+    Copy `length` bytes from `stream` into the part file at `offset` and advance the
+    session's received_size. Chunks must arrive in order: `offset` has to equal the bytes
+    received so far. The part file is locked for the whole write, so of two requests for
+    the same offset only one writes; the other gets a ChunkError before touching the file.
+    """
+    max_chunk = getattr(settings, "CHUNKED_UPLOAD_MAX_CHUNK_SIZE", 16 * 1024 * 1024)
+    if length <= 0 or length > max_chunk:
+        raise ChunkError(f"Chunk size must be between 1 and {max_chunk} bytes.")
+
+    path = part_path(session)
+    with os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o666), "r+b") as part:
+        if not locks.lock(part, locks.LOCK_EX | locks.LOCK_NB):
+            raise ChunkError("Another chunk of this upload is being written.")
+        try:
+            # Re-read under the lock: another request may have advanced the session
+            session.refresh_from_db(fields=["received_size", "status"])
+            if session.status != "uploading":
+                raise ChunkError("Upload is already completed.")
+            if offset != session.received_size:
+                raise ChunkError(f"Expected offset {session.received_size}, got {offset}.")
+            if offset + length > session.total_size:
+                raise ChunkError("Chunk goes past the declared file size.")
+
+            hasher = hashlib.sha256() if offset == 0 else _take_hasher(session.id, offset)
+            remaining = length
+            part.seek(offset)
+            while remaining:
+                data = stream.read(min(READ_SIZE, remaining))
+                if not data:
+                    break
+                part.write(data)
+                if hasher is not None:
+                    hasher.update(data)
+                remaining -= len(data)
+            part.truncate(offset + length - remaining)
+            if remaining:
+                raise ChunkError(f"Chunk body ended {remaining} bytes early.")
+            part.flush()
+
+            type(session).objects.filter(id=session.id).update(
+                received_size=offset + length, updated_at=timezone.now()
+            )
+            session.received_size = offset + length
+        finally:
+            locks.unlock(part)
+
+    if hasher is not None:
+        _put_hasher(session.id, hasher, offset + length)
+    return length
+
+
+def _feed_file(hasher, path, start, end):
+    with open(path, "rb") as part:
+        part.seek(start)
+        remaining = end - start
+        while remaining:
+            data = part.read(min(READ_SIZE, remaining))
+            if not data:
+                break
+            hasher.update(data)
+            remaining -= len(data)
+
+
+def content_sha256(session):
+    """
+    SHA-256 of the completed part file, reusing the incremental hash when this process has it.
+    """
+    hasher = _take_hasher(session.id, session.total_size)
+    if hasher is None:
+        hasher = hashlib.sha256()
+        _feed_file(hasher, part_path(session), 0, session.total_size)
+    return hasher.hexdigest()
+
+
+def store_assembled_file(session, sha256):
+    """
+    Put the finished part file into the content-addressed storage under `sha256` (from
+    content_sha256()), hard-linked rather than copied or hashed again. Only touches the
+    filesystem, so it runs before the transaction that records the Document. Returns the
+    blob name.
+    """
+    return content_addressed_storage().adopt_file(str(part_path(session)), session.filename, sha256)
+
+
+def discard(session):
+    with _hashers_lock:
+        _hashers.pop(session.id, None)
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
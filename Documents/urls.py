@@ -10,10 +10,19 @@ urlpatterns = [
     path('documents/', DocumentUploadView.as_view(), name='document-upload'),       # POST
     path('documents/list/<int:person_id>/', documents_by_person, name='document-list'),       # GET
     path('documents/<int:pk>/', DocumentDetailView.as_view(), name='document-detail'), # GET
+    path('documents/<int:pk>/download/', download_document, name='document-download'), # GET
+    path('documents/<int:pk>/thumbnail/', document_thumbnail, name='document-thumbnail'), # GET, ?size=
+
+    path('documents/uploads/', start_chunked_upload, name='chunked-upload-start'),       # POST
+    path('documents/uploads/<uuid:upload_id>/', chunked_upload, name='chunked-upload'),       # GET, PUT
+    path('documents/uploads/<uuid:upload_id>/complete/', complete_chunked_upload, name='chunked-upload-complete'),       # POST
 
     path("overview/", overview, name="overview"),
+    path("async/overview/", overview_async, name="overview-async"),  # GET (ASGI)
     path("users/", list_users, name="list-users"),
     path("users/signers/", list_signers, name="list-signers"),
     path("profile/<int:user_id>/", user_profile_by_id, name="current-user-profile"),
+    path("jobs/<int:job_id>/", job_status, name="job-status"),
+    path("metrics/queries/", query_metrics, name="query-metrics"),
 
 ]
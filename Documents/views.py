@@ -2,19 +2,42 @@ from rest_framework import generics
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework.permissions import AllowAny
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import generics, permissions
+from django.utils.decorators import method_decorator
 from .models import *
 from .serializers import *
 from django.db.models import Count, Q, F
 from signatures.models import *
 from django.shortcuts import get_object_or_404
+from datetime import datetime, timezone as dt_timezone
+import os
+import time
+from .overview import aget_overview_counts, get_overview_counts
+from .async_api import async_api_view, json_response
+from .pagination import KeysetPagination
+from .conditional import conditional, latest_change
+from . import object_cache
+from django.http import Http404
+from .downloads import PassthroughRenderer, serve_file
+from .thumbnails import ThumbnailError, thumbnail_response, thumbnail_stats
+from .storage import content_addressed_storage
+from .uploads import ChunkError, content_sha256, discard, store_assembled_file, write_chunk
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from Signmagics.instrumentation import metrics_snapshot, reset_metrics
+from Signmagics.replicas import read_replica
 
 
 User = get_user_model()
 
+# CustomUser has no created_at; date_joined plays the same role for keyset paging
+USER_ORDERING = ("date_joined", "id")
+
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = [AllowAny]
@@ -31,16 +54,158 @@ class DocumentUploadView(generics.CreateAPIView):
     serializer_class = DocumentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    # Room for the multipart framing and the other form fields around the file
+    MULTIPART_OVERHEAD = 64 * 1024
+
+    def create(self, request, *args, **kwargs):
+        # Refuse on the declared length, before the body is read; validate_file checks the file itself
+        max_size = settings.DOCUMENT_MAX_UPLOAD_SIZE
+        try:
+            declared = int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            declared = 0
+        if declared > max_size + self.MULTIPART_OVERHEAD:
+            return Response(
+                {"detail": f"File is larger than {max_size} bytes; use the chunked upload API."},
+                status=413
+            )
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
-        serializer.save(owner=self.request.user)
+        upload_name = os.path.basename(serializer.validated_data['file'].name)
+        serializer.save(owner=self.request.user, original_filename=upload_name[:255])
 
     def get_serializer_context(self):
         return {"request": self.request}
 
 
+# Chunked upload: start a session, PUT chunks in order, then complete
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def start_chunked_upload(request):
+    """
+    Start a resumable upload. Body: title, filename, total_size and optionally expected_sha256.
+    """
+    serializer = UploadSessionSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    serializer.save(owner=request.user)
+
+    return Response({
+        "status": "success",
+        "upload": serializer.data,
+        "max_chunk_size": settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE
+    }, status=201)
+
+
+def _chunk_offset(request, session):
+    """
+    Offset of a chunk from `Content-Range: bytes start-end/total`, else ?offset=, else the resume point.
+    """
+    content_range = request.META.get("HTTP_CONTENT_RANGE")
+    if content_range:
+        try:
+            unit, _, spec = content_range.partition(" ")
+            start = int(spec.split("-", 1)[0])
+        except ValueError:
+            raise ChunkError("Malformed Content-Range header.")
+        if unit != "bytes":
+            raise ChunkError("Content-Range must be in bytes.")
+        return start
+    try:
+        return int(request.query_params.get("offset", session.received_size))
+    except ValueError:
+        raise ChunkError("Malformed offset.")
+
+
+@api_view(["GET", "PUT"])
+@permission_classes([IsAuthenticated])
+def chunked_upload(request, upload_id):
+    """
+    GET: upload progress (use received_size to resume).
+    PUT: raw chunk bytes in the body, streamed to disk without buffering the request.
+    """
+    session = get_object_or_404(UploadSession, id=upload_id, owner=request.user)
+
+    if request.method == "PUT":
+        if session.status != "uploading":
+            return Response({"detail": "Upload is already completed."}, status=409)
+        try:
+            offset = _chunk_offset(request, session)
+            length = int(request.META.get("CONTENT_LENGTH") or 0)
+            write_chunk(session, request.stream, offset, length)
+        except ChunkError as e:
+            return Response({"detail": str(e), "received_size": session.received_size}, status=409)
+        session.refresh_from_db()
+
+    return Response({
+        "status": "success",
+        "upload": UploadSessionSerializer(session).data
+    })
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def complete_chunked_upload(request, upload_id):
+    """
+    Verify size and checksum of a finished upload and attach it to a new Document.
+    Hashing and linking the part file into storage happen before the transaction, which
+    only writes the rows, so a large file doesn't hold the database's write lock.
+    """
+    session = get_object_or_404(UploadSession, id=upload_id, owner=request.user)
+    blob_name = sha256 = None
+    if session.status != "completed":
+        if session.received_size != session.total_size:
+            return Response({
+                "detail": "Upload is incomplete.",
+                "received_size": session.received_size,
+                "total_size": session.total_size
+            }, status=400)
+
+        try:
+            sha256 = content_sha256(session)
+            if session.expected_sha256 and session.expected_sha256 != sha256:
+                UploadSession.objects.filter(id=session.id, status="uploading").delete()
+                discard(session)
+                return Response({"detail": "Checksum mismatch; upload discarded.", "sha256": sha256}, status=400)
+            blob_name = store_assembled_file(session, sha256)
+        except FileNotFoundError:
+            # A concurrent request completed the upload and removed the part file
+            if not UploadSession.objects.filter(id=session.id, status="completed").exists():
+                raise
+
+    with transaction.atomic():
+        session = get_object_or_404(
+            UploadSession.objects.select_for_update(), id=upload_id, owner=request.user
+        )
+        if session.status == "completed":
+            # Completed by a concurrent request; the blob linked above is the same content
+            document = session.document
+        else:
+            storage = content_addressed_storage()
+            storage.record_blob(blob_name, sha256, session.total_size)
+            if not storage.exists(blob_name):
+                # gc_blobs removed an unreferenced blob after it was linked; the part file is still here
+                store_assembled_file(session, sha256)
+            document = Document.objects.create(
+                title=session.title, owner=session.owner, file=blob_name,
+                content_hash=sha256, original_filename=session.filename,
+            )
+            session.status = "completed"
+            session.document = document
+            session.save(update_fields=["status", "document", "updated_at"])
+            transaction.on_commit(lambda: discard(session))
+
+    serializer = DocumentSerializer(document, context={"request": request})
+    return Response({
+        "status": "success",
+        "document": serializer.data
+    }, status=201)
+
+
 # List all documents
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional(lambda request, person_id: latest_change(Document.objects.filter(owner_id=person_id)), per_page=True)
 def documents_by_person(request, person_id):
     """
     Fetch all documents uploaded by a specific person (owner).
@@ -50,27 +215,67 @@ def documents_by_person(request, person_id):
     except CustomUser.DoesNotExist:
         return Response({"detail": "User not found"}, status=404)
 
-    documents = Document.objects.filter(owner=owner).order_by('-created_at')
+    paginator = KeysetPagination(ordering=("-created_at", "-id"))
+    documents = paginator.paginate_queryset(DocumentSerializer.optimize_queryset(Document.objects.filter(owner=owner)), request)
     serializer = DocumentSerializer(documents, many=True, context={"request": request})
 
     return Response({
         "status": "success",
-        "documents": serializer.data
-    })
+        "documents": serializer.data,
+        **paginator.get_page_info()
+    }, headers=paginator.get_headers())
 
 
 # Get document details by ID
 class DocumentDetailView(generics.RetrieveAPIView):
-    queryset = Document.objects.all()
+    queryset = DocumentSerializer.optimize_queryset(Document.objects.all())
     serializer_class = DocumentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    @method_decorator(conditional(lambda request, pk: Document.objects.filter(pk=pk).values_list("updated_at").first()))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_serializer_context(self):
         return {"request": self.request}
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, PassthroughRenderer])
+def download_document(request, pk):
+    """
+    Download a document's file with Range and conditional GET support.
+    ?download=1 sends it as an attachment.
+    """
+    document = get_object_or_404(Document, id=pk)
+    if not document.file:
+        return Response({"detail": "Document has no file."}, status=404)
+    return serve_file(
+        request, document.file, as_attachment=request.query_params.get("download") == "1",
+        filename=document.download_name()
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, PassthroughRenderer])
+def document_thumbnail(request, pk):
+    """
+    PNG thumbnail of the document's first page; ?size=small (default), medium or large.
+    """
+    document = get_object_or_404(Document, id=pk)
+    if not document.file:
+        return Response({"detail": "Document has no file."}, status=404)
+    try:
+        return thumbnail_response(request, document.file, "pdf", request.query_params.get("size", "small"))
+    except ThumbnailError as e:
+        return Response({"detail": str(e)}, status=e.status)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@read_replica
 def overview(request):
     """
     Return counts for overview dashboard:
@@ -78,48 +283,43 @@ def overview(request):
     - total fully signed documents
     - pending documents
     - total users
+
+    Counts come from the overview counter cache; pass ?fresh=1 to recount from the database.
     """
+    fresh = request.query_params.get("fresh") in ("1", "true")
+    return Response(_overview_body(*get_overview_counts(fresh=fresh)))
 
-    # Fully signed documents (all signatures approved, not draft)
-    fully_signed_docs = (
-        DocumentSignature.objects
-        .annotate(
-            total_statuses=Count("signature_statuses"),
-            approved_statuses=Count("signature_statuses", filter=Q(signature_statuses__status="approved"))
-        )
-        .filter(total_statuses=F("approved_statuses"), draft=False)
-        .count()
-    )
 
-    # Pending documents: document signatures with at least one pending status
-    pending_docs = (
-        DocumentSignature.objects
-        .filter(
-            draft=False,
-            signature_statuses__status="pending"
-        )
-        .distinct()
-        .count()
-    )
+@async_api_view(["GET"])
+@read_replica
+async def overview_async(request):
+    """
+    overview() as an async view, for the ASGI application.
+    """
+    fresh = request.GET.get("fresh") in ("1", "true")
+    return json_response(_overview_body(*await aget_overview_counts(fresh=fresh)))
+
 
-    total_users = CustomUser.objects.count()
+def _overview_body(counts, computed_at, from_cache):
+    fully_signed_docs = counts["fully_signed_documents"]
+    pending_docs = counts["pending_documents"]
     total_documents = fully_signed_docs + pending_docs
 
-    return Response({
+    return {
         "status": "success",
         "total_documents": total_documents,
         "fully_signed_documents": fully_signed_docs,
         "pending_documents": pending_docs,
-        "total_users": total_users
-    })
+        "total_users": counts["total_users"],
+        "cache": {
+            "hit": from_cache,
+            "computed_at": datetime.fromtimestamp(computed_at, tz=dt_timezone.utc),
+            "age_seconds": round(max(time.time() - computed_at, 0), 3),
+        }
+    }
 
 
-@api_view(["GET"])
-@permission_classes([IsAuthenticated])
-def list_users(request):
-    """
-    Fetch all users. Optional query params: ?role=signer&department=IT
-    """
+def _users_queryset(request):
     queryset = CustomUser.objects.all()
 
     # Optional filters
@@ -131,9 +331,27 @@ def list_users(request):
     if department:
         queryset = queryset.filter(department=department)
 
+    return queryset
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@read_replica
+@conditional(lambda request: latest_change(_users_queryset(request)), per_page=True)
+def list_users(request):
+    """
+    Fetch all users. Optional query params: ?role=signer&department=IT
+    """
+    queryset = _users_queryset(request)
+
+    # Page over the keyset index only; the rows themselves come from the object cache
+    paginator = KeysetPagination(ordering=USER_ORDERING)
+    page = paginator.paginate_queryset(queryset.only(*USER_ORDERING), request)
+    cached = object_cache.get_many(CustomUser, [user.id for user in page])
+
     # Prepare response
     users = []
-    for user in queryset:
+    for user in (cached[u.id] for u in page if u.id in cached):
         users.append({
             "id": user.id,
             "username": user.username,
@@ -145,22 +363,27 @@ def list_users(request):
 
     return Response({
         "status": "success",
-        "users": users
-    })
+        "users": users,
+        **paginator.get_page_info()
+    }, headers=paginator.get_headers())
 
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@read_replica
+@conditional(lambda request: latest_change(CustomUser.objects.filter(role="signer")), per_page=True)
 def list_signers(request):
     """
     Fetch all users with role='signer'
     """
-    signers = CustomUser.objects.filter(role="signer")
+    paginator = KeysetPagination(ordering=USER_ORDERING)
+    signers = paginator.paginate_queryset(CustomUser.objects.filter(role="signer").only(*USER_ORDERING), request)
+    cached = object_cache.get_many(CustomUser, [user.id for user in signers])
 
     # Prepare response
     users = []
-    for user in signers:
+    for user in (cached[u.id] for u in signers if u.id in cached):
         users.append({
             "id": user.id,
             "username": user.username,
@@ -172,18 +395,22 @@ def list_signers(request):
 
     return Response({
         "status": "success",
-        "signers": users
-    })
+        "signers": users,
+        **paginator.get_page_info()
+    }, headers=paginator.get_headers())
 
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional(lambda request, user_id: CustomUser.objects.filter(id=user_id).values_list("updated_at").first())
 def user_profile_by_id(request, user_id):
     """
     Fetch the profile of a user by their ID
     """
-    user = get_object_or_404(CustomUser, id=user_id)
+    user = object_cache.get(CustomUser, user_id)
+    if user is None:
+        raise Http404("No CustomUser matches the given query.")
 
     profile_data = {
         "id": user.id,
@@ -201,3 +428,43 @@ def user_profile_by_id(request, user_id):
         "status": "success",
         "profile": profile_data
     })
+
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def job_status(request, job_id):
+    """
+    Status of a background job. Users see their own jobs; admins see all.
+    """
+    jobs = Job.objects.all() if request.user.role == "admin" else Job.objects.filter(created_by=request.user)
+    job = get_object_or_404(jobs, id=job_id)
+
+    return Response({
+        "status": "success",
+        "job": JobSerializer(job).data
+    })
+
+
+
+@api_view(["GET", "DELETE"])
+@permission_classes([IsAuthenticated])
+def query_metrics(request):
+    """
+    Per-view query counts, SQL time and repeated queries recorded by this process.
+    Admins only; DELETE resets the counters.
+    """
+    if request.user.role != "admin":
+        return Response({"detail": "Only admins can view metrics."}, status=403)
+
+    if request.method == "DELETE":
+        reset_metrics()
+        object_cache.reset_stats()
+        return Response(status=204)
+
+    return Response({
+        "status": "success",
+        "views": metrics_snapshot(),
+        "object_cache": object_cache.stats(),
+        "thumbnails": thumbnail_stats()
+    })
@@ -0,0 +1,193 @@
+"""
+Per-request SQL instrumentation.
+
+QueryInstrumentationMiddleware installs a database execute wrapper for the duration of
+each request and records the number of queries, the time spent in SQL and queries that
+ran more than once with the same SQL (the usual sign of an N+1 loop). Each response gets
+a Server-Timing header, totals are aggregated per view for the metrics endpoint, and
+views that go over their entry in QUERY_BUDGETS are logged (or fail, with
+QUERY_BUDGET_ENFORCE, which is on under `manage.py test`).
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Collapse literals and IN lists so that queries differing only in values share a fingerprint
+_IN_LIST = re.compile(r"\((?:\s*%s\s*,)+\s*%s\s*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+
+# How many duplicate fingerprints are kept per view in the aggregated metrics
+TOP_DUPLICATES = 10
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    return _NUMBER.sub("N", _IN_LIST.sub("(...)", sql))
+
+
+class QueryRecorder:
+    """
+    Execute wrapper collecting the queries run on this thread during one request.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        return {sql: n for sql, n in self.fingerprints.items() if n > 1}
+
+    def record(self):
+        """
+        Install the wrapper on every configured connection; use as a context manager.
+        """
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(self))
+        return stack
+
+
+def view_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return None
+    func = getattr(match.func, "view_class", match.func)
+    return getattr(func, "__name__", match.view_name)
+
+
+def query_budget(view):
+    return getattr(settings, "QUERY_BUDGETS", {}).get(view)
+
+
+def check_query_budget(view, recorder):
+    budget = query_budget(view)
+    if budget is None or recorder.count <= budget:
+        return
+    duplicates = sorted(recorder.duplicates().items(), key=lambda item: -item[1])[:3]
+    message = f"{view} ran {recorder.count} queries (budget {budget}); most repeated: {duplicates}"
+    if getattr(settings, "QUERY_BUDGET_ENFORCE", False):
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def record_metrics(view, recorder, elapsed):
+    with _metrics_lock:
+        entry = _metrics.setdefault(view, {
+            "requests": 0,
+            "queries_total": 0,
+            "queries_max": 0,
+            "sql_ms_total": 0.0,
+            "response_ms_total": 0.0,
+            "duplicate_queries_total": 0,
+            "over_budget": 0,
+            "duplicates": Counter(),
+        })
+        entry["requests"] += 1
+        entry["queries_total"] += recorder.count
+        entry["queries_max"] = max(entry["queries_max"], recorder.count)
+        entry["sql_ms_total"] += recorder.duration * 1000
+        entry["response_ms_total"] += elapsed * 1000
+        duplicates = recorder.duplicates()
+        entry["duplicate_queries_total"] += sum(n - 1 for n in duplicates.values())
+        entry["duplicates"].update(duplicates)
+        budget = query_budget(view)
+        if budget is not None and recorder.count > budget:
+            entry["over_budget"] += 1
+
+
+def metrics_snapshot():
+    """
+    Aggregated per-view numbers for this process, heaviest views first.
+    """
+    with _metrics_lock:
+        views = []
+        for view, entry in _metrics.items():
+            requests = entry["requests"]
+            views.append({
+                "view": view,
+                "requests": requests,
+                "queries_mean": round(entry["queries_total"] / requests, 2),
+                "queries_max": entry["queries_max"],
+                "query_budget": query_budget(view),
+                "over_budget": entry["over_budget"],
+                "sql_ms_mean": round(entry["sql_ms_total"] / requests, 3),
+                "response_ms_mean": round(entry["response_ms_total"] / requests, 3),
+                "duplicate_queries_total": entry["duplicate_queries_total"],
+                "top_duplicates": [
+                    {"sql": sql, "count": n} for sql, n in entry["duplicates"].most_common(TOP_DUPLICATES)
+                ],
+            })
+    return sorted(views, key=lambda v: -v["queries_mean"] * v["requests"])
+
+
+def reset_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+
+class QueryInstrumentationMiddleware:
+    # Works in both modes so that async views (e.g. the event stream) stay async under ASGI
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._is_coroutine = iscoroutinefunction(get_response)
+        if self._is_coroutine:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self._is_coroutine:
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with recorder.record():
+            response = self.get_response(request)
+        return self.finish(request, response, recorder, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with recorder.record():
+            response = await self.get_response(request)
+        return self.finish(request, response, recorder, time.perf_counter() - start)
+
+    def finish(self, request, response, recorder, elapsed):
+        view = view_name(request)
+        if view is not None:
+            record_metrics(view, recorder, elapsed)
+
+        response["Server-Timing"] = ", ".join([
+            f'db;dur={recorder.duration * 1000:.2f};desc="{recorder.count} queries"',
+            f"dup;desc=\"{sum(n - 1 for n in recorder.duplicates().values())} duplicate queries\"",
+            f"total;dur={elapsed * 1000:.2f}",
+        ])
+
+        if view is not None:
+            check_query_budget(view, recorder)
+        return response
@@ -0,0 +1,128 @@
+"""
+Primary/replica routing for the reporting views.
+
+Views decorated with @read_replica read from the REPLICA_DATABASE_ALIAS connection;
+everything else, and every write, uses the primary ("default"). A user who has just
+written (any successful non-GET request) is pinned to the primary for
+REPLICA_STICKY_SECONDS, so they read their own writes even while the replica lags.
+Pins live in the default cache, so they only hold across processes when that cache is
+shared.
+
+With REPLICA_DATABASE_ALIAS unset (the default) routing is a no-op. The object cache
+(Documents/object_cache.py) and the overview counter cache (Documents/overview.py)
+always fill from the primary, so replica lag doesn't leak into values shared with
+every other view.
+"""
+import functools
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_reading_from_replica = ContextVar("reading_from_replica", default=False)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def replica_alias():
+    alias = getattr(settings, "REPLICA_DATABASE_ALIAS", None)
+    return alias if alias in settings.DATABASES else None
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = replica_alias()
+        if alias and _reading_from_replica.get() and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return alias
+        # Explicitly, or instances loaded from the replica would keep reading from it
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+
+def _pin_key(user_id):
+    return f"replica-pin:{user_id}"
+
+
+def _user_id(request):
+    user = getattr(request, "user", None)
+    return user.id if user is not None and user.is_authenticated else None
+
+
+def _replica_token(pinned):
+    return None if pinned or not replica_alias() else _reading_from_replica.set(True)
+
+
+def read_replica(view):
+    """
+    Send the reads of `view` (sync or async) to the replica unless the user is pinned to
+    the primary after a recent write.
+    """
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            user_id = _user_id(request)
+            token = _replica_token(user_id is not None and await cache.aget(_pin_key(user_id)))
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                if token is not None:
+                    _reading_from_replica.reset(token)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        user_id = _user_id(request)
+        token = _replica_token(user_id is not None and cache.get(_pin_key(user_id)))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            if token is not None:
+                _reading_from_replica.reset(token)
+    return wrapper
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Pins the user to the primary after a successful write request.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._is_coroutine = iscoroutinefunction(get_response)
+        if self._is_coroutine:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self._is_coroutine:
+            return self.__acall__(request)
+        response = self.get_response(request)
+        user_id = self._wrote(request, response)
+        if user_id is not None:
+            cache.set(_pin_key(user_id), True, getattr(settings, "REPLICA_STICKY_SECONDS", 10))
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        user_id = self._wrote(request, response)
+        if user_id is not None:
+            await cache.aset(_pin_key(user_id), True, getattr(settings, "REPLICA_STICKY_SECONDS", 10))
+        return response
+
+    def _wrote(self, request, response):
+        """
+        Id of the user whose write this response completed, if any.
+        """
+        if request.method in SAFE_METHODS or response.status_code >= 400 or not replica_alias():
+            return None
+        # DRF copies the user it authenticated onto the Django request
+        return _user_id(request)
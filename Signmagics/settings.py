@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,9 +47,12 @@ INSTALLED_APPS = [
 
 AUTH_USER_MODEL = 'Documents.CustomUser'
 
+# Passwords are checked in the hashing pool (Documents/hashing.py)
+AUTHENTICATION_BACKENDS = ['Documents.authentication.PooledModelBackend']
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'Documents.authentication.CachedJWTAuthentication',
     ),
 }
 
@@ -55,12 +60,90 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 from datetime import timedelta
 
+# Keyset pagination for list endpoints (Documents/pagination.py); ?page_size= is capped at the max
+PAGINATION_PAGE_SIZE = 50
+PAGINATION_MAX_PAGE_SIZE = 500
+
+# Server-side stamping (signatures/stamping.py): size of the process pool (0 stamps in the
+# request thread) and how long a request waits for a stamping job
+SIGNATURE_STAMPING_WORKERS = 2
+SIGNATURE_STAMPING_TIMEOUT = 60
+
+# Thumbnails (Documents/thumbnails.py): sizes in pixels, size of the render pool (0 renders in
+# the request thread), how long a render may take, the largest image decoded (width * height)
+# and the on-disk LRU cache
+THUMBNAIL_SIZES = {'small': 128, 'medium': 256, 'large': 512}
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_RENDER_TIMEOUT = 30
+THUMBNAIL_MAX_PIXELS = 2048 * 2048
+THUMBNAIL_CACHE_DIR = BASE_DIR / 'thumbnail_cache'
+THUMBNAIL_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Password hashing for logins and registration (Documents/hashing.py): size of the process
+# pool (0 hashes in the request thread), hashes queued or running before further requests
+# are shed with 503 and Retry-After, how long a request waits for its hash, and the
+# Retry-After value in seconds
+PASSWORD_HASHING_WORKERS = 2
+PASSWORD_HASHING_MAX_PENDING = 32
+PASSWORD_HASHING_TIMEOUT = 10
+PASSWORD_HASHING_RETRY_AFTER = 2
+
+# Background jobs (Documents/jobs.py, run by `manage.py run_jobs`)
+JOB_WORKERS = 2
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BASE_SECONDS = 10     # retry n waits base * 2**(n-1) seconds...
+JOB_RETRY_MAX_SECONDS = 3600    # ...up to this
+JOB_LOCK_TIMEOUT = 600          # a job without a heartbeat for this long is assumed lost and requeued
+JOB_HEARTBEAT_INTERVAL = 60     # running jobs refresh their lock this often
+JOB_POLL_INTERVAL = 1.0
+
+# Server-Sent Events (Documents/events.py): events buffered per client before it is told to
+# resync, and seconds between keepalive comments on an idle stream
+EVENTS_QUEUE_SIZE = 100
+EVENTS_KEEPALIVE_SECONDS = 15
+
+# Query instrumentation (Signmagics/instrumentation.py)
+# Maximum number of SQL queries per request, by view name. Going over is logged, and raises
+# QueryBudgetExceeded when QUERY_BUDGET_ENFORCE is on (always the case under `manage.py test`).
+QUERY_BUDGETS = {
+    'overview': 6,
+    'overview_async': 6,
+    'list_users': 4,
+    'list_signers': 4,
+    'user_profile_by_id': 4,
+    'documents_by_person': 6,
+    'DocumentDetailView': 4,
+    'UserSignatureListView': 4,
+    'user_signed_documents': 6,
+    'signature_files_for_person': 6,
+    'documents_by_approval_status': 6,
+    'documents_by_approval_status_async': 6,
+    'document_signature_status': 6,
+    'document_signature_status_async': 6,
+    'signer_inbox': 5,
+    'document_sign_status': 12,
+    'bulk_document_sign_status': 10,
+    'assign_multiple_signatures': 15,
+}
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+QUERY_BUDGET_ENFORCE = TESTING
+
+# Largest number of documents accepted by one batch signature assignment
+SIGNATURE_BATCH_MAX_ASSIGNMENTS = 1000
+# ...and by one bulk approve/reject
+SIGNATURE_BULK_DECISION_MAX = 1000
+
+# Rows fetched per database round trip by the signing history export
+SIGNING_EXPORT_CHUNK_SIZE = 2000
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=10),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=30),
 }
 
 MIDDLEWARE = [
+    'Signmagics.instrumentation.QueryInstrumentationMiddleware',
+    'Signmagics.replicas.ReplicaStickinessMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -93,16 +176,85 @@ WSGI_APPLICATION = 'Signmagics.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite tuned for concurrent requests: WAL lets readers run alongside the writer,
+# IMMEDIATE transactions take the write lock up front (a deferred transaction that later
+# writes can fail at once with "database is locked" instead of waiting), and the
+# Signmagics.sqlite backend queues writers of this process on an in-process lock.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',        # durable at checkpoints; safe with WAL
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,       # in KiB when negative
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'Signmagics.sqlite',
         'NAME': BASE_DIR / 'db.sqlite3',
         'OPTIONS': {
-            'timeout': 20,  # default is 5 seconds — increase it
+            'timeout': 20,  # busy timeout in seconds, also the wait for the in-process write lock
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
         },
+        # Keep connections (and their page cache) between requests; check them before reuse
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replica for the reporting views (Signmagics/replicas.py): set REPLICA_DATABASE_PATH to
+# a copy of the database (for a local SQLite copy, refresh it with `manage.py sync_replica`).
+# A user's reads go back to the primary for REPLICA_STICKY_SECONDS after their own write.
+DATABASE_ROUTERS = ['Signmagics.replicas.PrimaryReplicaRouter']
+REPLICA_DATABASE_ALIAS = None
+REPLICA_STICKY_SECONDS = 10
+if os.environ.get('REPLICA_DATABASE_PATH'):
+    REPLICA_DATABASE_ALIAS = 'replica'
+    DATABASES['replica'] = {**DATABASES['default'], 'NAME': os.environ['REPLICA_DATABASE_PATH']}
+elif TESTING:
+    # A separate test database for the routing tests, which turn routing on themselves
+    DATABASES['replica'] = dict(DATABASES['default'])
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# The overview counters are incremented in the process that handles a write, so with several
+# worker processes use a shared backend (file, memcached, redis) instead of locmem;
+# `manage.py reconcile_overview` refuses to run against a per-process one.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'signmagics',
+    },
+    # Read-through cache of users, signatures and documents (Documents/object_cache.py):
+    # least recently used entries are culled past MAX_ENTRIES, and entries expire after TIMEOUT.
+    # A cached row takes two entries (its generation token and the instance). TIMEOUT also
+    # bounds how long a write that skips the signals (QuerySet.update()) goes unnoticed
+    'objects': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'signmagics-objects',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # Users resolved from JWTs (Documents/authentication.py). Kept short: with several
+    # processes, a deactivated user's token keeps working elsewhere for up to TIMEOUT
+    'auth_users': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'signmagics-auth-users',
+        'TIMEOUT': 30,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+# Seconds after which the cached overview counts are recounted on read (None disables)
+OVERVIEW_CACHE_MAX_AGE = 300
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -148,3 +300,31 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Document, edited and signature files are stored once per distinct content (Documents/storage.py)
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    'content_addressed': {
+        'BACKEND': 'Documents.storage.ContentAddressedStorage',
+    },
+}
+
+# Downloads (Documents/downloads.py)
+# "stream" sends files from Django; "x-accel-redirect" (nginx, files exposed under
+# FILE_DOWNLOAD_ACCEL_PREFIX as an internal location) or "x-sendfile" (Apache/lighttpd)
+# hand the transfer to the front proxy.
+FILE_DOWNLOAD_MODE = 'stream'
+FILE_DOWNLOAD_ACCEL_PREFIX = '/protected-media/'
+
+# Uploads
+# Single-request uploads (DocumentUploadView) are capped; larger files go through the
+# chunked upload API, which streams chunks into part files under CHUNKED_UPLOAD_DIR.
+DOCUMENT_MAX_UPLOAD_SIZE = 50 * 1024 * 1024
+CHUNKED_UPLOAD_DIR = BASE_DIR / 'upload_chunks'
+CHUNKED_UPLOAD_MAX_SIZE = 2 * 1024 * 1024 * 1024
+CHUNKED_UPLOAD_MAX_CHUNK_SIZE = 16 * 1024 * 1024
+
@@ -0,0 +1,86 @@
+"""
+SQLite backend that queues writers inside the process.
+
+SQLite allows one writer per database file. With the stock backend, threads that
+write at the same time fight over the file lock in SQLite's busy handler, which
+sleeps and retries; under load some give up with "database is locked". This backend
+hands the write lock over through a threading.Lock per database file instead:
+- every transaction (BEGIN, IMMEDIATE with transaction_mode) waits for the lock and
+  releases it on commit, rollback or close;
+- INSERT/UPDATE/DELETE statements run in autocommit mode take it for the statement.
+Readers never take it; with WAL journaling they read alongside the writer.
+
+The wait is bounded by OPTIONS["timeout"], like SQLite's own busy timeout. Other
+processes on the same file still go through the busy handler.
+"""
+import threading
+
+from django.db import OperationalError
+from django.db.backends.sqlite3 import base
+
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+_write_locks = {}
+_write_locks_guard = threading.Lock()
+
+
+def write_lock_for(name):
+    with _write_locks_guard:
+        return _write_locks.setdefault(str(name), threading.Lock())
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.holds_write_lock = False
+        self.execute_wrappers.append(self._serialize_autocommit_write)
+
+    @property
+    def write_lock(self):
+        return write_lock_for(self.settings_dict["NAME"])
+
+    def acquire_write_lock(self):
+        if self.holds_write_lock:
+            return
+        if not self.write_lock.acquire(timeout=self.settings_dict["OPTIONS"].get("timeout", 5)):
+            raise OperationalError("database is locked (timed out waiting for the in-process write lock)")
+        self.holds_write_lock = True
+
+    def release_write_lock(self):
+        if self.holds_write_lock:
+            self.holds_write_lock = False
+            self.write_lock.release()
+
+    def _serialize_autocommit_write(self, execute, sql, params, many, context):
+        if self.holds_write_lock or not self.get_autocommit() or not sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+            return execute(sql, params, many, context)
+        self.acquire_write_lock()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.release_write_lock()
+
+    def _start_transaction_under_autocommit(self):
+        self.acquire_write_lock()
+        try:
+            super()._start_transaction_under_autocommit()
+        except Exception:
+            self.release_write_lock()
+            raise
+
+    def _commit(self):
+        # A failed COMMIT leaves the transaction open; the rollback that follows releases the lock
+        super()._commit()
+        self.release_write_lock()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self.release_write_lock()
+
+    def close(self):
+        super().close()
+        # In-memory databases ignore close()
+        if self.connection is None:
+            self.release_write_lock()
@@ -0,0 +1,221 @@
+"""
+Latency and query-count benchmark for the signing API.
+
+Drives the real URL routes through Django's test client with JWT authentication and
+reports p50/p95/p99 latency and SQL query counts per endpoint as JSON.
+
+    python -m benchmarks.api --scale 10k --generate --output bench-10k.json
+    python -m benchmarks.api --scale 10k --iterations 500 --output after.json
+    python -m benchmarks.compare bench-10k.json after.json
+
+Uses benchmarks.settings (a separate database, BENCH_DB) unless DJANGO_SETTINGS_MODULE
+is already set.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+    import django
+    django.setup()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Fixture:
+    """
+    Ids and authenticated clients the scenarios need, looked up from the generated data.
+    """
+
+    def __init__(self):
+        from django.test import Client
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        from Documents.models import CustomUser, Document
+        from signatures.models import DocumentSignature, DocumentSignatureStatus
+
+        self.admin = CustomUser.objects.get(username="bench-admin")
+        status = (
+            DocumentSignatureStatus.objects.filter(document_signature__draft=False)
+            .select_related("signature__user").order_by("id").first()
+        )
+        self.signer = status.signature.user
+        self.signature_id = status.signature_id
+        self.doc_sig_id = status.document_signature_id
+        self.document_id = Document.objects.filter(owner=self.admin).order_by("id").values_list("id", flat=True).first()
+        self.draft_doc_sig_ids = list(
+            DocumentSignature.objects.filter(draft=True, creator=self.admin).values_list("id", flat=True)[:10_000]
+        )
+
+        def client_for(user):
+            token = RefreshToken.for_user(user).access_token
+            return Client(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        self.admin_client = client_for(self.admin)
+        self.signer_client = client_for(self.signer)
+
+
+def scenarios(fx):
+    """
+    (name, callable) pairs; each callable performs one request and returns the response.
+    """
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    from .datagen import MINIMAL_PDF
+
+    toggle = {"n": 0}
+
+    def approve_or_reject():
+        toggle["n"] += 1
+        action = "approve" if toggle["n"] % 2 else "reject"
+        return fx.signer_client.patch(f"/sign/doc/{fx.doc_sig_id}/{action}/")
+
+    def assign():
+        return fx.admin_client.post(
+            f"/sign/documents/{fx.document_id}/assign-signature/",
+            {"signature_id": [fx.signature_id], "file": SimpleUploadedFile("edited.pdf", MINIMAL_PDF), "status": "draft"},
+        )
+
+    def mark_final():
+        if not fx.draft_doc_sig_ids:
+            return None
+        return fx.admin_client.post(f"/sign/documentsignature/{fx.draft_doc_sig_ids.pop()}/send/")
+
+    admin, signer = fx.admin_client, fx.signer_client
+    return [
+        ("overview", lambda: admin.get("/api/auth/overview/")),
+        ("overview_fresh", lambda: admin.get("/api/auth/overview/?fresh=1")),
+        ("documents_by_approval_status_true", lambda: admin.get("/sign/documents/signed/?approved=true")),
+        ("documents_by_approval_status_false", lambda: admin.get("/sign/documents/signed/?approved=false")),
+        ("user_signed_documents", lambda: admin.get(f"/sign/signed_documents/{fx.admin.id}/")),
+        ("documents_by_person", lambda: admin.get(f"/api/auth/documents/list/{fx.admin.id}/")),
+        ("document_detail", lambda: admin.get(f"/api/auth/documents/{fx.document_id}/")),
+        ("list_users", lambda: admin.get("/api/auth/users/")),
+        ("list_signers", lambda: admin.get("/api/auth/users/signers/")),
+        ("user_profile_by_id", lambda: admin.get(f"/api/auth/profile/{fx.signer.id}/")),
+        ("user_signature_list", lambda: admin.get("/sign/list/")),
+        ("signature_files_for_person", lambda: signer.get(f"/sign/documents/signer/{fx.signature_id}/")),
+        ("signer_inbox", lambda: signer.get("/sign/inbox/")),
+        ("document_signature_status", lambda: admin.get(f"/sign/doc-signature/{fx.doc_sig_id}/status/")),
+        ("document_sign_status", approve_or_reject),
+        ("assign_signature", assign),
+        ("mark_document_signature_final", mark_final),
+    ]
+
+
+def run(iterations, warmup, only=None):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    fx = Fixture()
+    results = {}
+    for name, call in scenarios(fx):
+        if only and name not in only:
+            continue
+        for _ in range(warmup):
+            call()
+
+        latencies, queries, statuses = [], [], {}
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                response = call()
+                elapsed = time.perf_counter() - start
+            if response is None:
+                break
+            latencies.append(elapsed * 1000)
+            queries.append(len(ctx.captured_queries))
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+        if not latencies:
+            continue
+        results[name] = {
+            "requests": len(latencies),
+            "status_codes": statuses,
+            "latency_ms": {
+                "mean": round(statistics.fmean(latencies), 3),
+                "p50": round(percentile(latencies, 50), 3),
+                "p95": round(percentile(latencies, 95), 3),
+                "p99": round(percentile(latencies, 99), 3),
+                "max": round(max(latencies), 3),
+            },
+            "queries": {
+                "mean": round(statistics.fmean(queries), 2),
+                "max": max(queries),
+            },
+        }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", default="10k", help="1k, 10k, 100k, 1m or a number of document signatures")
+    parser.add_argument("--generate", action="store_true", help="Flush the benchmark database and generate data first")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--only", action="append", help="Run only this scenario (repeatable)")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    import django
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+
+    from .datagen import generate, parse_scale
+
+    call_command("migrate", verbosity=0)
+    scale = parse_scale(args.scale)
+    counts = None
+    if args.generate:
+        call_command("flush", interactive=False, verbosity=0)
+        start = time.perf_counter()
+        counts = generate(scale, stdout=sys.stderr)
+        print(f"Generated data in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "scale": scale,
+            "generated": counts,
+            "iterations": args.iterations,
+            "git_revision": git_revision(),
+            "django": django.get_version(),
+            "python": platform.python_version(),
+            "database": connection.vendor,
+            "database_name": str(settings.DATABASES["default"]["NAME"]),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "endpoints": run(args.iterations, args.warmup, args.only),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
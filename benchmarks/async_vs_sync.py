@@ -0,0 +1,200 @@
+"""
+Sync vs async views under ASGI.
+
+Sends the same requests to each sync endpoint and to its async variant through the
+project's ASGI application, with many requests in flight at once, and reports
+throughput and p50/p95/p99 latency per endpoint as JSON. Requests are driven in process
+(no server or sockets), so the numbers compare the two request paths in Django rather
+than a particular ASGI server.
+
+    python -m benchmarks.async_vs_sync --scale 10k --generate
+    python -m benchmarks.async_vs_sync --requests 500 --concurrency 50 --output async.json
+
+Uses benchmarks.settings, like benchmarks.api.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from urllib.parse import urlsplit
+
+from .api import Fixture, git_revision, percentile, setup_django
+
+
+class Call:
+    def __init__(self, method, url, token, body=b"", content_type=None):
+        self.method = method
+        self.url = urlsplit(url)
+        self.headers = [(b"host", b"testserver"), (b"authorization", f"Bearer {token}".encode())]
+        if content_type:
+            self.headers.append((b"content-type", content_type.encode()))
+            self.headers.append((b"content-length", str(len(body)).encode()))
+        self.body = body
+
+    def scope(self):
+        return {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": self.method,
+            "scheme": "http",
+            "path": self.url.path,
+            "raw_path": self.url.path.encode(),
+            "query_string": self.url.query.encode(),
+            "headers": self.headers,
+            "client": ("127.0.0.1", 0),
+            "server": ("testserver", 80),
+        }
+
+
+async def request(application, call):
+    """
+    One request through the ASGI application; returns (status, seconds).
+    """
+    received = False
+    response = {}
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.Event().wait()  # Nothing more to send; wait for cancellation
+        received = True
+        return {"type": "http.request", "body": call.body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+
+    start = time.perf_counter()
+    await application(call.scope(), receive, send)
+    return response.get("status"), time.perf_counter() - start
+
+
+async def measure(application, call, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            return await request(application, call)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one() for _ in range(requests)))
+    wall = time.perf_counter() - start
+
+    latencies = [seconds * 1000 for _, seconds in results]
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "requests": requests,
+        "status_codes": statuses,
+        "requests_per_second": round(requests / wall, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(max(latencies), 3),
+        },
+    }
+
+
+def pairs(fx):
+    """
+    (name, sync Call, async Call) for each endpoint that has an async variant.
+    """
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    from .datagen import MINIMAL_PNG
+
+    admin = str(RefreshToken.for_user(fx.admin).access_token)
+    signer = str(RefreshToken.for_user(fx.signer).access_token)
+
+    upload = encode_multipart(BOUNDARY, {"file": SimpleUploadedFile("signature.png", MINIMAL_PNG)})
+
+    def both(method, sync_url, async_url, token, **kwargs):
+        return Call(method, sync_url, token, **kwargs), Call(method, async_url, token, **kwargs)
+
+    return [
+        ("overview", *both("GET", "/api/auth/overview/", "/api/auth/async/overview/", admin)),
+        ("documents_by_approval_status", *both(
+            "GET", "/sign/documents/signed/?approved=false", "/sign/async/documents/signed/?approved=false", admin,
+        )),
+        ("document_signature_status", *both(
+            "GET", f"/sign/doc-signature/{fx.doc_sig_id}/status/",
+            f"/sign/async/doc-signature/{fx.doc_sig_id}/status/", admin,
+        )),
+        ("upload_signature", *both(
+            "POST", "/sign/", "/sign/async/", signer, body=upload, content_type=MULTIPART_CONTENT,
+        )),
+    ]
+
+
+async def run(requests, concurrency, warmup, only=None):
+    from asgiref.sync import sync_to_async
+    from django.core.asgi import get_asgi_application
+
+    application = get_asgi_application()
+    fx = await sync_to_async(Fixture)()
+    results = {}
+    for name, sync_call, async_call in await sync_to_async(pairs)(fx):
+        if only and name not in only:
+            continue
+        results[name] = {}
+        for variant, call in (("sync", sync_call), ("async", async_call)):
+            for _ in range(warmup):
+                await request(application, call)
+            results[name][variant] = await measure(application, call, requests, concurrency)
+        results[name]["speedup"] = round(
+            results[name]["async"]["requests_per_second"] / results[name]["sync"]["requests_per_second"], 2
+        )
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", default="10k", help="1k, 10k, 100k, 1m or a number of document signatures")
+    parser.add_argument("--generate", action="store_true", help="Flush the benchmark database and generate data first")
+    parser.add_argument("--requests", type=int, default=300, help="Requests per endpoint and variant")
+    parser.add_argument("--concurrency", type=int, default=50, help="Requests in flight at once")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--only", action="append", help="Run only this endpoint (repeatable)")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    import django
+    from django.core.management import call_command
+
+    from .datagen import generate, parse_scale
+
+    call_command("migrate", verbosity=0)
+    scale = parse_scale(args.scale)
+    if args.generate:
+        call_command("flush", interactive=False, verbosity=0)
+        generate(scale, stdout=sys.stderr)
+
+    report = {
+        "meta": {
+            "scale": scale,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "git_revision": git_revision(),
+            "django": django.get_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "endpoints": asyncio.run(run(args.requests, args.concurrency, args.warmup, args.only)),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Compare two benchmark reports and flag regressions.
+
+    python -m benchmarks.compare before.json after.json --threshold 0.10
+
+Exits with status 1 if any endpoint's p95 latency grew by more than the threshold
+or its maximum query count went up.
+"""
+import argparse
+import json
+import sys
+
+
+def compare(before, after, threshold):
+    rows, regressions = [], []
+    for name, new in sorted(after["endpoints"].items()):
+        old = before["endpoints"].get(name)
+        if old is None:
+            rows.append((name, None, new["latency_ms"]["p95"], None, None, new["queries"]["max"], "new"))
+            continue
+        old_p95, new_p95 = old["latency_ms"]["p95"], new["latency_ms"]["p95"]
+        change = (new_p95 - old_p95) / old_p95 if old_p95 else 0.0
+        flags = []
+        if change > threshold:
+            flags.append("slower")
+        if new["queries"]["max"] > old["queries"]["max"]:
+            flags.append("more queries")
+        if flags:
+            regressions.append(name)
+        rows.append((name, old_p95, new_p95, change, old["queries"]["max"], new["queries"]["max"], ", ".join(flags)))
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative p95 increase")
+    args = parser.parse_args(argv)
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    rows, regressions = compare(before, after, args.threshold)
+    print(f"{'endpoint':40} {'p95 before':>11} {'p95 after':>10} {'change':>8} {'queries':>9}  notes")
+    for name, old_p95, new_p95, change, old_q, new_q, notes in rows:
+        old_text = f"{old_p95:.2f}" if old_p95 is not None else "-"
+        change_text = f"{change:+.0%}" if change is not None else "-"
+        queries = f"{old_q}->{new_q}" if old_q is not None else f"{new_q}"
+        print(f"{name:40} {old_text:>11} {new_p95:>10.2f} {change_text:>8} {queries:>9}  {notes}")
+
+    if regressions:
+        print(f"\nRegressions: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
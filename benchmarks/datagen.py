@@ -0,0 +1,135 @@
+"""
+Synthetic data for the benchmarks: users, signatures, documents and
+DocumentSignature/DocumentSignatureStatus/SignerWorkItem rows, inserted with bulk_create.
+
+The scale is the number of DocumentSignature rows; everything else is derived from it
+(3 signers per document signature, 2 document signatures per document, 1 signer per
+25 document signatures).
+"""
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from Documents.models import CustomUser, Document
+from Documents.storage import content_addressed_storage, digest_from_name
+from signatures.models import DocumentSignature, DocumentSignatureStatus, Signature, SignerInboxCounts, SignerWorkItem
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+SIGNERS_PER_DOCUMENT_SIGNATURE = 3
+BATCH_SIZE = 5_000
+PASSWORD = "bench-password"
+
+MINIMAL_PDF = (
+    b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+    b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+    b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]>>endobj\n"
+    b"trailer<</Root 1 0 R>>\n%%EOF\n"
+)
+
+# 1x1 greyscale PNG
+MINIMAL_PNG = (
+    b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x00\x00\x00\x00:~\x9bU"
+    b"\x00\x00\x00\nIDATx\x9cc`\x00\x00\x00\x02\x00\x01H\xaf\xa4q\x00\x00\x00\x00IEND\xaeB`\x82"
+)
+
+
+def parse_scale(value):
+    return SCALES.get(value.lower()) or int(value)
+
+
+def _batched(objects, model):
+    for start in range(0, len(objects), BATCH_SIZE):
+        model.objects.bulk_create(objects[start:start + BATCH_SIZE], batch_size=BATCH_SIZE)
+
+
+def generate(scale, seed=1, stdout=None):
+    """
+    Insert a data set with `scale` DocumentSignatures. Returns a dict of row counts.
+    """
+    rng = random.Random(seed)
+    log = stdout.write if stdout else (lambda msg: None)
+    password = make_password(PASSWORD)
+    now = timezone.now()
+
+    n_signers = max(SIGNERS_PER_DOCUMENT_SIGNATURE, scale // 25)
+    n_documents = max(1, scale // 2)
+
+    # All rows share one stored blob per file type, like heavily deduplicated uploads
+    storage = content_addressed_storage()
+    pdf_name = storage.save("bench.pdf", ContentFile(MINIMAL_PDF))
+    png_name = storage.save("bench.png", ContentFile(b"\x89PNG\r\n\x1a\n"))
+
+    with transaction.atomic():
+        log(f"Creating {n_signers + 1} users...\n")
+        admin = CustomUser.objects.create(username="bench-admin", password=password, role="admin")
+        _batched([
+            CustomUser(username=f"bench-signer-{i}", email=f"signer{i}@example.com", password=password, role="signer")
+            for i in range(n_signers)
+        ], CustomUser)
+        signer_ids = list(CustomUser.objects.filter(username__startswith="bench-signer-").values_list("id", flat=True))
+
+        log(f"Creating {len(signer_ids)} signatures...\n")
+        _batched([Signature(user_id=user_id, file=png_name) for user_id in signer_ids], Signature)
+        signer_of = dict(Signature.objects.filter(user_id__in=signer_ids).values_list("id", "user_id"))
+        signature_ids = sorted(signer_of)
+
+        log(f"Creating {n_documents} documents...\n")
+        _batched([
+            Document(title=f"Bench document {i}", file=pdf_name, owner=admin, content_hash=digest_from_name(pdf_name))
+            for i in range(n_documents)
+        ], Document)
+        document_ids = list(Document.objects.filter(owner=admin).values_list("id", flat=True))
+
+        log(f"Creating {scale} document signatures and {scale * SIGNERS_PER_DOCUMENT_SIGNATURE} statuses...\n")
+        for start in range(0, scale, BATCH_SIZE):
+            count = min(BATCH_SIZE, scale - start)
+            plans = []
+            doc_sigs = []
+            for i in range(count):
+                statuses = [rng.choice(("pending", "approved", "approved", "rejected")) for _ in range(SIGNERS_PER_DOCUMENT_SIGNATURE)]
+                doc_sig = DocumentSignature(
+                    document_id=document_ids[(start + i) % len(document_ids)],
+                    creator=admin,
+                    edited_file=pdf_name,
+                    draft=rng.random() < 0.1,
+                    created_at=now,
+                    total_statuses=len(statuses),
+                    approved_count=statuses.count("approved"),
+                    rejected_count=statuses.count("rejected"),
+                    pending_count=statuses.count("pending"),
+                    fully_approved=statuses.count("approved") == len(statuses),
+                )
+                doc_sigs.append(doc_sig)
+                plans.append((statuses, rng.sample(signature_ids, len(statuses))))
+            DocumentSignature.objects.bulk_create(doc_sigs, batch_size=BATCH_SIZE)
+            status_objs = DocumentSignatureStatus.objects.bulk_create([
+                DocumentSignatureStatus(document_signature=doc_sig, signature_id=sig_id, status=status)
+                for doc_sig, (statuses, sig_ids) in zip(doc_sigs, plans)
+                for status, sig_id in zip(statuses, sig_ids)
+            ], batch_size=BATCH_SIZE)
+            SignerWorkItem.objects.bulk_create([
+                SignerWorkItem(
+                    signer_id=signer_of[status_obj.signature_id],
+                    document_signature_id=status_obj.document_signature_id,
+                    status_row_id=status_obj.id,
+                    state=status_obj.status,
+                )
+                for status_obj in status_objs if not status_obj.document_signature.draft
+            ], batch_size=BATCH_SIZE)
+
+        inbox_counts = {}
+        for signer_id, state, n in SignerWorkItem.objects.values_list("signer_id", "state").annotate(n=Count("id")).order_by():
+            inbox_counts.setdefault(signer_id, {})[state] = n
+        _batched([SignerInboxCounts(signer_id=signer_id, **states) for signer_id, states in inbox_counts.items()], SignerInboxCounts)
+
+    return {
+        "users": n_signers + 1,
+        "signatures": len(signature_ids),
+        "documents": n_documents,
+        "document_signatures": scale,
+        "document_signature_statuses": scale * SIGNERS_PER_DOCUMENT_SIGNATURE,
+    }
@@ -0,0 +1,141 @@
+"""
+Per-request cost of JWT authentication: simplejwt's JWTAuthentication, which loads the
+user on every request, against CachedJWTAuthentication (Documents/authentication.py).
+
+For each mode, times `authenticate()` alone and a few authenticated endpoints through
+the test client, with latency percentiles and SQL queries per request. Each mode runs
+in its own subprocess, since the authentication classes are fixed at start-up.
+
+    python -m benchmarks.jwt_auth --scale 10k --generate
+    python -m benchmarks.jwt_auth --iterations 2000 --output jwt-auth.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from .api import git_revision, percentile, setup_django
+
+MODES = ("baseline", "cached")
+
+
+def measure(call, iterations):
+    """
+    Latency percentiles (ms) and queries per call of `call()` after a warm-up call.
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    call()
+    samples = []
+    with CaptureQueriesContext(connection) as queries:
+        for _ in range(iterations):
+            began = time.perf_counter()
+            call()
+            samples.append((time.perf_counter() - began) * 1000)
+    return {
+        "p50": round(percentile(samples, 50), 4),
+        "p95": round(percentile(samples, 95), 4),
+        "p99": round(percentile(samples, 99), 4),
+        "queries_per_request": round(len(queries) / iterations, 2),
+    }
+
+
+def run_worker(iterations):
+    """
+    Measure in this process with the settings of BENCH_AUTH_MODE.
+    """
+    from django.test import Client, RequestFactory
+    from rest_framework.settings import api_settings
+    from rest_framework.request import Request
+
+    from Documents.models import CustomUser
+    from Documents.serializers import MyTokenObtainPairSerializer
+
+    admin = CustomUser.objects.get(username="bench-admin")
+    signer = CustomUser.objects.filter(role="signer").order_by("id").first()
+    tokens = {user: f"Bearer {MyTokenObtainPairSerializer.get_token(user).access_token}" for user in (admin, signer)}
+    admin_client = Client(HTTP_AUTHORIZATION=tokens[admin])
+    signer_client = Client(HTTP_AUTHORIZATION=tokens[signer])
+
+    authentication = api_settings.DEFAULT_AUTHENTICATION_CLASSES[0]()
+    request = Request(RequestFactory().get("/", HTTP_AUTHORIZATION=tokens[signer]))
+
+    def check(response):
+        assert response.status_code == 200, response.status_code
+
+    return {
+        "authentication_class": type(authentication).__name__,
+        "authenticate": measure(lambda: authentication.authenticate(request), iterations),
+        "user_profile_by_id": measure(lambda: check(admin_client.get(f"/api/auth/profile/{signer.id}/")), iterations),
+        "signer_inbox": measure(lambda: check(signer_client.get("/sign/inbox/")), iterations),
+        "overview": measure(lambda: check(admin_client.get("/api/auth/overview/")), iterations),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", default="10k", help="1k, 10k, 100k, 1m or a number of document signatures")
+    parser.add_argument("--generate", action="store_true", help="Flush the benchmark database and generate data first")
+    parser.add_argument("--iterations", type=int, default=1000, help="Requests per measurement")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    if args.worker:
+        print(json.dumps(run_worker(args.iterations)))
+        return
+
+    import django
+    from django.core.management import call_command
+
+    from .datagen import generate, parse_scale
+
+    call_command("migrate", verbosity=0)
+    scale = parse_scale(args.scale)
+    if args.generate:
+        call_command("flush", interactive=False, verbosity=0)
+        generate(scale, stdout=sys.stderr)
+
+    modes = {}
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.jwt_auth", "--worker", "--iterations", str(args.iterations)],
+            env={**os.environ, "BENCH_AUTH_MODE": mode}, check=True, capture_output=True, text=True,
+        ).stdout
+        modes[mode] = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode}: authenticate p50 {modes[mode]['authenticate']['p50']} ms", file=sys.stderr)
+
+    saving = {}
+    for name, baseline in modes["baseline"].items():
+        if isinstance(baseline, dict):
+            cached = modes["cached"][name]
+            saving[name] = {
+                "p50_ms": round(baseline["p50"] - cached["p50"], 4),
+                "queries_per_request": round(baseline["queries_per_request"] - cached["queries_per_request"], 2),
+            }
+
+    report = {
+        "meta": {
+            "scale": scale,
+            "iterations": args.iterations,
+            "git_revision": git_revision(),
+            "django": django.get_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "modes": modes,
+        "saving_per_request": saving,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
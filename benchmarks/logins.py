@@ -0,0 +1,178 @@
+"""
+Login throughput: passwords checked in the request threads against the hashing pool
+(Documents/hashing.py).
+
+`--threads` clients log in as generated signers (POST /api/auth/login/) for `--duration`
+seconds while one more client keeps reading the overview, to show what a login burst
+does to other requests. Reports logins per second, shed logins (503), and login and
+probe latency percentiles. Each mode runs in its own subprocess, since the hashing
+settings are fixed at start-up.
+
+    python -m benchmarks.logins --scale 1k --generate
+    python -m benchmarks.logins --threads 32 --duration 20 --output logins.json
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from .api import git_revision, percentile, setup_django
+
+MODES = ("inline", "pool")
+
+
+def latency(samples):
+    if not samples:
+        return None
+    return {
+        "p50": round(percentile(samples, 50), 3),
+        "p95": round(percentile(samples, 95), 3),
+        "p99": round(percentile(samples, 99), 3),
+    }
+
+
+def login_loop(username, start, deadline, results):
+    from django.db import close_old_connections
+    from django.test import Client
+
+    from .datagen import PASSWORD
+
+    client = Client()
+    samples, shed, failed = [], 0, 0
+    start.wait()
+    while time.perf_counter() < deadline:
+        began = time.perf_counter()
+        status = client.post("/api/auth/login/", {"username": username, "password": PASSWORD}).status_code
+        close_old_connections()
+        if status == 200:
+            samples.append((time.perf_counter() - began) * 1000)
+        elif status == 503:
+            shed += 1
+            time.sleep(0.05)
+        else:
+            failed += 1
+    results.append((samples, shed, failed))
+
+
+def probe_loop(client, start, deadline, samples):
+    from django.db import close_old_connections
+
+    start.wait()
+    while time.perf_counter() < deadline:
+        began = time.perf_counter()
+        client.get("/api/auth/overview/")
+        close_old_connections()
+        samples.append((time.perf_counter() - began) * 1000)
+        time.sleep(0.01)
+
+
+def run_worker(threads, duration):
+    """
+    Run the workload in this process with the settings of BENCH_HASHING_MODE.
+    """
+    from django.db import connection
+    from django.test import Client
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    from Documents import hashing
+    from Documents.models import CustomUser
+
+    logging.getLogger("django.request").setLevel(logging.CRITICAL)
+    usernames = list(CustomUser.objects.filter(role="signer").order_by("id").values_list("username", flat=True)[:threads])
+    admin = CustomUser.objects.get(username="bench-admin")
+    probe_client = Client(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(admin).access_token}")
+    connection.close()
+    if hashing.get_hashing_pool() is not None:
+        hashing.make_password("warm-up")  # Start a worker before the clock
+
+    start = threading.Event()
+    results, probe = [], []
+    began = time.perf_counter()
+    deadline = began + duration
+    workers = [threading.Thread(target=login_loop, args=(name, start, deadline, results)) for name in usernames]
+    workers.append(threading.Thread(target=probe_loop, args=(probe_client, start, deadline, probe)))
+    for worker in workers:
+        worker.start()
+    start.set()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - began
+
+    samples = [ms for login_samples, _, _ in results for ms in login_samples]
+    return {
+        "threads": len(usernames),
+        "logins": len(samples),
+        "logins_per_second": round(len(samples) / elapsed, 2),
+        "shed": sum(shed for _, shed, _ in results),
+        "failed": sum(failed for _, _, failed in results),
+        "login_latency_ms": latency(samples),
+        "probe_latency_ms": latency(probe),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", default="1k", help="1k, 10k, 100k, 1m or a number of document signatures")
+    parser.add_argument("--generate", action="store_true", help="Flush the benchmark database and generate data first")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per mode")
+    parser.add_argument("--mode", choices=MODES, action="append", help="Run only this mode (repeatable)")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    if args.worker:
+        print(json.dumps(run_worker(args.threads, args.duration)))
+        return
+
+    import django
+    from django.conf import settings
+    from django.core.management import call_command
+
+    from .datagen import generate, parse_scale
+
+    call_command("migrate", verbosity=0)
+    scale = parse_scale(args.scale)
+    if args.generate:
+        call_command("flush", interactive=False, verbosity=0)
+        generate(scale, stdout=sys.stderr)
+
+    modes = {}
+    for mode in args.mode or MODES:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.logins", "--worker", "--threads", str(args.threads),
+             "--duration", str(args.duration)],
+            env={**os.environ, "BENCH_HASHING_MODE": mode}, check=True, capture_output=True, text=True,
+        ).stdout
+        modes[mode] = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode}: {modes[mode]['logins_per_second']} logins/s", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "scale": scale,
+            "threads": args.threads,
+            "duration": args.duration,
+            "hashing_workers": settings.PASSWORD_HASHING_WORKERS,
+            "max_pending": settings.PASSWORD_HASHING_MAX_PENDING,
+            "cpus": os.cpu_count(),
+            "git_revision": git_revision(),
+            "django": django.get_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "modes": modes,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Settings for the benchmark suite: the project settings pointed at a separate database
+and media directory so benchmark data never mixes with real data.
+
+    BENCH_DB=/tmp/bench.sqlite3 python -m benchmarks.api --scale 10k
+"""
+import os
+
+from Signmagics.settings import *  # noqa: F401,F403
+
+DEBUG = False
+ALLOWED_HOSTS = ['testserver']
+
+DATABASES = {
+    'default': {
+        **DATABASES['default'],
+        'NAME': os.environ.get('BENCH_DB', BASE_DIR / 'bench.sqlite3'),
+    }
+}
+
+MEDIA_ROOT = os.environ.get('BENCH_MEDIA_ROOT', BASE_DIR / 'bench_media')
+
+# Stamping and thumbnails inline keep the numbers about the request path, not pool start-up
+SIGNATURE_STAMPING_WORKERS = 0
+THUMBNAIL_WORKERS = 0
+THUMBNAIL_CACHE_DIR = os.path.join(MEDIA_ROOT, 'thumbnails')
+
+# benchmarks.sqlite_concurrency runs once with the stock SQLite setup for comparison
+if os.environ.get('BENCH_SQLITE_MODE') == 'baseline':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': DATABASES['default']['NAME'],
+        'OPTIONS': {
+            'timeout': 20,
+        },
+    }
+
+# benchmarks.jwt_auth runs once with simplejwt's own authentication, which loads the user
+# on every request
+if os.environ.get('BENCH_AUTH_MODE') == 'baseline':
+    REST_FRAMEWORK = {
+        **REST_FRAMEWORK,
+        'DEFAULT_AUTHENTICATION_CLASSES': ('rest_framework_simplejwt.authentication.JWTAuthentication',),
+    }
+
+# benchmarks.logins runs once hashing passwords in the request threads
+if os.environ.get('BENCH_HASHING_MODE') == 'inline':
+    PASSWORD_HASHING_WORKERS = 0
@@ -0,0 +1,208 @@
+"""
+Concurrent read/write throughput on SQLite: the stock configuration against the tuned
+one (WAL, IMMEDIATE transactions, in-process write queue, persistent connections).
+
+`--threads` clients hit the benchmark database for `--duration` seconds. Every
+`--write-every`th request of a client approves or rejects its own signer status
+(document_sign_status); the others read a DocumentSignature's statuses or the list of
+pending documents. Connections are released after each request as a server would, so
+CONN_MAX_AGE is part of the comparison. Each mode runs in its own subprocess, since the
+database settings are fixed at start-up.
+
+    python -m benchmarks.sqlite_concurrency --scale 10k --generate
+    python -m benchmarks.sqlite_concurrency --threads 16 --duration 20 --output sqlite.json
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+from .api import git_revision, percentile, setup_django
+
+# WAL is a property of the database file rather than of a connection, so it is set once
+# before each run
+JOURNAL_MODES = {"baseline": "DELETE", "tuned": "WAL"}
+MODES = tuple(JOURNAL_MODES)
+
+
+def clients(threads):
+    """
+    (client, document signature id) for up to `threads` distinct signers, each with a
+    status on that DocumentSignature.
+    """
+    from django.test import Client
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    from signatures.models import DocumentSignatureStatus
+
+    picked, signers = [], set()
+    statuses = (
+        DocumentSignatureStatus.objects.filter(document_signature__draft=False)
+        .select_related("signature__user").order_by("id")
+    )
+    for status in statuses.iterator():
+        user = status.signature.user
+        if user.id in signers:
+            continue
+        signers.add(user.id)
+        token = RefreshToken.for_user(user).access_token
+        picked.append((Client(HTTP_AUTHORIZATION=f"Bearer {token}"), status.document_signature_id))
+        if len(picked) == threads:
+            break
+    return picked
+
+
+def client_loop(client, doc_sig_id, start, deadline, write_every, results):
+    from django.db import close_old_connections, connection
+
+    latencies = {"read": [], "write": []}
+    errors = {"read": 0, "write": 0}
+    n = 0
+    start.wait()
+    while time.perf_counter() < deadline:
+        n += 1
+        kind = "write" if n % write_every == 0 else "read"
+        began = time.perf_counter()
+        try:
+            if kind == "write":
+                action = "approve" if (n // write_every) % 2 else "reject"
+                response = client.patch(f"/sign/doc/{doc_sig_id}/{action}/")
+            elif n % 2:
+                response = client.get(f"/sign/doc-signature/{doc_sig_id}/status/")
+            else:
+                response = client.get("/sign/documents/signed/?approved=false")
+            ok = response.status_code < 400
+        except Exception:
+            ok = False
+        finally:
+            close_old_connections()
+        if ok:
+            latencies[kind].append((time.perf_counter() - began) * 1000)
+        else:
+            errors[kind] += 1
+    connection.close()
+    results.append((latencies, errors))
+
+
+def summarize(samples, errors, duration):
+    summary = {
+        "requests": len(samples),
+        "errors": errors,
+        "requests_per_second": round(len(samples) / duration, 1),
+    }
+    if samples:
+        summary["latency_ms"] = {
+            "p50": round(percentile(samples, 50), 3),
+            "p95": round(percentile(samples, 95), 3),
+            "p99": round(percentile(samples, 99), 3),
+            "max": round(max(samples), 3),
+        }
+    return summary
+
+
+def run_worker(threads, duration, write_every):
+    """
+    Run the workload in this process with the settings of BENCH_SQLITE_MODE.
+    """
+    from django.db import connection
+
+    logging.getLogger("django.request").setLevel(logging.CRITICAL)
+    picked = clients(threads)
+    connection.close()
+
+    start = threading.Event()
+    results = []
+    began = time.perf_counter()
+    deadline = began + duration
+    workers = [
+        threading.Thread(target=client_loop, args=(*client, start, deadline, write_every, results))
+        for client in picked
+    ]
+    for worker in workers:
+        worker.start()
+    start.set()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - began
+
+    report = {"threads": len(picked)}
+    for kind in ("read", "write"):
+        samples = [ms for latencies, _ in results for ms in latencies[kind]]
+        report[kind] = summarize(samples, sum(errors[kind] for _, errors in results), elapsed)
+    report["requests_per_second"] = round(report["read"]["requests_per_second"] + report["write"]["requests_per_second"], 1)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", default="10k", help="1k, 10k, 100k, 1m or a number of document signatures")
+    parser.add_argument("--generate", action="store_true", help="Flush the benchmark database and generate data first")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per mode")
+    parser.add_argument("--write-every", type=int, default=4, help="Every Nth request of a client is a write")
+    parser.add_argument("--mode", choices=MODES, action="append", help="Run only this mode (repeatable)")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    if args.worker:
+        print(json.dumps(run_worker(args.threads, args.duration, args.write_every)))
+        return
+
+    import django
+    from django.core.management import call_command
+
+    from .datagen import generate, parse_scale
+
+    call_command("migrate", verbosity=0)
+    scale = parse_scale(args.scale)
+    if args.generate:
+        call_command("flush", interactive=False, verbosity=0)
+        generate(scale, stdout=sys.stderr)
+    from django.conf import settings
+    from django.db import connection
+    connection.close()
+
+    modes = {}
+    for mode in args.mode or MODES:
+        with sqlite3.connect(settings.DATABASES["default"]["NAME"]) as db:
+            db.execute(f"PRAGMA journal_mode={JOURNAL_MODES[mode]}")
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.sqlite_concurrency", "--worker", "--threads", str(args.threads),
+             "--duration", str(args.duration), "--write-every", str(args.write_every)],
+            env={**os.environ, "BENCH_SQLITE_MODE": mode}, check=True, capture_output=True, text=True,
+        ).stdout
+        modes[mode] = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode}: {modes[mode]['requests_per_second']} requests/s", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "scale": scale,
+            "threads": args.threads,
+            "duration": args.duration,
+            "write_every": args.write_every,
+            "git_revision": git_revision(),
+            "django": django.get_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "modes": modes,
+    }
+    if "baseline" in modes and "tuned" in modes:
+        report["speedup"] = round(modes["tuned"]["requests_per_second"] / modes["baseline"]["requests_per_second"], 2)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
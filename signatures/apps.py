@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SignaturesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'signatures'
+
+    def ready(self):
+        from . import jobs  # noqa: F401
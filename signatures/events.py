@@ -0,0 +1,42 @@
+"""
+DocumentSignature progress events for the SSE stream (see Documents/events.py).
+"""
+from django.db import transaction
+
+from Documents.events import hub
+from .models import DocumentSignature, DocumentSignatureStatus
+
+COUNTER_FIELDS = ("total_statuses", "approved_count", "rejected_count", "pending_count", "fully_approved")
+
+
+def publish_document_signature_events(doc_sig_ids, event_type, **data):
+    """
+    After the current transaction commits, tell the creator and signers of each
+    DocumentSignature about `event_type` along with its current counters. Nothing is
+    queried when no client is connected.
+    """
+    doc_sig_ids = list(doc_sig_ids)
+
+    def send():
+        if not hub.has_subscribers() or not doc_sig_ids:
+            return
+        rows = DocumentSignature.objects.filter(id__in=doc_sig_ids).values("id", "creator_id", "draft", *COUNTER_FIELDS)
+        signers = {}
+        for doc_sig_id, user_id in DocumentSignatureStatus.objects.filter(
+            document_signature_id__in=doc_sig_ids
+        ).values_list("document_signature_id", "signature__user_id"):
+            signers.setdefault(doc_sig_id, set()).add(user_id)
+
+        for row in rows:
+            # Drafts aren't visible to signers yet
+            audience = set() if row["draft"] else signers.get(row["id"], set())
+            audience.add(row["creator_id"])
+            hub.publish({
+                "type": event_type,
+                "document_signature_id": row["id"],
+                "draft": row["draft"],
+                "counts": {field: row[field] for field in COUNTER_FIELDS},
+                **data,
+            }, audience)
+
+    transaction.on_commit(send)
@@ -0,0 +1,124 @@
+"""
+Streaming export of the signing history.
+
+One row per signer of a DocumentSignature (a DocumentSignatureStatus) with the document,
+its creator, the signer, the status and the timestamps. Rows are read as tuples with
+.iterator(chunk_size=...) and turned into NDJSON or CSV lines one at a time, so memory
+use stays flat however long the history is. Used by the export endpoint
+(signatures.views.export_signing_history) and `manage.py export_signing_history`.
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import DocumentSignatureStatus
+
+# (column name, lookup on DocumentSignatureStatus)
+EXPORT_COLUMNS = [
+    ("status_id", "id"),
+    ("document_signature_id", "document_signature_id"),
+    ("document_id", "document_signature__document_id"),
+    ("document_title", "document_signature__document__title"),
+    ("creator_id", "document_signature__creator_id"),
+    ("creator_username", "document_signature__creator__username"),
+    ("draft", "document_signature__draft"),
+    ("signature_id", "signature_id"),
+    ("signer_id", "signature__user_id"),
+    ("signer_username", "signature__user__username"),
+    ("status", "status"),
+    ("document_signature_created_at", "document_signature__created_at"),
+    ("status_updated_at", "updated_at"),
+]
+
+EXPORT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+STATUSES = ("pending", "approved", "rejected")
+
+
+class ExportError(ValueError):
+    pass
+
+
+def _parse_bound(name, value):
+    """
+    (datetime, whether only a date was given) for a ?since= / ?until= value.
+    """
+    try:
+        # Dates first: parse_datetime() also accepts a bare date, as midnight
+        day = parse_date(value)
+        date_only = day is not None
+        parsed = datetime.combine(day, time.min) if date_only else parse_datetime(value)
+        if parsed is None:
+            raise ValueError
+    except ValueError:
+        raise ExportError(f"{name} must be an ISO 8601 date or datetime.")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed, date_only
+
+
+def export_queryset(since=None, until=None, status=None):
+    """
+    Rows to export, oldest first. `since` and `until` filter on the status's last change
+    and take ISO dates or datetimes (a date `until` includes that whole day); `status`
+    keeps one status value. Raises ExportError for invalid filters.
+    """
+    filters = {}
+    if since:
+        filters["updated_at__gte"], _ = _parse_bound("since", since)
+    if until:
+        bound, date_only = _parse_bound("until", until)
+        if date_only:
+            filters["updated_at__lt"] = bound + timedelta(days=1)
+        else:
+            filters["updated_at__lte"] = bound
+    if status:
+        if status not in STATUSES:
+            raise ExportError(f"status must be one of: {', '.join(STATUSES)}.")
+        filters["status"] = status
+
+    lookups = [lookup for _, lookup in EXPORT_COLUMNS]
+    return DocumentSignatureStatus.objects.filter(**filters).order_by("id").values_list(*lookups)
+
+
+def _rows(queryset, chunk_size):
+    return queryset.iterator(chunk_size=chunk_size or getattr(settings, "SIGNING_EXPORT_CHUNK_SIZE", 2000))
+
+
+def ndjson_lines(queryset, chunk_size=None):
+    names = [name for name, _ in EXPORT_COLUMNS]
+    for row in _rows(queryset, chunk_size):
+        yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+class _Echo:
+    """
+    File-like object for csv.writer that hands each line back instead of storing it.
+    """
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(queryset, chunk_size=None):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for row in _rows(queryset, chunk_size):
+        yield writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+
+
+def export_lines(export_type, queryset, chunk_size=None):
+    """
+    Text lines of the export in `export_type` (a key of EXPORT_TYPES).
+    """
+    if export_type == "csv":
+        return csv_lines(queryset, chunk_size)
+    return ndjson_lines(queryset, chunk_size)
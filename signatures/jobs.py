@@ -0,0 +1,52 @@
+"""
+Background job handlers for signing work (see Documents/jobs.py).
+"""
+import os
+
+from django.core.files.base import ContentFile
+
+from Documents.jobs import PermanentJobError, job_handler
+from .models import DocumentSignature, Signature
+from .stamping import MALFORMED_IMAGE_ERRORS, Placement, StampingError, stamp_pdf
+
+
+@job_handler("stamp_document_signature")
+def stamp_document_signature(payload):
+    """
+    Render the edited file of a DocumentSignature created by a background stamp request.
+    Payload: {"document_signature_id": 1, "placements": [{"signature_id", "page", "x", "y", "width", "height"}]}
+    """
+    try:
+        doc_sig = DocumentSignature.objects.select_related("document").get(id=payload["document_signature_id"])
+    except DocumentSignature.DoesNotExist:
+        raise PermanentJobError(f"DocumentSignature {payload['document_signature_id']} no longer exists.")
+    signatures = Signature.objects.in_bulk({p["signature_id"] for p in payload["placements"]})
+    missing = {p["signature_id"] for p in payload["placements"]} - set(signatures)
+    if missing:
+        # Deleted after the job was queued
+        raise PermanentJobError(f"Signatures no longer exist: {sorted(missing)}")
+    placements = [
+        Placement(
+            image_path=signatures[p["signature_id"]].file.path,
+            page=p["page"], x=p["x"], y=p["y"], width=p["width"], height=p["height"]
+        )
+        for p in payload["placements"]
+    ]
+
+    # Already running off the request path, so stamp in this worker rather than the request pool
+    try:
+        stamped = stamp_pdf(doc_sig.document.file.path, placements)
+    except StampingError as e:
+        if e.status < 500:
+            # A bad PDF or image fails the same way on every attempt
+            raise PermanentJobError(str(e)) from e
+        raise
+    except (FileNotFoundError, *MALFORMED_IMAGE_ERRORS) as e:
+        # A missing or undecodable file that didn't come back as a StampingError
+        raise PermanentJobError(f"Can't stamp: {e!r}") from e
+
+    base_name = os.path.splitext(os.path.basename(doc_sig.document.file.name))[0]
+    # Only the file: approvals, rejections or a finalize may have changed the row while this ran
+    doc_sig.edited_file.save(f"{base_name}_signed.pdf", ContentFile(stamped), save=False)
+    doc_sig.save(update_fields=["edited_file", "updated_at"])
+    return {"document_signature_id": doc_sig.id, "edited_file": doc_sig.edited_file.name}
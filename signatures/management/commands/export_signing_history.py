@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from signatures.export import EXPORT_TYPES, ExportError, export_lines, export_queryset
+
+
+class Command(BaseCommand):
+    help = "Stream the signing history (one row per signer and DocumentSignature) as NDJSON or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--type", choices=sorted(EXPORT_TYPES), default="ndjson")
+        parser.add_argument("--since", help="ISO date or datetime; statuses last changed at or after it")
+        parser.add_argument("--until", help="ISO date or datetime; statuses last changed up to it (a date includes the whole day)")
+        parser.add_argument("--status", help="pending, approved or rejected")
+        parser.add_argument("--chunk-size", type=int, default=None)
+        parser.add_argument("--output", help="Write to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        try:
+            queryset = export_queryset(since=options["since"], until=options["until"], status=options["status"])
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        lines = export_lines(options["type"], queryset, chunk_size=options["chunk_size"])
+        if options["output"]:
+            with open(options["output"], "w", newline="") as f:
+                f.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from signatures.models import DocumentSignatureStatus, SignerInboxCounts, SignerWorkItem
+
+
+class Command(BaseCommand):
+    help = "Recreate the signer inbox (SignerWorkItem and SignerInboxCounts) from the statuses of sent DocumentSignatures."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        created = 0
+
+        with transaction.atomic():
+            deleted, _ = SignerWorkItem.objects.all().delete()
+            SignerInboxCounts.objects.all().delete()
+            statuses = (
+                DocumentSignatureStatus.objects.filter(document_signature__draft=False)
+                .select_related("signature").order_by("id")
+            )
+            batch = []
+            for status in statuses.iterator(chunk_size=batch_size):
+                batch.append(status)
+                if len(batch) >= batch_size:
+                    created += len(SignerWorkItem.open_for(batch))
+                    batch = []
+            created += len(SignerWorkItem.open_for(batch))
+
+        self.stdout.write(self.style.SUCCESS(f"Removed {deleted} work items, created {created}."))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from signatures.models import DocumentSignature
+
+
+COUNTER_FIELDS = ["total_statuses", "approved_count", "rejected_count", "pending_count", "fully_approved"]
+
+
+class Command(BaseCommand):
+    help = "Backfill or repair the denormalized status counters on DocumentSignature."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--dry-run", action="store_true", help="Report drift without writing.")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        dry_run = options["dry_run"]
+        checked = repaired = 0
+
+        ids = DocumentSignature.objects.order_by("id").values_list("id", flat=True)
+        for start in range(0, ids.count(), batch_size):
+            batch_ids = list(ids[start:start + batch_size])
+            with transaction.atomic():
+                for doc_sig in DocumentSignature.objects.select_for_update().filter(id__in=batch_ids):
+                    checked += 1
+                    before = [getattr(doc_sig, f) for f in COUNTER_FIELDS]
+                    doc_sig.recompute_counters()
+                    if before == [getattr(doc_sig, f) for f in COUNTER_FIELDS]:
+                        continue
+                    repaired += 1
+                    if not dry_run:
+                        doc_sig.save(update_fields=COUNTER_FIELDS + ["updated_at"])
+
+        verb = "would repair" if dry_run else "repaired"
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} document signatures, {verb} {repaired}."))
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_counters(apps, schema_editor):
+    DocumentSignature = apps.get_model("signatures", "DocumentSignature")
+    DocumentSignatureStatus = apps.get_model("signatures", "DocumentSignatureStatus")
+
+    counts = {}
+    rows = (
+        DocumentSignatureStatus.objects.values_list("document_signature_id", "status")
+        .annotate(n=models.Count("id")).order_by()
+    )
+    for doc_sig_id, status, n in rows:
+        counts.setdefault(doc_sig_id, {})[status] = n
+
+    for doc_sig_id, by_status in counts.items():
+        total = sum(by_status.values())
+        approved = by_status.get("approved", 0)
+        DocumentSignature.objects.filter(id=doc_sig_id).update(
+            total_statuses=total,
+            approved_count=approved,
+            rejected_count=by_status.get("rejected", 0),
+            pending_count=by_status.get("pending", 0),
+            fully_approved=approved == total,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Documents', '0001_initial'),
+        ('signatures', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentsignature',
+            name='approved_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='documentsignature',
+            name='fully_approved',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='documentsignature',
+            name='pending_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='documentsignature',
+            name='rejected_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='documentsignature',
+            name='total_statuses',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='documentsignature',
+            index=models.Index(fields=['draft', 'fully_approved'], name='docsig_draft_approved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='documentsignature',
+            index=models.Index(fields=['draft', 'pending_count'], name='docsig_draft_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='documentsignature',
+            index=models.Index(fields=['creator', 'draft', 'fully_approved'], name='docsig_creator_approved_idx'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
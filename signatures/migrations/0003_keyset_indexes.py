@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Documents', '0002_keyset_indexes'),
+        ('signatures', '0002_document_signature_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='documentsignature',
+            name='docsig_draft_approved_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='documentsignature',
+            name='docsig_creator_approved_idx',
+        ),
+        migrations.AddIndex(
+            model_name='documentsignature',
+            index=models.Index(fields=['draft', 'fully_approved', '-id'], name='docsig_approved_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='documentsignature',
+            index=models.Index(fields=['creator', 'draft', 'fully_approved', '-id'], name='docsig_creator_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='signature',
+            index=models.Index(fields=['-created_at', '-id'], name='signature_keyset_idx'),
+        ),
+    ]
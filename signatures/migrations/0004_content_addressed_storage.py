@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:54
+
+import Documents.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('signatures', '0003_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='documentsignature',
+            name='edited_file',
+            field=models.FileField(blank=True, null=True, storage=Documents.storage.content_addressed_storage, upload_to='documents/with_signatures/'),
+        ),
+        migrations.AlterField(
+            model_name='signature',
+            name='file',
+            field=models.FileField(storage=Documents.storage.content_addressed_storage, upload_to='signatures/'),
+        ),
+    ]
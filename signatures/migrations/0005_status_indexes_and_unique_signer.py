@@ -0,0 +1,81 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def remove_duplicate_statuses(apps, schema_editor):
+    """
+    Keep one status per (document_signature, signature) before the unique constraint is
+    added: a decision wins over pending, then the most recent row. Counters of the
+    affected DocumentSignatures are recounted.
+    """
+    DocumentSignature = apps.get_model("signatures", "DocumentSignature")
+    DocumentSignatureStatus = apps.get_model("signatures", "DocumentSignatureStatus")
+
+    duplicated = (
+        DocumentSignatureStatus.objects.values("document_signature_id", "signature_id")
+        .annotate(n=models.Count("id")).filter(n__gt=1).order_by()
+    )
+    affected = set()
+    for row in duplicated:
+        statuses = list(
+            DocumentSignatureStatus.objects.filter(
+                document_signature_id=row["document_signature_id"], signature_id=row["signature_id"]
+            ).order_by("-updated_at", "-id")
+        )
+        keep = next((s for s in statuses if s.status != "pending"), statuses[0])
+        DocumentSignatureStatus.objects.filter(id__in=[s.id for s in statuses if s.id != keep.id]).delete()
+        affected.add(row["document_signature_id"])
+
+    for doc_sig_id in affected:
+        by_status = dict(
+            DocumentSignatureStatus.objects.filter(document_signature_id=doc_sig_id)
+            .values_list("status").annotate(n=models.Count("id")).order_by()
+        )
+        total = sum(by_status.values())
+        approved = by_status.get("approved", 0)
+        DocumentSignature.objects.filter(id=doc_sig_id).update(
+            total_statuses=total,
+            approved_count=approved,
+            rejected_count=by_status.get("rejected", 0),
+            pending_count=by_status.get("pending", 0),
+            fully_approved=approved == total,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Documents', '0005_job_queue'),
+        ('signatures', '0004_content_addressed_storage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='documentsignature',
+            index=models.Index(fields=['draft', 'created_at'], name='docsig_draft_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='documentsignature',
+            index=models.Index(condition=models.Q(('draft', False)), fields=['fully_approved', '-id'], name='docsig_sent_approved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='documentsignaturestatus',
+            index=models.Index(fields=['signature', 'document_signature'], name='docsigstatus_signer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='documentsignaturestatus',
+            index=models.Index(fields=['document_signature', 'status'], name='docsigstatus_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='documentsignaturestatus',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['signature', 'document_signature'], name='docsigstatus_pending_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_statuses, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='documentsignaturestatus',
+            constraint=models.UniqueConstraint(fields=('document_signature', 'signature'), name='docsigstatus_unique_signer'),
+        ),
+    ]
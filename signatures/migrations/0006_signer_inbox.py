@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_work_items(apps, schema_editor):
+    DocumentSignatureStatus = apps.get_model("signatures", "DocumentSignatureStatus")
+    SignerWorkItem = apps.get_model("signatures", "SignerWorkItem")
+
+    rows = (
+        DocumentSignatureStatus.objects.filter(document_signature__draft=False)
+        .order_by("id").values_list("id", "document_signature_id", "signature__user_id", "status")
+    )
+    batch = []
+    for status_id, doc_sig_id, signer_id, state in rows.iterator(chunk_size=2000):
+        batch.append(SignerWorkItem(
+            signer_id=signer_id, document_signature_id=doc_sig_id, status_row_id=status_id, state=state
+        ))
+        if len(batch) >= 2000:
+            SignerWorkItem.objects.bulk_create(batch)
+            batch = []
+    SignerWorkItem.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('signatures', '0005_status_indexes_and_unique_signer'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SignerWorkItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected')], default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('document_signature', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='work_items', to='signatures.documentsignature')),
+                ('signer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='work_items', to=settings.AUTH_USER_MODEL)),
+                ('status_row', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='work_item', to='signatures.documentsignaturestatus')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['signer', 'state', '-id'], name='workitem_inbox_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_work_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_counts(apps, schema_editor):
+    SignerWorkItem = apps.get_model("signatures", "SignerWorkItem")
+    SignerInboxCounts = apps.get_model("signatures", "SignerInboxCounts")
+    counts = {}
+    for signer_id, state, n in SignerWorkItem.objects.values_list("signer_id", "state").annotate(n=Count("id")).order_by():
+        counts.setdefault(signer_id, {})[state] = n
+    SignerInboxCounts.objects.bulk_create(
+        [SignerInboxCounts(signer_id=signer_id, **states) for signer_id, states in counts.items()], batch_size=2000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('signatures', '0007_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SignerInboxCounts',
+            fields=[
+                ('signer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='inbox_counts', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('pending', models.PositiveIntegerField(default=0)),
+                ('approved', models.PositiveIntegerField(default=0)),
+                ('rejected', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
@@ -1,22 +1,127 @@
-from django.db import models
+from collections import Counter
+
+from django.db import models, transaction
+from django.db.models import Case, Count, F, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
 from Documents.models import *
+from Documents.storage import content_addressed_storage
 
 class Signature(models.Model):
     user = models.ForeignKey("Documents.CustomUser", on_delete=models.CASCADE)
-    file = models.FileField(upload_to="signatures/")  
+    file = models.FileField(upload_to="signatures/", storage=content_addressed_storage)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="signature_keyset_idx"),
+        ]
 
     def __str__(self):
         return f"Signature of {self.user.username}"
 
 
 
+# Maps a DocumentSignatureStatus.status value to its counter column on DocumentSignature
+STATUS_COUNTER_FIELDS = {
+    "pending": "pending_count",
+    "approved": "approved_count",
+    "rejected": "rejected_count",
+}
+
+
 class DocumentSignature(models.Model):
     document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name="document_signatures")
-    edited_file = models.FileField(upload_to="documents/with_signatures/", blank=True, null=True)
+    edited_file = models.FileField(upload_to="documents/with_signatures/", storage=content_addressed_storage, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True,null= True, blank=True)
     creator = models.ForeignKey(CustomUser, on_delete=models.CASCADE, null= True, blank=True)
     draft = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Denormalized counters over signature_statuses, kept in sync by the views
+    # (see apply_status_change) and repaired by `manage.py repair_signature_counters`
+    total_statuses = models.PositiveIntegerField(default=0)
+    approved_count = models.PositiveIntegerField(default=0)
+    rejected_count = models.PositiveIntegerField(default=0)
+    pending_count = models.PositiveIntegerField(default=0)
+    fully_approved = models.BooleanField(default=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["draft", "fully_approved", "-id"], name="docsig_approved_keyset_idx"),
+            models.Index(fields=["draft", "pending_count"], name="docsig_draft_pending_idx"),
+            models.Index(fields=["creator", "draft", "fully_approved", "-id"], name="docsig_creator_keyset_idx"),
+            models.Index(fields=["draft", "created_at"], name="docsig_draft_created_idx"),
+            # Sent (non-draft) rows are what every listing reads; backends without
+            # partial index support skip this one
+            models.Index(
+                fields=["fully_approved", "-id"], condition=models.Q(draft=False), name="docsig_sent_approved_idx"
+            ),
+        ]
+
+    def set_initial_counters(self, pending):
+        """
+        Set the counters for a DocumentSignature whose statuses are all freshly created as pending.
+        """
+        self.total_statuses = pending
+        self.pending_count = pending
+        self.approved_count = 0
+        self.rejected_count = 0
+        self.fully_approved = pending == 0
+
+    def recompute_counters(self):
+        """
+        Recount the statuses from DocumentSignatureStatus rows (used by the repair command).
+        """
+        counts = dict(
+            self.signature_statuses.values_list("status").annotate(n=models.Count("id")).order_by()
+        )
+        self.pending_count = counts.get("pending", 0)
+        self.approved_count = counts.get("approved", 0)
+        self.rejected_count = counts.get("rejected", 0)
+        self.total_statuses = sum(counts.values())
+        self.fully_approved = self.approved_count == self.total_statuses
+
+    @classmethod
+    def apply_status_change(cls, doc_sig_id, old_status, new_status):
+        """
+        Move one status from `old_status` to `new_status` in the counters of a DocumentSignature.
+        The row is locked so concurrent approvals don't lose updates.
+        """
+        if old_status == new_status:
+            return None
+
+        with transaction.atomic():
+            doc_sig = cls.objects.select_for_update().get(id=doc_sig_id)
+            old_field = STATUS_COUNTER_FIELDS[old_status]
+            new_field = STATUS_COUNTER_FIELDS[new_status]
+            setattr(doc_sig, old_field, max(getattr(doc_sig, old_field) - 1, 0))
+            setattr(doc_sig, new_field, getattr(doc_sig, new_field) + 1)
+            doc_sig.fully_approved = doc_sig.approved_count == doc_sig.total_statuses
+            doc_sig.save(update_fields=[old_field, new_field, "fully_approved", "updated_at"])
+        return doc_sig
+
+    @classmethod
+    def apply_pending_decisions(cls, decided, new_status):
+        """
+        Move pending statuses to `new_status` in bulk; `decided` maps DocumentSignature id to
+        the number of its statuses that were decided. One UPDATE per distinct count, then
+        one for fully_approved; F() expressions keep concurrent changes intact.
+        """
+        new_field = STATUS_COUNTER_FIELDS[new_status]
+        by_count = {}
+        for doc_sig_id, count in decided.items():
+            by_count.setdefault(count, []).append(doc_sig_id)
+        for count, ids in by_count.items():
+            cls.objects.filter(id__in=ids).update(**{
+                "pending_count": Greatest(F("pending_count") - count, 0),
+                new_field: F(new_field) + count,
+                "updated_at": timezone.now(),
+            })
+        cls.objects.filter(id__in=list(decided)).update(fully_approved=Case(
+            When(approved_count=F("total_statuses"), then=True), default=False,
+        ))
     
 
 class DocumentSignatureStatus(models.Model):
@@ -28,3 +133,118 @@ class DocumentSignatureStatus(models.Model):
         default="pending"
     )
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # One status per signer and document; also the index for (document_signature, signature) lookups
+            models.UniqueConstraint(fields=["document_signature", "signature"], name="docsigstatus_unique_signer"),
+        ]
+        indexes = [
+            models.Index(fields=["signature", "document_signature"], name="docsigstatus_signer_idx"),
+            models.Index(fields=["document_signature", "status"], name="docsigstatus_status_idx"),
+            models.Index(
+                fields=["signature", "document_signature"], condition=models.Q(status="pending"),
+                name="docsigstatus_pending_idx",
+            ),
+        ]
+
+
+class SignerWorkItem(models.Model):
+    """
+    One signer's part in a sent DocumentSignature; the rows behind the signer inbox.
+    Created when a DocumentSignature is assigned as final or finalized, and updated on
+    approve/reject, so the inbox never scans a signer's whole status history.
+    `manage.py rebuild_inbox` recreates the table from DocumentSignatureStatus.
+    """
+    signer = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="work_items")
+    document_signature = models.ForeignKey(DocumentSignature, on_delete=models.CASCADE, related_name="work_items")
+    status_row = models.OneToOneField(DocumentSignatureStatus, on_delete=models.CASCADE, related_name="work_item")
+    state = models.CharField(
+        max_length=20,
+        choices=[("pending", "Pending"), ("approved", "Approved"), ("rejected", "Rejected")],
+        default="pending"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["signer", "state", "-id"], name="workitem_inbox_idx"),
+        ]
+
+    @classmethod
+    def open_for(cls, statuses):
+        """
+        Add inbox items for the statuses of a sent DocumentSignature (with `signature` loaded).
+        Statuses that already have an item are skipped, so the signers' counts stay exact.
+        """
+        statuses = list(statuses)
+        existing = set(
+            cls.objects.filter(status_row_id__in=[status.id for status in statuses])
+            .values_list("status_row_id", flat=True)
+        )
+        created = cls.objects.bulk_create([
+            cls(
+                signer_id=status.signature.user_id,
+                document_signature_id=status.document_signature_id,
+                status_row_id=status.id,
+                state=status.status,
+            )
+            for status in statuses if status.id not in existing
+        ], ignore_conflicts=True)
+        deltas = {}
+        for item in created:
+            deltas.setdefault(item.signer_id, Counter())[item.state] += 1
+        SignerInboxCounts.apply(deltas)
+        return created
+
+    @classmethod
+    def record_decision(cls, status_ids, state):
+        items = cls.objects.filter(status_row_id__in=status_ids).exclude(state=state)
+        deltas = {}
+        for signer_id, old_state, n in items.values_list("signer_id", "state").annotate(n=Count("id")).order_by():
+            counter = deltas.setdefault(signer_id, Counter())
+            counter[old_state] -= n
+            counter[state] += n
+        updated = items.update(state=state, updated_at=timezone.now())
+        SignerInboxCounts.apply(deltas)
+        return updated
+
+
+class SignerInboxCounts(models.Model):
+    """
+    Number of a signer's work items in each state, read by the inbox with one lookup.
+    Kept in sync by SignerWorkItem.open_for/record_decision; items removed outside the
+    API (admin, cascading deletes) are accounted for by `manage.py rebuild_inbox`.
+    """
+    signer = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name="inbox_counts")
+    pending = models.PositiveIntegerField(default=0)
+    approved = models.PositiveIntegerField(default=0)
+    rejected = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    STATES = ("pending", "approved", "rejected")
+
+    @classmethod
+    def apply(cls, deltas):
+        """
+        Add `deltas` ({signer_id: Counter(state=change)}) to the counts, creating missing rows.
+        Signers with the same changes share one UPDATE; F() expressions keep concurrent changes intact.
+        """
+        if not deltas:
+            return
+        cls.objects.bulk_create([cls(signer_id=signer_id) for signer_id in deltas], ignore_conflicts=True)
+        by_change = {}
+        for signer_id, counter in deltas.items():
+            change = tuple(counter.get(state, 0) for state in cls.STATES)
+            if any(change):
+                by_change.setdefault(change, []).append(signer_id)
+        for change, signer_ids in by_change.items():
+            cls.objects.filter(signer_id__in=signer_ids).update(updated_at=timezone.now(), **{
+                state: Greatest(F(state) + n, 0) for state, n in zip(cls.STATES, change) if n
+            })
+
+    @classmethod
+    def for_signer(cls, signer):
+        counts = cls.objects.filter(signer=signer).values(*cls.STATES).first()
+        return counts or dict.fromkeys(cls.STATES, 0)
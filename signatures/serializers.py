@@ -1,35 +1,138 @@
 from rest_framework import serializers
+from django.conf import settings
+from django.urls import reverse
 from .models import *
+from Documents.prefetching import PrefetchingSerializerMixin
+from Documents import object_cache
+from Documents.thumbnails import thumbnail_url
+
+class SignatureSerializer(PrefetchingSerializerMixin, serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
 
-class SignatureSerializer(serializers.ModelSerializer):
     class Meta:
         model = Signature
-        fields = ['id', 'user', 'file', 'created_at']
-        read_only_fields = ['id', 'user', 'created_at']
+        fields = ['id', 'user', 'file', 'download_url', 'thumbnail_url', 'created_at']
+        read_only_fields = ['id', 'user', 'download_url', 'thumbnail_url', 'created_at']
+
+    def get_download_url(self, obj):
+        request = self.context.get('request')
+        if obj.file and request:
+            return request.build_absolute_uri(reverse('signature-download', args=[obj.id]))
+        return None
+
+    def get_thumbnail_url(self, obj):
+        return thumbnail_url(self.context.get('request'), 'signature-thumbnail', obj.id, obj.file)
 
 
 
-class AssignMultipleSignaturesSerializer(serializers.Serializer):
+class SignatureIdsSerializer(serializers.Serializer):
+    """
+    Resolves `signature_id` to Signature objects from the object cache (one in_bulk lookup for misses).
+    """
     signature_id = serializers.ListField(
         child=serializers.IntegerField(), write_only=True
     )
-    file = serializers.FileField(write_only=True)
-    status = serializers.CharField(required=False, write_only=True)  # ✅ Add this
+    status = serializers.CharField(required=False, write_only=True)
 
     def validate_signature_id(self, value):
+        # Drop repeated ids, keeping the order they were given in
+        value = list(dict.fromkeys(value))
+        self._signatures = object_cache.get_many(Signature, value)
         for sig_id in value:
-            if not Signature.objects.filter(id=sig_id).exists():
+            if sig_id not in self._signatures:
                 raise serializers.ValidationError(f"Signature ID {sig_id} not found")
         return value
 
+    def validate(self, attrs):
+        # Signature objects resolved above, in request order
+        attrs['signatures'] = [self._signatures[sig_id] for sig_id in attrs['signature_id']]
+        return attrs
+
+
+class AssignMultipleSignaturesSerializer(SignatureIdsSerializer):
+    file = serializers.FileField(write_only=True)
+
+
+class PlacementSerializer(serializers.Serializer):
+    """
+    Position of one signature image, in PDF points from the bottom-left of a 1-based page.
+    """
+    signature_id = serializers.IntegerField()
+    page = serializers.IntegerField(min_value=1)
+    x = serializers.FloatField(min_value=0)
+    y = serializers.FloatField(min_value=0)
+    width = serializers.FloatField(min_value=1)
+    height = serializers.FloatField(min_value=1)
+
+
+class StampSignaturesSerializer(SignatureIdsSerializer):
+    placements = PlacementSerializer(many=True, allow_empty=False)
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        unknown = sorted({p['signature_id'] for p in attrs['placements']} - set(attrs['signature_id']))
+        if unknown:
+            raise serializers.ValidationError({"placements": f"Signature IDs not in signature_id: {unknown}"})
+        return attrs
+
+
+class BulkDecisionSerializer(serializers.Serializer):
+    document_signature_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+    def validate_document_signature_ids(self, value):
+        max_items = getattr(settings, "SIGNATURE_BULK_DECISION_MAX", 1000)
+        if len(value) > max_items:
+            raise serializers.ValidationError(f"At most {max_items} document signatures per request.")
+        return list(dict.fromkeys(value))
+
+
+class DocumentAssignmentSerializer(serializers.Serializer):
+    document_id = serializers.IntegerField()
+    signature_id = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    status = serializers.CharField(required=False)
+
+    def validate_signature_id(self, value):
+        return list(dict.fromkeys(value))
+
+
+class BatchAssignSignaturesSerializer(serializers.Serializer):
+    """
+    Signer sets for many documents at once. Documents and signatures are resolved with one
+    in_bulk lookup each; any unknown id fails the whole batch.
+    """
+    assignments = DocumentAssignmentSerializer(many=True, allow_empty=False)
 
+    def validate_assignments(self, value):
+        max_assignments = getattr(settings, "SIGNATURE_BATCH_MAX_ASSIGNMENTS", 1000)
+        if len(value) > max_assignments:
+            raise serializers.ValidationError(f"At most {max_assignments} assignments per batch.")
 
-class DocumentSerializer(serializers.ModelSerializer):
+        documents = Document.objects.in_bulk({item['document_id'] for item in value})
+        signatures = Signature.objects.in_bulk({sig_id for item in value for sig_id in item['signature_id']})
+
+        missing_documents = sorted({item['document_id'] for item in value} - documents.keys())
+        if missing_documents:
+            raise serializers.ValidationError(f"Document IDs not found: {missing_documents}")
+        missing_signatures = sorted({sig_id for item in value for sig_id in item['signature_id']} - signatures.keys())
+        if missing_signatures:
+            raise serializers.ValidationError(f"Signature IDs not found: {missing_signatures}")
+
+        for item in value:
+            item['document'] = documents[item['document_id']]
+            item['signatures'] = [signatures[sig_id] for sig_id in item['signature_id']]
+        return value
+
+
+
+class DocumentSerializer(PrefetchingSerializerMixin, serializers.ModelSerializer):
     file_url = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
 
     class Meta:
         model = Document
-        fields = ['id', 'title', 'file', 'file_url', 'owner_id', 'created_at']
+        fields = ['id', 'title', 'file', 'file_url', 'download_url', 'thumbnail_url', 'owner_id', 'created_at']
 
     def get_file_url(self, obj):
         request = self.context.get('request')
@@ -37,19 +140,59 @@ class DocumentSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.file.url)
         return None
 
+    def get_download_url(self, obj):
+        request = self.context.get('request')
+        if obj.file and request:
+            return request.build_absolute_uri(reverse('document-download', args=[obj.id]))
+        return None
 
-class DocumentSignatureSerializer(serializers.ModelSerializer):
+    def get_thumbnail_url(self, obj):
+        return thumbnail_url(self.context.get('request'), 'document-thumbnail', obj.id, obj.file)
+
+
+class DocumentSignatureSerializer(PrefetchingSerializerMixin, serializers.ModelSerializer):
     document = DocumentSerializer(read_only=True)
     edited_file_url = serializers.SerializerMethodField()
+    edited_file_download_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
     creator_id = serializers.IntegerField(source='creator.id', read_only=True)
     creator_username = serializers.CharField(source='creator.username', read_only=True)
 
     class Meta:
         model = DocumentSignature
-        fields = ['id', 'document', 'edited_file', 'edited_file_url', 'creator_id', 'creator_username', 'created_at']
+        fields = ['id', 'document', 'edited_file', 'edited_file_url', 'edited_file_download_url', 'thumbnail_url', 'creator_id', 'creator_username', 'created_at']
+        select_related = ['creator']
 
     def get_edited_file_url(self, obj):
         request = self.context.get('request')
         if obj.edited_file and request:
             return request.build_absolute_uri(obj.edited_file.url)
         return None
+
+    def get_edited_file_download_url(self, obj):
+        request = self.context.get('request')
+        if obj.edited_file and request:
+            return request.build_absolute_uri(reverse('document-signature-download', args=[obj.id]))
+        return None
+
+    def get_thumbnail_url(self, obj):
+        return thumbnail_url(self.context.get('request'), 'document-signature-thumbnail', obj.id, obj.edited_file)
+
+
+class SignerWorkItemSerializer(PrefetchingSerializerMixin, serializers.ModelSerializer):
+    status_id = serializers.IntegerField(source='status_row_id', read_only=True)
+    document_id = serializers.IntegerField(source='document_signature.document_id', read_only=True)
+    document_title = serializers.CharField(source='document_signature.document.title', read_only=True)
+    creator_id = serializers.IntegerField(source='document_signature.creator_id', read_only=True)
+    edited_file_download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = SignerWorkItem
+        fields = ['id', 'status_id', 'state', 'document_signature', 'document_id', 'document_title', 'creator_id', 'edited_file_download_url', 'created_at', 'updated_at']
+        select_related = ['document_signature__document']
+
+    def get_edited_file_download_url(self, obj):
+        request = self.context.get('request')
+        if obj.document_signature.edited_file and request:
+            return request.build_absolute_uri(reverse('document-signature-download', args=[obj.document_signature_id]))
+        return None
@@ -0,0 +1,437 @@
+"""
+Server-side signature stamping.
+
+Signature images are composited onto PDF pages as image XObjects with pypdf, so the
+client no longer has to upload an already-edited copy of the document. PNG signatures
+(the common case, usually with transparency) are decoded in pure Python; JPEGs are
+embedded as-is. Pillow is used for anything else when it is installed.
+
+Rendering is CPU-bound, so stamp_document() runs stamp_pdf() in a process pool
+(SIGNATURE_STAMPING_WORKERS, 0 runs inline). Each worker keeps decoded signature images
+in an LRU cache, so the same signer's image isn't decoded again for every document.
+
+This module must not import Django models: it is loaded by the pool's worker processes.
+"""
+import io
+import os
+import struct
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from functools import lru_cache
+from multiprocessing import get_context
+
+try:
+    from pypdf import PdfReader, PdfWriter
+    from pypdf.generic import ArrayObject, DictionaryObject, NameObject, NumberObject, StreamObject
+except ImportError:  # pragma: no cover - pypdf is in requirements.txt
+    PdfReader = None
+
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    PILImage = None
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+DECODED_IMAGE_CACHE_SIZE = 64
+
+
+class StampingError(Exception):
+    """
+    The document or a signature image can't be stamped (bad page, unsupported image...).
+    `status` is the HTTP status to answer with: 503 when stamping itself is unavailable
+    (timed out, crashed worker) and worth retrying.
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass(frozen=True)
+class DecodedImage:
+    width: int
+    height: int
+    colorspace: str          # "/DeviceRGB" or "/DeviceGray"
+    data: bytes              # compressed pixel data, ready for the XObject stream
+    filter: str              # "/FlateDecode" or "/DCTDecode"
+    alpha: bytes = None      # Flate-compressed 8-bit soft mask, if the image has transparency
+
+
+@dataclass(frozen=True)
+class Placement:
+    """
+    Where to draw one signature image. `page` is 1-based; x, y, width and height are in
+    PDF points with the origin at the bottom-left of the page.
+    """
+    image_path: str
+    page: int
+    x: float
+    y: float
+    width: float
+    height: float
+
+
+# PNG decoding
+
+def _paeth(a, b, c):
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    if pb <= pc:
+        return b
+    return c
+
+
+def _unfilter(raw, width, height, bpp, stride):
+    rows = []
+    prev = bytearray(stride)
+    pos = 0
+    for _ in range(height):
+        filter_type = raw[pos]
+        line = bytearray(raw[pos + 1:pos + 1 + stride])
+        pos += stride + 1
+        if filter_type == 1:
+            for i in range(bpp, stride):
+                line[i] = (line[i] + line[i - bpp]) & 0xFF
+        elif filter_type == 2:
+            for i in range(stride):
+                line[i] = (line[i] + prev[i]) & 0xFF
+        elif filter_type == 3:
+            for i in range(stride):
+                left = line[i - bpp] if i >= bpp else 0
+                line[i] = (line[i] + ((left + prev[i]) >> 1)) & 0xFF
+        elif filter_type == 4:
+            for i in range(stride):
+                left = line[i - bpp] if i >= bpp else 0
+                up_left = prev[i - bpp] if i >= bpp else 0
+                line[i] = (line[i] + _paeth(left, prev[i], up_left)) & 0xFF
+        elif filter_type != 0:
+            raise StampingError(f"Corrupt PNG (filter type {filter_type}).")
+        rows.append(line)
+        prev = line
+    return rows
+
+
+def _unpack_bits(line, bit_depth, width):
+    if bit_depth == 8:
+        return line
+    per_byte = 8 // bit_depth
+    mask = (1 << bit_depth) - 1
+    out = bytearray(width)
+    for i in range(width):
+        byte = line[i // per_byte]
+        shift = 8 - bit_depth * (i % per_byte + 1)
+        out[i] = (byte >> shift) & mask
+    return out
+
+
+# What the pure-Python parsers raise on truncated or corrupt input
+MALFORMED_IMAGE_ERRORS = (struct.error, zlib.error, IndexError, ValueError)
+
+
+def decode_png(data):
+    """
+    Decode a non-interlaced PNG into a DecodedImage (RGB or gray, plus an alpha mask).
+    Supports 8-bit gray/RGB/gray+alpha/RGBA and 1/2/4/8-bit palette images.
+    Raises StampingError for anything else, including truncated or corrupt files.
+    """
+    try:
+        return _decode_png(data)
+    except MALFORMED_IMAGE_ERRORS as e:
+        raise StampingError(f"Corrupt PNG ({e}).")
+
+
+def _decode_png(data):
+    if not data.startswith(PNG_SIGNATURE):
+        raise StampingError("Not a PNG image.")
+
+    pos = len(PNG_SIGNATURE)
+    header = palette = transparency = None
+    idat = []
+    while pos < len(data):
+        length, chunk_type = struct.unpack(">I4s", data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+        if chunk_type == b"IHDR":
+            header = struct.unpack(">IIBBBBB", body)
+        elif chunk_type == b"PLTE":
+            palette = body
+        elif chunk_type == b"tRNS":
+            transparency = body
+        elif chunk_type == b"IDAT":
+            idat.append(body)
+        elif chunk_type == b"IEND":
+            break
+
+    if header is None:
+        raise StampingError("Corrupt PNG (no IHDR).")
+    width, height, bit_depth, color_type, _, _, interlace = header
+    if interlace:
+        raise StampingError("Interlaced PNGs are not supported.")
+
+    channels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}.get(color_type)
+    if channels is None or (color_type == 3 and bit_depth not in (1, 2, 4, 8)) or (color_type != 3 and bit_depth != 8):
+        raise StampingError(f"Unsupported PNG format (color type {color_type}, {bit_depth}-bit).")
+
+    stride = (width * channels * bit_depth + 7) // 8
+    bpp = max(1, channels * bit_depth // 8)
+    rows = _unfilter(zlib.decompress(b"".join(idat)), width, height, bpp, stride)
+
+    color = bytearray()
+    alpha = bytearray()
+    has_alpha = color_type in (4, 6) or (color_type == 3 and transparency)
+    if color_type == 3:
+        if palette is None:
+            raise StampingError("Corrupt PNG (palette image without PLTE).")
+        palette_alpha = transparency or b""
+        for line in rows:
+            for index in _unpack_bits(line, bit_depth, width):
+                color += palette[index * 3:index * 3 + 3]
+                alpha.append(palette_alpha[index] if index < len(palette_alpha) else 255)
+    elif color_type in (0, 2):
+        for line in rows:
+            color += line
+    else:
+        color_channels = channels - 1
+        for line in rows:
+            for i in range(0, len(line), channels):
+                color += line[i:i + color_channels]
+                alpha.append(line[i + color_channels])
+
+    colorspace = "/DeviceGray" if color_type in (0, 4) else "/DeviceRGB"
+    return DecodedImage(
+        width=width,
+        height=height,
+        colorspace=colorspace,
+        data=zlib.compress(bytes(color)),
+        filter="/FlateDecode",
+        alpha=zlib.compress(bytes(alpha)) if has_alpha else None,
+    )
+
+
+def decode_jpeg(data):
+    """
+    Read a JPEG's dimensions; the compressed data is embedded unchanged with DCTDecode.
+    Raises StampingError for truncated or corrupt headers.
+    """
+    try:
+        return _decode_jpeg(data)
+    except MALFORMED_IMAGE_ERRORS as e:
+        raise StampingError(f"Corrupt JPEG ({e}).")
+
+
+def _decode_jpeg(data):
+    pos = 2
+    while pos < len(data):
+        if data[pos] != 0xFF:
+            raise StampingError("Corrupt JPEG.")
+        marker = data[pos + 1]
+        length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        if marker in (0xC0, 0xC1, 0xC2):
+            height, width = struct.unpack(">HH", data[pos + 5:pos + 9])
+            components = data[pos + 9]
+            if components not in (1, 3):
+                raise StampingError("CMYK JPEGs are not supported.")
+            colorspace = "/DeviceGray" if components == 1 else "/DeviceRGB"
+            return DecodedImage(width, height, colorspace, data, "/DCTDecode")
+        pos += 2 + length
+    raise StampingError("Corrupt JPEG (no frame header).")
+
+
+def _decode_with_pillow(data):
+    if PILImage is None:
+        raise StampingError("Unsupported signature image format (install Pillow for more formats).")
+    try:
+        image = PILImage.open(io.BytesIO(data))
+        image = image.convert("RGBA")
+    except (PILImage.UnidentifiedImageError, OSError, ValueError) as e:
+        raise StampingError(f"Can't read signature image: {e}")
+    rgb = image.convert("RGB").tobytes()
+    alpha = image.getchannel("A").tobytes()
+    return DecodedImage(image.width, image.height, "/DeviceRGB", zlib.compress(rgb), "/FlateDecode", zlib.compress(alpha))
+
+
+def decode_image(data):
+    if data.startswith(PNG_SIGNATURE):
+        try:
+            return decode_png(data)
+        except StampingError:
+            if PILImage is None:
+                raise
+            return _decode_with_pillow(data)
+    if data.startswith(b"\xff\xd8"):
+        return decode_jpeg(data)
+    return _decode_with_pillow(data)
+
+
+@lru_cache(maxsize=DECODED_IMAGE_CACHE_SIZE)
+def _load_image_cached(path, mtime_ns, size):
+    with open(path, "rb") as f:
+        return decode_image(f.read())
+
+
+def load_signature_image(path):
+    """
+    Decoded signature image, cached per process and keyed on the file's identity.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise StampingError("Signature image is missing from storage.")
+    return _load_image_cached(path, stat.st_mtime_ns, stat.st_size)
+
+
+# PDF compositing
+
+def _image_stream(writer, image):
+    stream = StreamObject()
+    stream.update({
+        NameObject("/Type"): NameObject("/XObject"),
+        NameObject("/Subtype"): NameObject("/Image"),
+        NameObject("/Width"): NumberObject(image.width),
+        NameObject("/Height"): NumberObject(image.height),
+        NameObject("/ColorSpace"): NameObject(image.colorspace),
+        NameObject("/BitsPerComponent"): NumberObject(8),
+        NameObject("/Filter"): NameObject(image.filter),
+    })
+    stream._data = image.data
+
+    if image.alpha is not None:
+        mask = StreamObject()
+        mask.update({
+            NameObject("/Type"): NameObject("/XObject"),
+            NameObject("/Subtype"): NameObject("/Image"),
+            NameObject("/Width"): NumberObject(image.width),
+            NameObject("/Height"): NumberObject(image.height),
+            NameObject("/ColorSpace"): NameObject("/DeviceGray"),
+            NameObject("/BitsPerComponent"): NumberObject(8),
+            NameObject("/Filter"): NameObject("/FlateDecode"),
+        })
+        mask._data = image.alpha
+        stream[NameObject("/SMask")] = writer._add_object(mask)
+    return writer._add_object(stream)
+
+
+def _content_stream(writer, data):
+    stream = StreamObject()
+    stream._data = data
+    return writer._add_object(stream)
+
+
+def stamp_pdf(pdf_path, placements):
+    """
+    Draw each Placement onto a copy of the PDF at `pdf_path` and return the new PDF bytes.
+    """
+    if PdfReader is None:
+        raise StampingError("pypdf is not installed.")
+
+    try:
+        writer = PdfWriter(clone_from=PdfReader(pdf_path))
+    except Exception as e:
+        raise StampingError(f"Can't read PDF: {e}")
+
+    page_count = len(writer.pages)
+    image_refs = {}
+    draws_by_page = {}
+    for placement in placements:
+        if not 1 <= placement.page <= page_count:
+            raise StampingError(f"Page {placement.page} is out of range (document has {page_count} pages).")
+        if placement.image_path not in image_refs:
+            image = load_signature_image(placement.image_path)
+            image_refs[placement.image_path] = (f"/SigStamp{len(image_refs)}", _image_stream(writer, image))
+        draws_by_page.setdefault(placement.page, []).append(placement)
+
+    for page_number, page_placements in draws_by_page.items():
+        page = writer.pages[page_number - 1]
+
+        resources = page.get("/Resources")
+        resources = resources.get_object() if resources is not None else DictionaryObject()
+        page[NameObject("/Resources")] = resources
+        xobjects = resources.get("/XObject")
+        xobjects = xobjects.get_object() if xobjects is not None else DictionaryObject()
+        resources[NameObject("/XObject")] = xobjects
+
+        ops = []
+        for placement in page_placements:
+            name, ref = image_refs[placement.image_path]
+            xobjects[NameObject(name)] = ref
+            ops.append(
+                f"q {placement.width:.4f} 0 0 {placement.height:.4f} {placement.x:.4f} {placement.y:.4f} cm {name} Do Q"
+            )
+
+        # Wrap the existing content in q/Q so its graphics state can't leak into the stamps
+        contents = page.get("/Contents")
+        existing = []
+        if contents is not None:
+            contents_obj = contents.get_object()
+            existing = list(contents_obj) if isinstance(contents_obj, ArrayObject) else [contents]
+        page[NameObject("/Contents")] = ArrayObject(
+            [_content_stream(writer, b"q\n")]
+            + existing
+            + [_content_stream(writer, ("\nQ\n" + "\n".join(ops) + "\n").encode())]
+        )
+
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+# Process pool
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_stamping_pool():
+    """
+    Lazily created process pool, or None when SIGNATURE_STAMPING_WORKERS is 0.
+    Workers are spawned (not forked) so they don't inherit DB connections or threads.
+    """
+    global _pool
+    from django.conf import settings
+
+    workers = getattr(settings, "SIGNATURE_STAMPING_WORKERS", 2)
+    if not workers:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+        return _pool
+
+
+def _discard_pool(pool):
+    """
+    Drop a broken pool (a worker died, e.g. OOM-killed) so the next call starts a new one.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def stamp_document(pdf_path, placements, timeout=None):
+    """
+    Run stamp_pdf() in the stamping pool and wait for the result. Raises StampingError,
+    with status 503 if the stamp timed out or the pool broke.
+    """
+    from django.conf import settings
+
+    pool = get_stamping_pool()
+    if pool is None:
+        return stamp_pdf(pdf_path, placements)
+    if timeout is None:
+        timeout = getattr(settings, "SIGNATURE_STAMPING_TIMEOUT", 60)
+    try:
+        future = pool.submit(stamp_pdf, pdf_path, placements)
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        raise StampingError("Stamping timed out; try again later.", status=503)
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise StampingError("Stamping is unavailable; try again later.", status=503)
@@ -1,3 +1,548 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import os
+import struct
+import tempfile
+import zlib
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from Documents.events import EventHub, hub
+from Documents.jobs import PermanentJobError
+from Documents.models import CustomUser, Document
+from . import jobs
+from .models import DocumentSignature, DocumentSignatureStatus, Signature, SignerInboxCounts
+from .serializers import DocumentSignatureSerializer
+from . import stamping
+from .stamping import PNG_SIGNATURE, Placement, StampingError, decode_png, stamp_document, stamp_pdf
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:
+    PdfReader = None
+
+
+def make_png(width, height, color_type, pixel):
+    def chunk(kind, body):
+        return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body) & 0xFFFFFFFF)
+
+    raw = b"".join(b"\x00" + pixel * width for _ in range(height))
+    return (
+        PNG_SIGNATURE
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    )
+
+
+class DecodePngTests(SimpleTestCase):
+    def test_rgba_is_split_into_color_and_alpha(self):
+        image = decode_png(make_png(2, 2, 6, bytes([10, 20, 30, 128])))
+        self.assertEqual((image.width, image.height, image.colorspace), (2, 2, "/DeviceRGB"))
+        self.assertEqual(zlib.decompress(image.data), bytes([10, 20, 30]) * 4)
+        self.assertEqual(zlib.decompress(image.alpha), bytes([128]) * 4)
+
+    def test_rgb_has_no_alpha(self):
+        image = decode_png(make_png(3, 1, 2, bytes([1, 2, 3])))
+        self.assertIsNone(image.alpha)
+
+    def test_rejects_non_png(self):
+        with self.assertRaises(StampingError):
+            decode_png(b"GIF89a")
+
+
+class StampPdfTests(SimpleTestCase):
+    def setUp(self):
+        if PdfReader is None:
+            self.skipTest("pypdf is not installed")
+        self.tmp = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.tmp, "doc.pdf")
+        writer = PdfWriter()
+        writer.add_blank_page(width=612, height=792)
+        writer.add_blank_page(width=612, height=792)
+        writer.write(self.pdf_path)
+        self.png_path = os.path.join(self.tmp, "sig.png")
+        with open(self.png_path, "wb") as f:
+            f.write(make_png(4, 2, 6, bytes([0, 0, 0, 255])))
+
+    def test_stamps_requested_page(self):
+        output = stamp_pdf(self.pdf_path, [Placement(self.png_path, 2, 72, 72, 120, 40)])
+
+        reader = PdfReader(io.BytesIO(output))
+        self.assertNotIn("/XObject", reader.pages[0]["/Resources"])
+        xobjects = reader.pages[1]["/Resources"]["/XObject"]
+        image = xobjects["/SigStamp0"].get_object()
+        self.assertEqual((image["/Width"], image["/Height"]), (4, 2))
+        self.assertIn("/SMask", image)
+        self.assertIn(b"/SigStamp0 Do", reader.pages[1].get_contents().get_data())
+
+    def test_page_out_of_range(self):
+        with self.assertRaises(StampingError):
+            stamp_pdf(self.pdf_path, [Placement(self.png_path, 3, 0, 0, 10, 10)])
+
+    def test_unreadable_or_missing_image(self):
+        with open(self.png_path, "wb") as f:
+            f.write(b"not an image")
+        with self.assertRaises(StampingError):
+            stamp_pdf(self.pdf_path, [Placement(self.png_path, 1, 0, 0, 10, 10)])
+        with self.assertRaises(StampingError):
+            stamp_pdf(self.pdf_path, [Placement(os.path.join(self.tmp, "gone.png"), 1, 0, 0, 10, 10)])
+
+    def test_truncated_or_corrupt_images(self):
+        png = make_png(4, 2, 6, bytes([0, 0, 0, 255]))
+        idat = png.index(b"IDAT")
+        jpeg = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00\xff\xc0\x00\x11\x08"
+        for data in (png[:20], png[:idat + 4] + b"\x00" * 12 + png[idat + 16:], jpeg, jpeg[:4]):
+            with open(self.png_path, "wb") as f:
+                f.write(data)
+            stamping._load_image_cached.cache_clear()
+            with self.assertRaises(StampingError) as ctx:
+                stamp_pdf(self.pdf_path, [Placement(self.png_path, 1, 0, 0, 10, 10)])
+            self.assertEqual(ctx.exception.status, 400)
+
+    @override_settings(SIGNATURE_STAMPING_WORKERS=1)
+    def test_timeout_and_broken_pool_are_503(self):
+        placements = [Placement(self.png_path, 1, 0, 0, 10, 10)]
+        with self.assertRaises(StampingError) as ctx:
+            stamp_document(self.pdf_path, placements, timeout=0.0001)
+        self.assertEqual(ctx.exception.status, 503)
+
+        pool = stamping.get_stamping_pool()
+        self.addCleanup(lambda: stamping._pool and stamping._pool.shutdown())
+        for process in list(pool._processes.values()):
+            process.kill()
+            process.join()
+        with self.assertRaises(StampingError) as ctx:
+            stamp_document(self.pdf_path, placements)
+        self.assertEqual(ctx.exception.status, 503)
+        self.assertIsNot(stamping.get_stamping_pool(), pool)
+        self.assertTrue(stamp_document(self.pdf_path, placements).startswith(b"%PDF"))
+
+
+class SignatureCounterTests(TestCase):
+    def setUp(self):
+        creator = CustomUser.objects.create_user(username="creator", password="x", role="admin")
+        document = Document.objects.create(title="Contract", file="documents/c.pdf", owner=creator)
+        self.signatures = [
+            Signature.objects.create(user=CustomUser.objects.create_user(username=f"signer{i}", password="x"), file=f"signatures/{i}.png")
+            for i in range(2)
+        ]
+        self.doc_sig = DocumentSignature(document=document, creator=creator, draft=False)
+        self.doc_sig.set_initial_counters(2)
+        self.doc_sig.save()
+        for signature in self.signatures:
+            DocumentSignatureStatus.objects.create(document_signature=self.doc_sig, signature=signature)
+
+    def counters(self):
+        self.doc_sig.refresh_from_db()
+        return (self.doc_sig.pending_count, self.doc_sig.approved_count, self.doc_sig.rejected_count, self.doc_sig.fully_approved)
+
+    def test_apply_status_change(self):
+        self.assertIsNone(DocumentSignature.apply_status_change(self.doc_sig.id, "pending", "pending"))
+        DocumentSignature.apply_status_change(self.doc_sig.id, "pending", "approved")
+        self.assertEqual(self.counters(), (1, 1, 0, False))
+        DocumentSignature.apply_status_change(self.doc_sig.id, "pending", "approved")
+        self.assertEqual(self.counters(), (0, 2, 0, True))
+        DocumentSignature.apply_status_change(self.doc_sig.id, "approved", "rejected")
+        self.assertEqual(self.counters(), (0, 1, 1, False))
+
+    def test_a_signer_is_listed_once_per_document(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DocumentSignatureStatus.objects.create(document_signature=self.doc_sig, signature=self.signatures[0])
+        self.assertEqual(DocumentSignatureStatus.objects.filter(document_signature=self.doc_sig).count(), 2)
+
+    def test_repair_command(self):
+        DocumentSignatureStatus.objects.filter(signature=self.signatures[0]).update(status="approved")
+        out = io.StringIO()
+        call_command("repair_signature_counters", "--dry-run", stdout=out)
+        self.assertIn("would repair 1", out.getvalue())
+        self.assertEqual(self.counters(), (2, 0, 0, False))
+
+        call_command("repair_signature_counters", stdout=io.StringIO())
+        self.assertEqual(self.counters(), (1, 1, 0, False))
+
+
+class StampJobTests(TestCase):
+    def setUp(self):
+        creator = CustomUser.objects.create_user(username="creator", password="x", role="admin")
+        document = Document.objects.create(title="Contract", file="documents/c.pdf", owner=creator)
+        self.signature = Signature.objects.create(user=CustomUser.objects.create_user(username="signer", password="x"), file="signatures/s.png")
+        self.doc_sig = DocumentSignature(document=document, creator=creator, draft=True)
+        self.doc_sig.set_initial_counters(1)
+        self.doc_sig.save()
+        self.payload = {
+            "document_signature_id": self.doc_sig.id,
+            "placements": [{"signature_id": self.signature.id, "page": 1, "x": 0, "y": 0, "width": 10, "height": 5}],
+        }
+
+    def test_saves_only_the_edited_file(self):
+        def stamp_while_signer_approves(pdf_path, placements):
+            DocumentSignature.objects.filter(id=self.doc_sig.id).update(draft=False)
+            DocumentSignature.apply_status_change(self.doc_sig.id, "pending", "approved")
+            return b"%PDF-1.4 stamped"
+
+        with tempfile.TemporaryDirectory() as media_root, self.settings(MEDIA_ROOT=media_root), \
+                mock.patch.object(jobs, "stamp_pdf", stamp_while_signer_approves):
+            result = jobs.stamp_document_signature(self.payload)
+
+        self.doc_sig.refresh_from_db()
+        self.assertEqual(self.doc_sig.edited_file.name, result["edited_file"])
+        self.assertEqual((self.doc_sig.draft, self.doc_sig.pending_count, self.doc_sig.approved_count, self.doc_sig.fully_approved), (False, 0, 1, True))
+
+    def test_deleted_signature_fails_permanently(self):
+        self.signature.delete()
+        with self.assertRaises(PermanentJobError):
+            jobs.stamp_document_signature(self.payload)
+
+    def test_unreadable_input_fails_permanently(self):
+        with mock.patch.object(jobs, "stamp_pdf", side_effect=StampingError("Corrupt PNG (truncated).", status=400)):
+            with self.assertRaises(PermanentJobError):
+                jobs.stamp_document_signature(self.payload)
+        with mock.patch.object(jobs, "stamp_pdf", side_effect=struct.error("unpack requires a buffer of 4 bytes")):
+            with self.assertRaises(PermanentJobError):
+                jobs.stamp_document_signature(self.payload)
+
+
+class DocumentSignatureQueryCountTests(TestCase):
+    """
+    The DocumentSignature listings don't issue a query per row.
+    """
+
+    def setUp(self):
+        self.creator = CustomUser.objects.create_user(username="creator", password="x", role="admin")
+        self.signer = CustomUser.objects.create_user(username="signer", password="x", role="signer")
+        self.signature = Signature.objects.create(user=self.signer, file="signatures/s.png")
+        self.client = APIClient()
+        self.client.force_authenticate(self.signer)
+
+    def add_document_signatures(self, count, approved):
+        for i in range(count):
+            document = Document.objects.create(title=f"Document {i}", file=f"documents/{i}.pdf", owner=self.creator)
+            doc_sig = DocumentSignature(document=document, creator=self.creator, edited_file=f"edited/{i}.pdf", draft=False)
+            doc_sig.set_initial_counters(1)
+            doc_sig.save()
+            DocumentSignatureStatus.objects.create(
+                document_signature=doc_sig, signature=self.signature, status="approved" if approved else "pending"
+            )
+            if approved:
+                doc_sig.recompute_counters()
+                doc_sig.save()
+
+    def assertConstantQueries(self, url, approved=False):
+        self.add_document_signatures(2, approved)
+        counts = []
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(ctx.captured_queries))
+            self.assertTrue(response.data)
+            self.add_document_signatures(15, approved)
+        self.assertEqual(counts[0], counts[1])
+
+    def test_signature_files_for_person(self):
+        self.assertConstantQueries(f"/sign/documents/signer/{self.signature.id}/")
+
+    def test_documents_by_approval_status(self):
+        self.assertConstantQueries("/sign/documents/signed/?approved=false")
+
+    def test_user_signed_documents(self):
+        self.assertConstantQueries(f"/sign/signed_documents/{self.creator.id}/", approved=True)
+
+    def test_nested_document_links_its_thumbnail(self):
+        self.add_document_signatures(1, approved=False)
+        response = self.client.get(f"/sign/documents/signer/{self.signature.id}/")
+        document = response.data["document_signatures"][0]["document"]
+        self.assertIn(f"/api/auth/documents/{document['id']}/thumbnail/", document["thumbnail_url"])
+
+    def test_nested_needs_are_prefixed(self):
+        self.assertEqual(DocumentSignatureSerializer.relation_needs(), (["creator", "document"], []))
+
+
+class BatchAssignTests(TestCase):
+    def setUp(self):
+        self.creator = CustomUser.objects.create_user(username="creator", password="x", role="admin")
+        self.signature = Signature.objects.create(user=self.creator, file="signatures/s.png")
+        self.documents = [
+            Document.objects.create(title=f"Document {i}", file=f"documents/{i}.pdf", owner=self.creator) for i in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.creator)
+
+    def assign(self, assignments):
+        return self.client.post("/sign/documents/assign-signature/batch/", {"assignments": assignments}, format="json")
+
+    def item(self, document, signature_ids=None):
+        return {"document_id": document.id, "signature_id": signature_ids or [self.signature.id, self.signature.id]}
+
+    def test_assigns_all_documents(self):
+        response = self.assign([self.item(document) for document in self.documents])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item["signature_ids"] for item in response.data["assignments"]], [[self.signature.id]] * 3)
+        doc_sig = DocumentSignature.objects.get(id=response.data["assignments"][0]["document_signature_id"])
+        self.assertEqual((doc_sig.total_statuses, doc_sig.pending_count, doc_sig.fully_approved), (1, 1, False))
+
+    @override_settings(SIGNATURE_BATCH_MAX_ASSIGNMENTS=2)
+    def test_limits_and_unknown_ids_fail_the_whole_batch(self):
+        response = self.assign([self.item(document) for document in self.documents])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("At most 2 assignments per batch.", str(response.data))
+
+        self.assertEqual(self.assign([]).status_code, 400)
+        response = self.assign([self.item(self.documents[0]), self.item(self.documents[1], [999999])])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Signature IDs not found: [999999]", str(response.data))
+        self.assertFalse(DocumentSignature.objects.exists())
+
+
+class SignerInboxTests(TestCase):
+    def setUp(self):
+        self.creator = CustomUser.objects.create_user(username="creator", password="x", role="admin")
+        self.signer = CustomUser.objects.create_user(username="signer", password="x", role="signer")
+        self.signature = Signature.objects.create(user=self.signer, file="signatures/s.png")
+        self.document = Document.objects.create(title="Contract", file="documents/c.pdf", owner=self.creator)
+        self.client = APIClient()
+
+    def assign(self, draft):
+        self.client.force_authenticate(self.creator)
+        response = self.client.post("/sign/documents/assign-signature/batch/", {"assignments": [
+            {"document_id": self.document.id, "signature_id": [self.signature.id], "status": "draft" if draft else "final"}
+        ]}, format="json")
+        self.assertEqual(response.status_code, 201)
+        return response.data["assignments"][0]["document_signature_id"]
+
+    def inbox(self, state="pending"):
+        self.client.force_authenticate(self.signer)
+        response = self.client.get(f"/sign/inbox/?state={state}")
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_items_follow_assignment_finalize_and_decision(self):
+        sent = self.assign(draft=False)
+        draft = self.assign(draft=True)
+        self.assertEqual([item["document_signature"] for item in self.inbox()["items"]], [sent])
+
+        self.client.force_authenticate(self.creator)
+        self.client.post(f"/sign/documentsignature/{draft}/send/")
+        self.assertEqual([item["document_signature"] for item in self.inbox()["items"]], [draft, sent])
+
+        self.client.force_authenticate(self.signer)
+        self.client.patch(f"/sign/doc/{sent}/approve/")
+        data = self.inbox()
+        self.assertEqual([item["document_signature"] for item in data["items"]], [draft])
+        self.assertEqual(data["counts"], {"pending": 1, "approved": 1, "rejected": 0})
+        self.assertEqual(self.inbox("approved")["items"][0]["document_title"], "Contract")
+
+    def test_counts_are_read_from_the_counter_row(self):
+        sent = self.assign(draft=False)
+        self.assign(draft=False)
+        self.client.force_authenticate(self.signer)
+        self.client.patch(f"/sign/doc/{sent}/reject/")
+        self.assertEqual(SignerInboxCounts.for_signer(self.signer), {"pending": 1, "approved": 0, "rejected": 1})
+
+        with CaptureQueriesContext(connection) as queries:
+            counts = self.inbox()["counts"]
+        self.assertEqual(counts, {"pending": 1, "approved": 0, "rejected": 1})
+        self.assertFalse([q for q in queries if "COUNT(" in q["sql"]])
+
+        SignerInboxCounts.objects.update(pending=7)
+        call_command("rebuild_inbox", stdout=io.StringIO())
+        self.assertEqual(SignerInboxCounts.for_signer(self.signer), {"pending": 1, "approved": 0, "rejected": 1})
+
+
+class BulkDecisionTests(TestCase):
+    def setUp(self):
+        self.creator = CustomUser.objects.create_user(username="creator", password="x", role="admin")
+        self.signer = CustomUser.objects.create_user(username="signer", password="x", role="signer")
+        self.other = CustomUser.objects.create_user(username="other", password="x", role="signer")
+        self.signature = Signature.objects.create(user=self.signer, file="signatures/s.png")
+        self.other_signature = Signature.objects.create(user=self.other, file="signatures/o.png")
+        self.document = Document.objects.create(title="Contract", file="documents/c.pdf", owner=self.creator)
+        self.client = APIClient()
+        self.client.force_authenticate(self.signer)
+
+    def document_signature(self, *signatures):
+        doc_sig = DocumentSignature(document=self.document, creator=self.creator)
+        doc_sig.set_initial_counters(len(signatures))
+        doc_sig.save()
+        for signature in signatures:
+            DocumentSignatureStatus.objects.create(document_signature=doc_sig, signature=signature)
+        return doc_sig
+
+    def test_outcomes_and_counters(self):
+        solo = self.document_signature(self.signature)
+        shared = self.document_signature(self.signature, self.other_signature)
+        decided = self.document_signature(self.signature)
+        self.client.patch(f"/sign/doc/{decided.id}/reject/")
+        not_mine = self.document_signature(self.other_signature)
+
+        response = self.client.post("/sign/doc/bulk/approve/", {
+            "document_signature_ids": [solo.id, shared.id, decided.id, not_mine.id, 999999]
+        }, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["updated"], 2)
+        self.assertEqual(
+            [item["outcome"] for item in response.data["results"]],
+            ["approved", "approved", "already_decided", "not_found", "not_found"],
+        )
+
+        solo.refresh_from_db()
+        shared.refresh_from_db()
+        self.assertEqual((solo.approved_count, solo.pending_count, solo.fully_approved), (1, 0, True))
+        self.assertEqual((shared.approved_count, shared.pending_count, shared.fully_approved), (1, 1, False))
+        self.assertEqual(
+            DocumentSignatureStatus.objects.get(document_signature=decided).status, "rejected"
+        )
+
+
+class EventHubTests(SimpleTestCase):
+    async def test_audience_and_resync_on_overflow(self):
+        hub = EventHub()
+        signer = hub.subscribe(user_id=1)
+        other = hub.subscribe(user_id=2, overview=False)
+        with self.settings(EVENTS_QUEUE_SIZE=2):
+            slow = hub.subscribe(user_id=1)
+
+        hub.publish({"type": "status_changed", "document_signature_id": 7}, audience={1})
+        hub.publish({"type": "overview", "total_users": 3})
+        await asyncio.sleep(0)
+        self.assertEqual([signer.queue.get_nowait()["type"] for _ in range(2)], ["status_changed", "overview"])
+        self.assertTrue(other.queue.empty())
+
+        hub.publish({"type": "overview", "total_users": 4})
+        await asyncio.sleep(0)
+        self.assertEqual(slow.queue.qsize(), 1)
+        self.assertEqual(slow.queue.get_nowait()["type"], "resync")
+
+    async def test_following_a_document_signature_keeps_the_audience(self):
+        hub = EventHub()
+        signer = hub.subscribe(user_id=1, document_signature_id=7, overview=False)
+        outsider = hub.subscribe(user_id=2, document_signature_id=7, overview=False)
+
+        hub.publish({"type": "status_changed", "document_signature_id": 7}, audience={1})
+        hub.publish({"type": "status_changed", "document_signature_id": 8}, audience={1, 2})
+        await asyncio.sleep(0)
+        self.assertEqual(signer.queue.qsize(), 1)
+        self.assertEqual(signer.queue.get_nowait()["document_signature_id"], 7)
+        self.assertTrue(outsider.queue.empty())
+
+
+class EventStreamTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username="signer", password="x", role="signer")
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+
+    async def test_stream_delivers_events_for_the_user(self):
+        response = await self.async_client.get("/sign/events/", {"token": self.token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        chunks = aiter(response.streaming_content)
+        self.assertTrue((await anext(chunks)).startswith(b"retry:"))
+
+        hub.publish({"type": "status_changed", "document_signature_id": 5}, audience={self.user.id})
+        chunk = await asyncio.wait_for(anext(chunks), 5)
+        self.assertIn(b"event: status_changed", chunk)
+        await chunks.aclose()
+
+    async def test_requires_token(self):
+        response = await self.async_client.get("/sign/events/")
+        self.assertEqual(response.status_code, 401)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        self.creator = CustomUser.objects.create_user(username="creator", password="x", role="admin")
+        self.signer = CustomUser.objects.create_user(username="signer", password="x", role="signer")
+        self.signature = Signature.objects.create(user=self.signer, file="signatures/s.png")
+        self.document = Document.objects.create(title="Contract", file="documents/c.pdf", owner=self.creator)
+        self.doc_sig = DocumentSignature.objects.create(document=self.document, creator=self.creator)
+        DocumentSignatureStatus.objects.create(document_signature=self.doc_sig, signature=self.signature)
+        self.doc_sig.recompute_counters()
+        self.doc_sig.save()
+        self.auth = {"headers": {"Authorization": f"Bearer {RefreshToken.for_user(self.signer).access_token}"}}
+
+    def test_async_views_match_sync_views(self):
+        client = APIClient()
+        client.force_authenticate(self.signer)
+        for sync_url, async_url in [
+            (f"/sign/doc-signature/{self.doc_sig.id}/status/", f"/sign/async/doc-signature/{self.doc_sig.id}/status/"),
+            ("/sign/documents/signed/?approved=false", "/sign/async/documents/signed/?approved=false"),
+        ]:
+            response = self.client.get(async_url, **self.auth)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), client.get(sync_url).json())
+
+        response = self.client.get("/api/auth/async/overview/", **self.auth)
+        self.assertEqual(response.json()["pending_documents"], 1)
+
+    def test_async_views_require_authentication(self):
+        self.assertEqual(self.client.get("/api/auth/async/overview/").status_code, 401)
+        self.assertEqual(self.client.get("/sign/async/doc-signature/999/status/", **self.auth).status_code, 404)
+
+    async def test_upload_signature_async(self):
+        with tempfile.TemporaryDirectory() as media_root, self.settings(MEDIA_ROOT=media_root):
+            upload = io.BytesIO(make_png(2, 2, 0, b"\x00"))
+            upload.name = "mine.png"
+            response = await self.async_client.post("/sign/async/", {"file": upload}, **self.auth)
+            self.assertEqual(response.status_code, 201)
+            signature = await Signature.objects.aget(user=self.signer)
+            self.assertEqual(signature.id, self.signature.id)
+            self.assertEqual(response.json()["signature_id"], signature.id)
+            self.assertTrue(os.path.exists(os.path.join(media_root, signature.file.name)))
+
+
+class SigningHistoryExportTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user(username="admin", password="x", role="admin")
+        document = Document.objects.create(title="Contract, final", file="documents/c.pdf", owner=self.admin)
+        doc_sig = DocumentSignature.objects.create(document=document, creator=self.admin)
+        for i, status in enumerate(["pending", "approved", "rejected"]):
+            signer = CustomUser.objects.create_user(username=f"signer{i}", password="x", role="signer")
+            signature = Signature.objects.create(user=signer, file=f"signatures/{i}.png")
+            DocumentSignatureStatus.objects.create(document_signature=doc_sig, signature=signature, status=status)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def export(self, query=""):
+        response = self.client.get(f"/sign/export/{query}")
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def test_ndjson_export_with_status_filter(self):
+        rows = [json.loads(line) for line in self.export().splitlines()]
+        self.assertEqual([row["status"] for row in rows], ["pending", "approved", "rejected"])
+        self.assertEqual(rows[0]["document_title"], "Contract, final")
+        self.assertEqual(rows[0]["creator_username"], "admin")
+
+        rows = self.export("?status=approved").splitlines()
+        self.assertEqual([json.loads(line)["signer_username"] for line in rows], ["signer1"])
+
+    def test_csv_export_and_date_filters(self):
+        rows = list(csv.DictReader(io.StringIO(self.export("?type=csv"))))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]["document_title"], "Contract, final")
+
+        today = timezone.now().date()
+        self.assertEqual(len(self.export(f"?until={today}").splitlines()), 3)
+        self.assertEqual(self.export(f"?since={today + timedelta(days=1)}"), "")
+
+    def test_rejects_bad_filters_and_non_admins(self):
+        self.assertEqual(self.client.get("/sign/export/?since=yesterday").status_code, 400)
+        self.assertEqual(self.client.get("/sign/export/?type=xml").status_code, 400)
+        self.client.force_authenticate(CustomUser.objects.get(username="signer0"))
+        self.assertEqual(self.client.get("/sign/export/").status_code, 403)
+
+    def test_management_command(self):
+        out = io.StringIO()
+        call_command("export_signing_history", "--type", "csv", "--status", "pending", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
@@ -3,19 +3,35 @@ from .views import *
 
 urlpatterns = [
     path('', upload_signature, name='signature-upload'),  # POST
+    path('async/', upload_signature_async, name='signature-upload-async'),  # POST (ASGI)
     path('list/', UserSignatureListView.as_view(), name='user-signature-list'),  # GET
+    path('<int:signature_id>/download/', download_signature, name='signature-download'),  # GET
+    path('<int:signature_id>/thumbnail/', signature_thumbnail, name='signature-thumbnail'),  # GET, ?size=
     path('documents/<int:pk>/assign-signature/', assign_multiple_signatures, name='assign-signature'),
+    path('documents/assign-signature/batch/', assign_signatures_batch, name='assign-signature-batch'),
+    path('documents/<int:pk>/stamp/', stamp_signatures, name='stamp-signatures'),
     path("documentsignature/<int:doc_sig_id>/send/", mark_document_signature_final, name="mark-docsig-final"),
 
     path("signed_documents/<int:user_id>/", user_signed_documents, name="document-list"),
 
     path("documents/signer/<int:signature_id>/", signature_files_for_person, name="documents-for-signer"),
 
+    path("inbox/", signer_inbox, name="signer-inbox"),  # GET
+    path("events/", document_signature_events, name="document-signature-events"),  # GET, text/event-stream (ASGI)
+
+    path("doc/bulk/<str:action>/", bulk_document_sign_status, name="docsig-status-bulk"),  # POST
     path("doc/<int:doc_sig_status_id>/<str:action>/",document_sign_status, name="docsig-status"),
 
     path("doc-signature/<int:doc_sig_id>/status/", document_signature_status, name="document-signature-status"),
+    path("doc-signature/<int:doc_sig_id>/download/", download_edited_file, name="document-signature-download"),
+    path("doc-signature/<int:doc_sig_id>/thumbnail/", document_signature_thumbnail, name="document-signature-thumbnail"),  # GET, ?size=
 
     path("documents/signed/", documents_by_approval_status, name="signed_documents"),
+    path("export/", export_signing_history, name="signing-history-export"),  # GET, NDJSON or CSV (?type=csv)
+
+    # Async variants of the I/O-bound endpoints above, for the ASGI application
+    path("async/doc-signature/<int:doc_sig_id>/status/", document_signature_status_async, name="document-signature-status-async"),
+    path("async/documents/signed/", documents_by_approval_status_async, name="signed_documents_async"),
 
 
 ]
@@ -2,14 +2,41 @@ from rest_framework import generics, permissions, status
 from Documents.models import Document
 from .serializers import *
 from .models import *
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.renderers import JSONRenderer
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status as drf_status
-from django.db.models import Count, Q, F
+from django.db.models import Count, Q, F, Max
 from django.shortcuts import get_object_or_404
-from rest_framework import status
-
+from django.db import transaction
+from django.utils import timezone
+from .stamping import Placement, StampingError, stamp_document
+from django.core.files.base import ContentFile
+import os
+from Documents.jobs import enqueue
+from django.urls import reverse
+from Documents.downloads import PassthroughRenderer, serve_file
+from Documents.thumbnails import ThumbnailError, thumbnail_response, thumbnail_url
+from Documents.overview import adjust_overview_counts
+from Documents.pagination import KeysetPagination
+from Documents.conditional import conditional, latest_change
+from Documents import object_cache
+from .events import publish_document_signature_events
+from .export import EXPORT_TYPES, ExportError, export_lines, export_queryset
+from Documents.events import format_sse, hub
+from Documents.async_api import async_api_view, authenticate, json_response
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+import asyncio
+from django.utils.decorators import method_decorator
+from Signmagics.replicas import read_replica
+
+
+# DocumentSignature.created_at is nullable, which doesn't work as a keyset column;
+# ids follow insertion order so they give the same newest-first ordering.
+DOCUMENT_SIGNATURE_ORDERING = ("-id",)
 
 
 # Upload a signature (POST)
@@ -43,13 +70,71 @@ def upload_signature(request):
         return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
+@async_api_view(["POST"])
+async def upload_signature_async(request):
+    """
+    upload_signature() as an async view: the file is hashed and written to storage on a
+    worker thread while the event loop keeps serving other requests.
+    """
+    if request.user.role != "signer":
+        return json_response({"detail": "Only users with role 'signer' can upload signatures."},
+                             status=status.HTTP_403_FORBIDDEN)
+
+    serializer = SignatureSerializer(data={"file": request.FILES.get("file")})
+    if not serializer.is_valid():
+        return json_response({"detail": str(serializer.errors)}, status=status.HTTP_400_BAD_REQUEST)
+    upload = serializer.validated_data["file"]
+
+    signature = await Signature.objects.filter(user=request.user).afirst() or Signature(user=request.user)
+    field = Signature._meta.get_field("file")
+    name = field.generate_filename(signature, upload.name)
+    signature.file = await field.storage.asave_blob(name, upload)
+    await signature.asave()
+
+    return json_response({
+        "detail": "Signature uploaded successfully",
+        "signature_id": signature.id,
+        "signature_file_url": request.build_absolute_uri(signature.file.url)
+    }, status=status.HTTP_201_CREATED)
+
+
 # List all signatures 
 class UserSignatureListView(generics.ListAPIView):
     serializer_class = SignatureSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    pagination_class = KeysetPagination
+
+    @method_decorator(conditional(lambda request: latest_change(Signature.objects.all()), per_page=True))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self):
-        return Signature.objects.all().order_by('-created_at')
+        return Signature.objects.all().order_by('-created_at', '-id')
+
+
+def _create_document_signature(document, creator, signatures, is_draft, edited_file):
+    """
+    Create one DocumentSignature (counters preset) and its pending statuses in one batch.
+    """
+    with transaction.atomic():
+        doc_sig_obj = DocumentSignature(
+            document=document,
+            creator=creator,
+            edited_file=edited_file,
+            draft=is_draft
+        )
+        doc_sig_obj.set_initial_counters(len(signatures))
+        doc_sig_obj.save()
+
+        status_objs = DocumentSignatureStatus.objects.bulk_create([
+            DocumentSignatureStatus(document_signature=doc_sig_obj, signature=signature, status="pending")
+            for signature in signatures
+        ])
+        if not is_draft:
+            SignerWorkItem.open_for(status_objs)
+        publish_document_signature_events([doc_sig_obj.id], "assigned")
+    return doc_sig_obj, status_objs
 
 
 @api_view(["POST"])
@@ -60,51 +145,31 @@ def assign_multiple_signatures(request, pk):
     and store the edited file (single DocumentSignature)
     """
     # Get document
-    try:
-        document = Document.objects.get(id=pk)
-    except Document.DoesNotExist:
+    document = object_cache.get(Document, pk)
+    if document is None:
         return Response({"detail": "Document not found"}, status=drf_status.HTTP_404_NOT_FOUND)
 
     # Validate input
     serializer = AssignMultipleSignaturesSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
 
-    signature_ids = serializer.validated_data['signature_id']
+    signatures = serializer.validated_data['signatures']
     edited_file = serializer.validated_data['file']
     status_flag = serializer.validated_data.get('status', None)  # None if not provided
 
     # Determine draft based on status
     is_draft = True if status_flag and status_flag.lower() == "draft" else False
 
-    # Create one DocumentSignature for the edited file
-    doc_sig_obj = DocumentSignature.objects.create(
-        document=document,
-        creator=request.user,
-        edited_file=edited_file,
-        draft=is_draft
-    )
-
-    assigned_statuses = []
-
-    
-    for sig_id in signature_ids:
-        try:
-            signature = Signature.objects.get(id=sig_id)
-        except Signature.DoesNotExist:
-            return Response({"detail": f"Signature ID {sig_id} not found"}, status=drf_status.HTTP_404_NOT_FOUND)
-
-            # Create a status row for each signature
-        status_obj = DocumentSignatureStatus.objects.create(
-            document_signature=doc_sig_obj,
-            signature=signature,
-            status="pending"
-        )
+    doc_sig_obj, status_objs = _create_document_signature(document, request.user, signatures, is_draft, edited_file)
 
-        assigned_statuses.append({
-            "signature_id": signature.id,
-            "signature_file_url": request.build_absolute_uri(signature.file.url) if signature.file else None,
+    assigned_statuses = [
+        {
+            "signature_id": status_obj.signature.id,
+            "signature_file_url": request.build_absolute_uri(status_obj.signature.file.url) if status_obj.signature.file else None,
             "status": status_obj.status
-        })
+        }
+        for status_obj in status_objs
+    ]
 
     return Response({
         "detail": "Signatures assigned successfully",
@@ -118,6 +183,128 @@ def assign_multiple_signatures(request, pk):
 
 
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def stamp_signatures(request, pk):
+    """
+    Stamp signature images onto the document on the server and assign the signers,
+    instead of uploading an edited file.
+    Body: {"signature_id": [3, 4], "placements": [{"signature_id": 3, "page": 1, "x": 72, "y": 72,
+           "width": 120, "height": 40}, ...], "status": "draft"}
+
+    With ?background=1 the DocumentSignature is created right away and the edited file is
+    rendered by a background job; the response is 202 with the job to poll.
+    """
+    document = get_object_or_404(Document, id=pk)
+
+    serializer = StampSignaturesSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+
+    signatures = serializer.validated_data['signatures']
+    status_flag = serializer.validated_data.get('status', None)
+    is_draft = True if status_flag and status_flag.lower() == "draft" else False
+
+    if request.query_params.get("background") in ("1", "true"):
+        with transaction.atomic():
+            doc_sig_obj, _ = _create_document_signature(document, request.user, signatures, is_draft, None)
+            job = enqueue("stamp_document_signature", {
+                "document_signature_id": doc_sig_obj.id,
+                "placements": serializer.validated_data['placements'],
+            }, created_by=request.user)
+        return Response({
+            "detail": "Stamping queued",
+            "document_id": document.id,
+            "document_signature_id": doc_sig_obj.id,
+            "job_id": job.id,
+            "job_url": request.build_absolute_uri(reverse("job-status", args=[job.id]))
+        }, status=drf_status.HTTP_202_ACCEPTED)
+
+    by_id = {signature.id: signature for signature in signatures}
+    placements = [
+        Placement(
+            image_path=by_id[p['signature_id']].file.path,
+            page=p['page'], x=p['x'], y=p['y'], width=p['width'], height=p['height']
+        )
+        for p in serializer.validated_data['placements']
+    ]
+
+    try:
+        stamped = stamp_document(document.file.path, placements)
+    except StampingError as e:
+        return Response({"detail": str(e)}, status=e.status)
+
+    base_name = os.path.splitext(os.path.basename(document.file.name))[0]
+    edited_file = ContentFile(stamped, name=f"{base_name}_signed.pdf")
+    doc_sig_obj, status_objs = _create_document_signature(document, request.user, signatures, is_draft, edited_file)
+
+    return Response({
+        "detail": "Signatures stamped and assigned successfully",
+        "document_id": document.id,
+        "document_signature_id": doc_sig_obj.id,
+        "signer_id": doc_sig_obj.creator.id,
+        "edited_file_url": request.build_absolute_uri(doc_sig_obj.edited_file.url),
+        "assigned_signatures": [
+            {"signature_id": status_obj.signature.id, "status": status_obj.status}
+            for status_obj in status_objs
+        ]
+    }, status=drf_status.HTTP_201_CREATED)
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def assign_signatures_batch(request):
+    """
+    Assign signer sets to many documents in one call (no edited files), e.g. for routing jobs.
+    Body: {"assignments": [{"document_id": 1, "signature_id": [3, 4], "status": "draft"}, ...]}
+    Everything is created in one transaction with two bulk inserts.
+    """
+    serializer = BatchAssignSignaturesSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    assignments = serializer.validated_data['assignments']
+
+    doc_sig_objs = []
+    for item in assignments:
+        status_flag = item.get('status')
+        doc_sig_obj = DocumentSignature(
+            document=item['document'],
+            creator=request.user,
+            draft=True if status_flag and status_flag.lower() == "draft" else False
+        )
+        doc_sig_obj.set_initial_counters(len(item['signatures']))
+        doc_sig_objs.append(doc_sig_obj)
+
+    with transaction.atomic():
+        DocumentSignature.objects.bulk_create(doc_sig_objs)
+        status_objs = DocumentSignatureStatus.objects.bulk_create([
+            DocumentSignatureStatus(document_signature=doc_sig_obj, signature=signature, status="pending")
+            for doc_sig_obj, item in zip(doc_sig_objs, assignments)
+            for signature in item['signatures']
+        ])
+        SignerWorkItem.open_for([
+            status_obj for status_obj in status_objs if not status_obj.document_signature.draft
+        ])
+        publish_document_signature_events([doc_sig_obj.id for doc_sig_obj in doc_sig_objs], "assigned")
+
+        # bulk_create skips post_save, so update the overview counters here
+        new_pending = sum(1 for doc_sig_obj in doc_sig_objs if not doc_sig_obj.draft)
+        transaction.on_commit(lambda: adjust_overview_counts(pending_documents=new_pending))
+
+    return Response({
+        "detail": "Signatures assigned successfully",
+        "assignments": [
+            {
+                "document_id": doc_sig_obj.document_id,
+                "document_signature_id": doc_sig_obj.id,
+                "draft": doc_sig_obj.draft,
+                "signature_ids": [signature.id for signature in item['signatures']]
+            }
+            for doc_sig_obj, item in zip(doc_sig_objs, assignments)
+        ]
+    }, status=drf_status.HTTP_201_CREATED)
+
+
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def mark_document_signature_final(request, doc_sig_id):
@@ -139,8 +326,12 @@ def mark_document_signature_final(request, doc_sig_id):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    doc_sig.draft = False
-    doc_sig.save()
+    with transaction.atomic():
+        doc_sig.draft = False
+        doc_sig.save()
+        # The signers see it in their inbox from now on
+        SignerWorkItem.open_for(doc_sig.signature_statuses.select_related("signature"))
+        publish_document_signature_events([doc_sig.id], "finalized")
 
     return Response({
         "detail": "DocumentSignature marked as final.",
@@ -153,28 +344,40 @@ def mark_document_signature_final(request, doc_sig_id):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@read_replica
+@conditional(lambda request, user_id: latest_change(
+    DocumentSignature.objects.filter(creator_id=user_id, draft=False, fully_approved=True)
+), per_page=True)
 def user_signed_documents(request, user_id):
     user = get_object_or_404(CustomUser, id=user_id)
 
-    signed_docs = (
-        DocumentSignature.objects.filter(creator=user, draft=False)
-        .annotate(
-            total_statuses=Count("signature_statuses"),
-            approved_statuses=Count("signature_statuses", filter=Q(signature_statuses__status="approved")),
-        )
-        .filter(total_statuses=F("approved_statuses"))  # Only if all are approved
-        .values("id", "document_id", "edited_file", "created_at")
-    )
+    signed_docs = DocumentSignature.objects.filter(creator=user, draft=False, fully_approved=True)  # Only if all are approved
+
+    paginator = KeysetPagination(ordering=DOCUMENT_SIGNATURE_ORDERING)
+    page = paginator.paginate_queryset(signed_docs, request)
 
     return Response({
         "status": "success",
-        "signed_documents": list(signed_docs)
-    })
+        "signed_documents": [
+            {
+                "id": doc.id,
+                "document_id": doc.document_id,
+                "edited_file": doc.edited_file.name,
+                "created_at": doc.created_at,
+            }
+            for doc in page
+        ],
+        **paginator.get_page_info()
+    }, headers=paginator.get_headers())
 
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional(lambda request, signature_id: latest_change(
+    DocumentSignature.objects.filter(signature_statuses__signature=signature_id, draft=False),
+    "updated_at", "document__updated_at",
+), per_page=True)
 def signature_files_for_person(request, signature_id):
     """
     Fetch all DocumentSignature entries where:
@@ -186,22 +389,61 @@ def signature_files_for_person(request, signature_id):
     except Signature.DoesNotExist:
         return Response({"detail": "Signature not found"}, status=404)
 
-    # Fetch all DocumentSignatureStatus entries for this signature
-    doc_statuses = DocumentSignatureStatus.objects.filter(
-        signature=signature,
-        document_signature__draft=False
-    ).select_related("document_signature", "document_signature__document")
+    # DocumentSignatures that have a status for this signature and are not drafts
+    doc_signatures = DocumentSignatureSerializer.optimize_queryset(DocumentSignature.objects.filter(
+        signature_statuses__signature=signature,
+        draft=False
+    )).distinct()
 
-    # Collect unique DocumentSignature entries
-    doc_signatures = {ds.document_signature for ds in doc_statuses}
+    paginator = KeysetPagination(ordering=DOCUMENT_SIGNATURE_ORDERING)
+    page = paginator.paginate_queryset(doc_signatures, request)
 
     # Serialize
-    serializer = DocumentSignatureSerializer(doc_signatures, many=True, context={"request": request})
+    serializer = DocumentSignatureSerializer(page, many=True, context={"request": request})
+
+    return Response({
+        "status": "success",
+        "document_signatures": serializer.data,
+        **paginator.get_page_info()
+    }, headers=paginator.get_headers())
+
+
+
+def _inbox_validators(request):
+    # The counter row changes whenever an item is added or decided, so it stands in for the items
+    row = SignerInboxCounts.objects.filter(signer=request.user).values_list("updated_at", *SignerInboxCounts.STATES).first()
+    return row or (None,)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@conditional(_inbox_validators, per_page=True)
+def signer_inbox(request):
+    """
+    The current user's work items from sent DocumentSignatures, newest first.
+    Query param: ?state=pending (default), approved, rejected or all.
+    Counts per state are included with every page.
+    """
+    state = request.query_params.get("state", "pending").lower()
+    if state not in ("pending", "approved", "rejected", "all"):
+        return Response({"detail": "state must be pending, approved, rejected or all."}, status=status.HTTP_400_BAD_REQUEST)
+
+    items = SignerWorkItem.objects.filter(signer=request.user)
+    counts = SignerInboxCounts.for_signer(request.user)
+    if state != "all":
+        items = items.filter(state=state)
+
+    paginator = KeysetPagination(ordering=("-id",))
+    page = paginator.paginate_queryset(SignerWorkItemSerializer.optimize_queryset(items), request)
+    serializer = SignerWorkItemSerializer(page, many=True, context={"request": request})
 
     return Response({
         "status": "success",
-        "document_signatures": serializer.data
-    })
+        "state": state,
+        "counts": counts,
+        "items": serializer.data,
+        **paginator.get_page_info()
+    }, headers=paginator.get_headers())
 
 
 
@@ -216,29 +458,125 @@ def document_sign_status(request, doc_sig_status_id, action):
     if action not in ["approve", "reject"]:
         return Response({"detail": "Invalid action. Must be 'approve' or 'reject'."}, status=status.HTTP_400_BAD_REQUEST)
 
-    try:
-        doc_status = DocumentSignatureStatus.objects.get(
-            document_signature=doc_sig_status_id,
-            signature__user = request.user
-            )
-    except DocumentSignatureStatus.DoesNotExist:
-        return Response({"detail": "Not found or unauthorized."}, status=status.HTTP_404_NOT_FOUND)
-
-    # Update status
-    doc_status.status = "approved" if action == "approve" else "rejected"
-    doc_status.save()
+    with transaction.atomic():
+        try:
+            doc_status = DocumentSignatureStatus.objects.select_for_update().get(
+                document_signature=doc_sig_status_id,
+                signature__user = request.user
+                )
+        except DocumentSignatureStatus.DoesNotExist:
+            return Response({"detail": "Not found or unauthorized."}, status=status.HTTP_404_NOT_FOUND)
+
+        # Update status and the parent's counters in the same transaction
+        old_status = doc_status.status
+        doc_status.status = "approved" if action == "approve" else "rejected"
+        doc_status.save()
+        DocumentSignature.apply_status_change(doc_status.document_signature_id, old_status, doc_status.status)
+        SignerWorkItem.record_decision([doc_status.id], doc_status.status)
+        publish_document_signature_events(
+            [doc_status.document_signature_id], "status_changed",
+            status_id=doc_status.id, signer_id=request.user.id, status=doc_status.status,
+        )
 
     return Response({
         "detail": f"Signature status updated to {doc_status.status}.",
         "document_signature_status_id": doc_status.id,
-        "document_signature_id": doc_status.document_signature.id,
-        "signature_id": doc_status.signature.id
+        "document_signature_id": doc_status.document_signature_id,
+        "signature_id": doc_status.signature_id
+    }, status=status.HTTP_200_OK)
+
+
+
+def _overview_totals(doc_sig_ids):
+    """
+    (fully signed, pending) sent documents among `doc_sig_ids`, as counted by the overview.
+    """
+    rows = DocumentSignature.objects.filter(id__in=doc_sig_ids, draft=False).values_list("fully_approved", "pending_count")
+    return (sum(1 for fully, _ in rows if fully), sum(1 for _, pending in rows if pending > 0))
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def bulk_document_sign_status(request, action):
+    """
+    Approve or reject the current user's pending statuses on many DocumentSignatures at once.
+    Body: {"document_signature_ids": [1, 2, 3]}
+    Returns one outcome per id: approved/rejected, not_found or already_decided.
+    """
+    if action not in ["approve", "reject"]:
+        return Response({"detail": "Invalid action. Must be 'approve' or 'reject'."}, status=status.HTTP_400_BAD_REQUEST)
+    new_status = "approved" if action == "approve" else "rejected"
+
+    serializer = BulkDecisionSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    doc_sig_ids = serializer.validated_data['document_signature_ids']
+
+    with transaction.atomic():
+        mine = DocumentSignatureStatus.objects.filter(document_signature_id__in=doc_sig_ids, signature__user=request.user)
+        rows = list(mine.select_for_update().values_list("id", "document_signature_id", "status"))
+        pending = [(status_id, doc_sig_id) for status_id, doc_sig_id, current in rows if current == "pending"]
+
+        if pending:
+            affected = {doc_sig_id for _, doc_sig_id in pending}
+            before = _overview_totals(affected)
+
+            mine.filter(status="pending").update(status=new_status, updated_at=timezone.now())
+
+            decided = {}
+            for _, doc_sig_id in pending:
+                decided[doc_sig_id] = decided.get(doc_sig_id, 0) + 1
+            DocumentSignature.apply_pending_decisions(decided, new_status)
+            SignerWorkItem.record_decision([status_id for status_id, _ in pending], new_status)
+            publish_document_signature_events(affected, "status_changed", signer_id=request.user.id, status=new_status)
+
+            # Queryset updates skip the post_save signals that keep the overview counts current
+            after = _overview_totals(affected)
+            transaction.on_commit(lambda: adjust_overview_counts(
+                fully_signed_documents=after[0] - before[0],
+                pending_documents=after[1] - before[1],
+            ))
+
+    by_doc_sig = {}
+    for status_id, doc_sig_id, current in rows:
+        by_doc_sig.setdefault(doc_sig_id, []).append((status_id, current))
+
+    results = []
+    for doc_sig_id in doc_sig_ids:
+        statuses = by_doc_sig.get(doc_sig_id)
+        if not statuses:
+            results.append({"document_signature_id": doc_sig_id, "outcome": "not_found"})
+            continue
+        for status_id, current in statuses:
+            results.append({
+                "document_signature_id": doc_sig_id,
+                "document_signature_status_id": status_id,
+                "outcome": new_status if current == "pending" else "already_decided",
+                "status": new_status if current == "pending" else current,
+            })
+
+    return Response({
+        "detail": f"{len(pending)} signature statuses updated to {new_status}.",
+        "updated": len(pending),
+        "results": results
     }, status=status.HTTP_200_OK)
 
 
 
+def _status_validators(request, doc_sig_id):
+    """
+    Last change to a DocumentSignature or any of its statuses, and the number of statuses.
+    """
+    row = DocumentSignature.objects.filter(id=doc_sig_id).aggregate(
+        updated_at=Max("updated_at"), last_status=Max("signature_statuses__updated_at"), n=Count("signature_statuses")
+    )
+    if row["updated_at"] is None:
+        return None
+    return max(row["updated_at"], row["last_status"] or row["updated_at"]), row["n"]
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional(_status_validators)
 def document_signature_status(request, doc_sig_id):
     """
     Fetch all signature statuses for a single DocumentSignature
@@ -251,64 +589,236 @@ def document_signature_status(request, doc_sig_id):
     # Fetch all statuses related to this DocumentSignature
     statuses = DocumentSignatureStatus.objects.filter(document_signature=doc_sig).select_related("signature", "signature__user")
 
-    # Prepare response
-    response_data = []
-    for s in statuses:
-        response_data.append({
-            "status_id": s.id,
-            "signature_id": s.signature.id,
-            "signer_id": s.signature.user.id,
-            "signer_name": s.signature.user.username,
-            "status": s.status,
-            "updated_at": s.updated_at
-        })
+    return Response(_signature_status_body(request, doc_sig, [_status_row(s) for s in statuses]))
 
-    return Response({
+
+@async_api_view(["GET"])
+async def document_signature_status_async(request, doc_sig_id):
+    """
+    document_signature_status() as an async view, for the ASGI application.
+    """
+    doc_sig = await DocumentSignature.objects.filter(id=doc_sig_id).afirst()
+    if doc_sig is None:
+        return json_response({"detail": "DocumentSignature not found."}, status=404)
+
+    statuses = DocumentSignatureStatus.objects.filter(document_signature=doc_sig).select_related("signature", "signature__user")
+    return json_response(_signature_status_body(request, doc_sig, [_status_row(s) async for s in statuses]))
+
+
+def _status_row(s):
+    return {
+        "status_id": s.id,
+        "signature_id": s.signature.id,
+        "signer_id": s.signature.user.id,
+        "signer_name": s.signature.user.username,
+        "status": s.status,
+        "updated_at": s.updated_at
+    }
+
+
+def _signature_status_body(request, doc_sig, statuses):
+    return {
         "document_signature_id": doc_sig.id,
         "edited_file_url": request.build_absolute_uri(doc_sig.edited_file.url) if doc_sig.edited_file else None,
         "draft": doc_sig.draft,
-        "statuses": response_data
-    })
+        "statuses": statuses
+    }
+
+
 
 
+def _approved_flag(request):
+    approved_param = getattr(request, "query_params", request.GET).get("approved", "true").lower()
+    return True if approved_param == "true" else False
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@read_replica
+@conditional(lambda request: latest_change(
+    DocumentSignature.objects.filter(draft=False, fully_approved=_approved_flag(request))
+), per_page=True)
 def documents_by_approval_status(request):
     """
     Fetch DocumentSignature objects filtered by approval status.
     Query param: ?approved=true or ?approved=false
     """
-    approved_param = request.query_params.get("approved", "true").lower()
-    approved_flag = True if approved_param == "true" else False
+    approved_flag = _approved_flag(request)
 
-    docs = (
-        DocumentSignature.objects
-        .annotate(
-            total_statuses=Count("signature_statuses"),
-            approved_statuses=Count("signature_statuses", filter=Q(signature_statuses__status="approved"))
-        )
-        .filter(draft=False)
-    )
+    # fully_approved is maintained alongside the status counters, so this is an index lookup
+    docs = DocumentSignature.objects.filter(draft=False, fully_approved=approved_flag)
 
-    if approved_flag:
-        docs = docs.filter(total_statuses=F("approved_statuses"))  # Fully approved
-    else:
-        docs = docs.exclude(total_statuses=F("approved_statuses"))  # Not fully approved
+    paginator = KeysetPagination(ordering=DOCUMENT_SIGNATURE_ORDERING)
+    page = paginator.paginate_queryset(docs, request)
 
+    return Response(_approval_status_body(request, approved_flag, page, paginator), headers=paginator.get_headers())
+
+
+@async_api_view(["GET"])
+@read_replica
+async def documents_by_approval_status_async(request):
+    """
+    documents_by_approval_status() as an async view, for the ASGI application.
+    """
+    approved_flag = _approved_flag(request)
+    docs = DocumentSignature.objects.filter(draft=False, fully_approved=approved_flag)
+
+    paginator = KeysetPagination(ordering=DOCUMENT_SIGNATURE_ORDERING)
+    page = await paginator.apaginate_queryset(docs, request)
+
+    return json_response(_approval_status_body(request, approved_flag, page, paginator), headers=paginator.get_headers())
+
+
+def _approval_status_body(request, approved_flag, page, paginator):
     response_data = []
-    for doc in docs:
+    for doc in page:
         response_data.append({
             "document_signature_id": doc.id,
             "edited_file_url": request.build_absolute_uri(doc.edited_file.url) if doc.edited_file else None,
-            "creator_id": doc.creator.id if doc.creator else None,
-            "document_id": doc.document.id,
+            "creator_id": doc.creator_id,
+            "document_id": doc.document_id,
+            "thumbnail_url": thumbnail_url(request, "document-signature-thumbnail", doc.id, doc.edited_file),
             "created_at": doc.created_at
         })
 
-    return Response({
+    return {
         "status": "success",
         "approved": approved_flag,
-        "documents": response_data
-    })
+        "documents": response_data,
+        **paginator.get_page_info()
+    }
+
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def export_signing_history(request):
+    """
+    Stream the signing history (one row per signer of each DocumentSignature) as NDJSON,
+    or CSV with ?type=csv. Optional filters: ?since= and ?until= (ISO date or datetime of
+    the status's last change) and ?status=. Admins only.
+    """
+    if request.user.role != "admin":
+        return Response({"detail": "Only admins can export the signing history."}, status=403)
+
+    # Not ?format=, which DRF reserves for picking a renderer
+    export_type = request.query_params.get("type", "ndjson")
+    if export_type not in EXPORT_TYPES:
+        return Response({"detail": f"type must be one of: {', '.join(EXPORT_TYPES)}."}, status=400)
+    try:
+        queryset = export_queryset(
+            since=request.query_params.get("since"),
+            until=request.query_params.get("until"),
+            status=request.query_params.get("status"),
+        )
+    except ExportError as e:
+        return Response({"detail": str(e)}, status=400)
+
+    response = StreamingHttpResponse(export_lines(export_type, queryset), content_type=EXPORT_TYPES[export_type])
+    response["Content-Disposition"] = f'attachment; filename="signing-history.{export_type}"'
+    return response
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, PassthroughRenderer])
+def download_edited_file(request, doc_sig_id):
+    """
+    Download the edited (signed) file of a DocumentSignature, with Range and conditional GET support.
+    """
+    doc_sig = get_object_or_404(DocumentSignature.objects.select_related("document"), id=doc_sig_id)
+    if not doc_sig.edited_file:
+        return Response({"detail": "DocumentSignature has no edited file."}, status=404)
+    stem = os.path.splitext(doc_sig.document.download_name())[0]
+    return serve_file(
+        request, doc_sig.edited_file, as_attachment=request.query_params.get("download") == "1",
+        filename=f"{stem}-signed{os.path.splitext(doc_sig.edited_file.name)[1]}"
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, PassthroughRenderer])
+def download_signature(request, signature_id):
+    """
+    Download a signature image.
+    """
+    signature = get_object_or_404(Signature, id=signature_id)
+    return serve_file(request, signature.file)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, PassthroughRenderer])
+def document_signature_thumbnail(request, doc_sig_id):
+    """
+    PNG thumbnail of the first page of a DocumentSignature's edited file; ?size= as for documents.
+    """
+    doc_sig = get_object_or_404(DocumentSignature, id=doc_sig_id)
+    if not doc_sig.edited_file:
+        return Response({"detail": "DocumentSignature has no edited file."}, status=404)
+    try:
+        return thumbnail_response(request, doc_sig.edited_file, "pdf", request.query_params.get("size", "small"))
+    except ThumbnailError as e:
+        return Response({"detail": str(e)}, status=e.status)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, PassthroughRenderer])
+def signature_thumbnail(request, signature_id):
+    """
+    PNG thumbnail of a signature image; ?size= as for documents.
+    """
+    signature = get_object_or_404(Signature, id=signature_id)
+    try:
+        return thumbnail_response(request, signature.file, "image", request.query_params.get("size", "small"))
+    except ThumbnailError as e:
+        return Response({"detail": str(e)}, status=e.status)
+
+
+
+async def document_signature_events(request):
+    """
+    Server-Sent Events stream (ASGI only) of progress on the current user's DocumentSignatures:
+    "assigned", "finalized" and "status_changed" events with the current counters, plus
+    "overview" events with the dashboard counts. ?document_signature=<id> follows a single
+    DocumentSignature instead; ?overview=0 leaves out the overview events.
+    Authenticate with the usual Bearer header or ?token=<access token>.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"detail": "The event stream is only served by the ASGI application."}, status=501)
+
+    user = await authenticate(request, allow_query_token=True)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided or are invalid."}, status=401)
+
+    doc_sig_id = request.GET.get("document_signature")
+    if doc_sig_id is not None and not doc_sig_id.isdigit():
+        return JsonResponse({"detail": "document_signature must be an id."}, status=400)
+    subscriber = hub.subscribe(
+        user.id,
+        document_signature_id=int(doc_sig_id) if doc_sig_id else None,
+        overview=request.GET.get("overview", "1") not in ("0", "false"),
+    )
+    keepalive = getattr(settings, "EVENTS_KEEPALIVE_SECONDS", 15)
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            hub.unsubscribe(subscriber)
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response